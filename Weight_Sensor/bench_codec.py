@@ -0,0 +1,90 @@
+"""
+weight_codec のベンチマーク
+
+記録（.wrec）または模擬のセッション（80SPS、数日分）の seq・変換時刻・生の値・重量を圧縮し、
+圧縮率と符号化・復号の速さ（元の大きさで MB/s）を表示します。
+
+使い方: python bench_codec.py [記録.wrec | 時間数]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from weight_codec import ChunkedColumn, compress_records, open_compressed, decompress_records
+from weight_recorder import Recording
+
+SAMPLE_RATE = 80.0
+
+
+def simulate(hours, rng):
+    """80SPS の模擬セッション（変換の間隔のゆらぎ、ドリフト、重りの載せ下ろし、ノイズ）"""
+    count = int(hours * 3600 * SAMPLE_RATE)
+    period_ns = 1e9 / SAMPLE_RATE
+    timestamps = (np.arange(count) * period_ns + rng.normal(0.0, 20000.0, count)).astype(np.int64) + 10**12
+    drift = np.cumsum(rng.normal(0.0, 0.5, count))
+    load = np.repeat(rng.choice([0.0, 0.0, 37000.0, 113318.0], count // 4000 + 1), 4000)[:count]
+    raw = np.rint(8300000.0 + drift - load + rng.normal(0.0, 60.0, count)).astype(np.int64)
+    # 重量は基準値との差を g にしたもの（hx711lib と同じく float32 で持つ）
+    weight = ((raw - raw[0]) * (300.0 / 113318.0)).astype(np.float32)
+    return {"seq": np.arange(count, dtype=np.int64), "timestamp_ns": timestamps, "raw": raw, "weight": weight}
+
+
+def main():
+    rng = np.random.default_rng(0)
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        recording = Recording(sys.argv[1])
+        records = recording.records
+        print(f"記録: {sys.argv[1]}（{len(recording):,}件）")
+    else:
+        hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24.0
+        records = simulate(hours, rng)
+        print(f"模擬セッション: {hours:g}時間, {len(records['raw']):,}件（{SAMPLE_RATE:.0f} SPS）")
+
+    # 比較の基準: seq u32 + timestamp u64 + raw i32 + weight f32（.wrec の20バイト）と CSV の文字列
+    count = len(records["raw"])
+    plain = {"seq": count * 4, "timestamp_ns": count * 8, "raw": count * 4, "weight": count * 4}
+    csv_bytes = sum(len(f"{raw:.2f}") + 1 for raw in records["raw"][:100000].tolist()) * count / min(count, 100000)
+
+    print(f"{'列':<14}{'元(MB)':>10}{'圧縮後(MB)':>12}{'圧縮率':>8}{'B/件':>8}{'符号化MB/s':>12}{'復号MB/s':>10}")
+    for name, order in (("seq", 2), ("timestamp_ns", 2), ("raw", 1), ("weight", 1)):
+        values = records[name]
+        if name == "weight":
+            # float32 のビット列を整数として符号化する（compress_records() と同じ）
+            values = np.ascontiguousarray(values, dtype="<f4").view("<i4")
+        start = time.perf_counter()
+        column = ChunkedColumn.encode(values, order=order)
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = column.decode()
+        decode_time = time.perf_counter() - start
+        if not np.array_equal(decoded, values):
+            print(f"エラー: {name} を元に戻せませんでした")
+            sys.exit(1)
+        size = plain[name] / 1e6
+        print(f"{name:<14}{size:>10.2f}{column.nbytes / 1e6:>12.2f}{plain[name] / column.nbytes:>8.1f}"
+              f"{column.nbytes / count:>8.2f}{size / encode_time:>12.1f}{size / decode_time:>10.1f}")
+
+    data = compress_records(records)
+    total = sum(plain.values())
+    print(f"合計: {total / 1e6:.2f} MB -> {len(data) / 1e6:.2f} MB（{total / len(data):.1f}倍）, "
+          f"生の値の CSV 文字列（%.2f）と比べて {csv_bytes / open_compressed(data)['raw'].nbytes:.1f}倍")
+
+    restored = decompress_records(data)
+    if not all(np.array_equal(restored[name], records[name]) for name in plain):
+        print("エラー: 記録を元に戻せませんでした")
+        sys.exit(1)
+
+    # 途中の1分間だけを取り出す（必要なチャンクだけを復号する）
+    columns = open_compressed(data)
+    first = count // 2
+    stop = min(count, first + int(60 * SAMPLE_RATE))
+    start = time.perf_counter()
+    window = columns["raw"].decode(first, stop)
+    elapsed = time.perf_counter() - start
+    print(f"途中の{len(window):,}件の取り出し: {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+weight_filters.Decimator の確認スクリプト
+
+80SPS の読み取りを模した白色ノイズ（HX711 の実測に近い標準偏差）を間引き、
+間引く比率ごとにノイズがどれだけ減ったか、有効ビット数がどれだけ増えたかを表示します。
+ブロックに分けて処理した結果が一度に処理した結果と一致するか（位相を引き継げているか）も確認します。
+
+使い方: python bench_decimation.py [サンプル数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from weight_filters import Decimator
+
+SAMPLE_RATE = 80.0   # 変換レート（SPS）
+NOISE_COUNTS = 60.0  # 読み取り値のノイズの標準偏差（カウント）
+FACTORS = [1, 2, 4, 8, 16, 32]
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    data = 8300000.0 + rng.normal(0.0, NOISE_COUNTS, samples)
+    input_std = float(np.std(data))
+
+    print(f"サンプル数: {samples:,}, 入力のノイズ: {input_std:.1f} カウント（{SAMPLE_RATE:.0f} SPS）")
+    print(f"{'種類':<6}{'比率':>6}{'出力SPS':>10}{'ノイズ':>10}{'低減(dB)':>10}{'理想(dB)':>10}"
+          f"{'+ビット':>8}{'遅れ(ms)':>10}{'ns/入力':>10}{'分割との差':>12}")
+    for kind in ("cic", "fir"):
+        for factor in FACTORS:
+            decimator = Decimator(factor, kind)
+            start = time.perf_counter()
+            output, _ = decimator.process(data)
+            elapsed = time.perf_counter() - start
+            # 最初の窓は先頭の値で埋めているので除く
+            settled = output[len(decimator.taps) // factor + 1:]
+            std = float(np.std(settled))
+            reduction = 20 * np.log10(input_std / std)
+            # 白色ノイズを factor 件の単純平均で間引いたときの値（CIC は窓が段数倍に長いので、これより大きく減る）
+            ideal = 10 * np.log10(factor)
+
+            # 読み取りプロセスから届く程度の大きさのブロックに分けて処理する
+            decimator = Decimator(factor, kind)
+            sizes = rng.integers(1, 64, samples // 16)
+            bounds = np.concatenate(([0], np.cumsum(sizes)))
+            bounds = np.append(bounds[bounds < samples], samples)
+            pieces = [decimator.process(data[a:b])[0] for a, b in zip(bounds[:-1], bounds[1:])]
+            split = np.concatenate(pieces)
+            split_error = float(np.max(np.abs(split - output))) if len(split) == len(output) else float("inf")
+
+            print(f"{kind:<6}{factor:>6}{SAMPLE_RATE / factor:>10.2f}{std:>10.2f}{reduction:>10.2f}{ideal:>10.2f}"
+                  f"{np.log2(input_std / std):>8.2f}{decimator.group_delay / SAMPLE_RATE * 1000:>10.1f}"
+                  f"{elapsed / samples * 1e9:>10.1f}{split_error:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+weight_filters のベンチマーク
+
+フィルターの段ごとに、1サンプルあたりの処理時間と遅れ（group delay）を表示します。
+遅れはゆっくり増える重量（傾き一定）を入力して、出力が入力から何サンプル分遅れるかを測ります。
+あわせて、ブロックに分けて処理した結果が一度に処理した結果と一致するかを確認します。
+
+使い方: python bench_filters.py [サンプル数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from weight_filters import (BoxcarFilter, ExponentialFilter, MedianFilter, KalmanFilter, SpikeRejector,
+                            FilterPipeline, lfilter)
+
+
+def make_stages():
+    return [
+        ("移動平均 (width=16)", lambda: BoxcarFilter(16)),
+        ("指数移動平均 (alpha=0.1)", lambda: ExponentialFilter(0.1)),
+        ("移動中央値 (width=9)", lambda: MedianFilter(9)),
+        ("カルマン (q=0.01, r=4)", lambda: KalmanFilter(0.01, 4.0)),
+        ("外れ値除去 (width=25)", lambda: SpikeRejector()),
+        ("中央値5 + 指数移動平均0.3", lambda: FilterPipeline([MedianFilter(5), ExponentialFilter(0.3)])),
+    ]
+
+
+def measured_delay(make):
+    """傾き一定の入力に対する出力の遅れ（サンプル数）"""
+    ramp = np.arange(5000, dtype=np.float64) * 0.5
+    y = make().process(ramp)
+    return float(np.mean(ramp[-1000:] - y[-1000:]) / 0.5)
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    # 重りを載せ下ろしする階段状の重量にノイズとスパイクを足す
+    weight = np.repeat(rng.uniform(0.0, 2000.0, samples // 2000 + 1), 2000)[:samples]
+    data = weight + rng.normal(0.0, 2.0, samples)
+    spikes = rng.random(samples) < 0.001
+    data[spikes] += rng.normal(0.0, 500.0, np.count_nonzero(spikes))
+
+    print(f"サンプル数: {samples:,}（scipy: {'あり' if lfilter is not None else 'なし'}）")
+    print(f"{'段':<28}{'ns/サンプル':>12}{'遅れ(理論)':>12}{'遅れ(実測)':>12}{'分割との差':>12}")
+    rejector = None
+    for name, make in make_stages():
+        stage = make()
+        if isinstance(stage, SpikeRejector):
+            rejector = stage
+        start = time.perf_counter()
+        whole = stage.process(data)
+        elapsed = time.perf_counter() - start
+
+        # 80SPS の読み取りで届く程度の大きさのブロックに分けて処理する
+        stage = make()
+        sizes = rng.integers(1, 64, samples // 16)
+        bounds = np.concatenate(([0], np.cumsum(sizes)))
+        bounds = np.append(bounds[bounds < samples], samples)
+        pieces = [stage.process(data[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        split_error = float(np.max(np.abs(np.concatenate(pieces) - whole)))
+
+        print(f"{name:<28}{elapsed / samples * 1e9:>12.1f}{make().group_delay:>12.2f}"
+              f"{measured_delay(make):>12.2f}{split_error:>12.2e}")
+
+    if rejector is not None:
+        # 加えたスパイクのうちノイズより十分大きいものが除かれたか
+        large = spikes & (np.abs(data - weight) > 50.0)
+        caught = np.count_nonzero(rejector.last_mask & large)
+        steps = np.count_nonzero(np.diff(weight))
+        print(f"外れ値除去: 置き換え {rejector.rejected:,}件, 50g を超えるスパイク {caught:,}/{np.count_nonzero(large):,}件を除去, "
+              f"本当の変化として通した段差 {rejector.level_changes:,}/{steps:,}件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+weight_fusion のベンチマーク
+
+4つのロードセルの合成データ（100万サンプル）から合計重量と荷重中心を計算し、
+NumPy でまとめて計算した場合と1サンプルずつ Python で計算した場合の時間を比べます。
+
+使い方: python bench_fusion.py [サンプル数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from weight_fusion import PlatformFusion, solve_cell_matrix
+
+CELL_POSITIONS = [(-200.0, -150.0), (200.0, -150.0), (200.0, 150.0), (-200.0, 150.0)]  # mm
+
+
+def make_block(samples, offsets, factors, rng):
+    """荷重中心が動き回る合成データを作る（読み取り値は int32）"""
+    t = np.linspace(0.0, 20.0 * np.pi, samples)
+    total = 5000.0 + 1000.0 * np.sin(t / 7.0)
+    cop = np.stack([150.0 * np.cos(t), 100.0 * np.sin(t)], axis=1)
+    positions = np.asarray(CELL_POSITIONS)
+    # 荷重中心から各セルへの配分（四隅の双線形補間）
+    u = (cop[:, 0:1] - positions[0, 0]) / (positions[1, 0] - positions[0, 0])
+    v = (cop[:, 1:2] - positions[0, 1]) / (positions[3, 1] - positions[0, 1])
+    share = np.hstack([(1 - u) * (1 - v), u * (1 - v), u * v, (1 - u) * v])
+    weights = share * total[:, None]
+    raw = offsets - weights / factors + rng.normal(0.0, 20.0, weights.shape)
+    return raw.astype(np.int32), total, cop
+
+
+def fuse_python(raw, offsets, factors, positions):
+    """比較用: 1サンプルずつ計算する"""
+    results = []
+    for row in raw:
+        weights = [(offsets[i] - row[i]) * factors[i] for i in range(len(row))]
+        total = sum(weights)
+        x = sum(w * p[0] for w, p in zip(weights, positions)) / total
+        y = sum(w * p[1] for w, p in zip(weights, positions)) / total
+        results.append((total, x, y))
+    return results
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    offsets = np.array([8156931.0, 8201120.0, 8098400.0, 8175560.0])
+    factors = np.array([-0.00265, -0.00271, -0.00259, -0.00268])
+
+    # 既知の重りを各セルの上に載せた測定から行列を求める
+    calib_raw = offsets - np.diag([1000.0, 1000.0, 1000.0, 1000.0]) / factors
+    matrix = solve_cell_matrix(offsets, calib_raw, [1000.0] * 4)
+    fusion = PlatformFusion(offsets, matrix, CELL_POSITIONS)
+
+    raw, true_total, true_cop = make_block(samples, offsets, factors, rng)
+    print(f"サンプル数: {samples:,} × {fusion.size}セル")
+
+    start = time.perf_counter()
+    total, cop_x, cop_y = fusion.fuse(raw)
+    numpy_time = time.perf_counter() - start
+    print(f"NumPy: {numpy_time * 1000:.1f} ms ({numpy_time / samples * 1e9:.1f} ns/サンプル)")
+
+    subset = min(samples, 20000)
+    start = time.perf_counter()
+    expected = fuse_python(raw[:subset].tolist(), offsets.tolist(), factors.tolist(), CELL_POSITIONS)
+    python_time = (time.perf_counter() - start) * samples / subset
+    print(f"Python（{subset:,}サンプルから換算）: {python_time * 1000:.1f} ms, {python_time / numpy_time:.0f}倍")
+
+    expected = np.asarray(expected)
+    print(f"Python版との差の最大: 重量 {np.max(np.abs(expected[:, 0] - total[:subset])):.2e} g, "
+          f"荷重中心 {np.max(np.abs(expected[:, 1] - cop_x[:subset])):.2e} mm")
+    print(f"真値との差（ノイズ込み）: 重量 {np.std(total - true_total):.2f} g, "
+          f"荷重中心 x {np.std(cop_x - true_cop[:, 0]):.3f} mm, y {np.std(cop_y - true_cop[:, 1]):.3f} mm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+HX711の読み取りモードごとの実効サンプルレートを測るベンチマーク
+
+hx711_sim の模擬HX711を相手に、レート（10/80SPS）とチャンネル・ゲインの組み合わせごとに
+一定時間読み続け、実際に取り出せたサンプル数/秒を表示します。
+
+破棄は、クロックを HIGH にしている間にスレッドが OS のスケジューラーなどで止められ、60µs を超えた読み取りです。
+模擬HX711も同じ Python の中で動くので、1コアの計算機では 80SPS で1秒に数件（数%）出ます
+（例: 4秒ずつの測定で破棄 10〜14件、実効 73〜77SPS、変換は 79〜80回/秒）。
+実機でも負荷が高いと同じことが起こるので、読み取りはその値を捨てて数え、模擬HX711もパワーダウンとして扱います。
+実効SPSが変換/秒より少ないのは、この破棄とゲイン切り替え直後の1回分です。
+
+使い方: python bench_hx711_rates.py [秒数]
+"""
+import sys
+import time
+
+from hx711 import GAIN_PULSES, RATE_10SPS, RATE_80SPS
+from hx711_sim import create_mock_reader
+
+RATE_PIN = 13  # 模擬HX711のRATEにつなぐピン
+
+
+def bench_mode(sample_rate, gain, seconds):
+    """
+    1つのモードで seconds 秒読み続ける
+
+    Returns:
+        dict: 実効レートと内訳
+    """
+    reader, sensor = create_mock_reader(sample_rate=sample_rate, rate_pin=RATE_PIN, gain=gain)
+    try:
+        # RATEピンを切り替える前に始まった変換を読み飛ばす
+        reader.read()
+        reader.missed_conversions = 0
+        reader.power_down_errors = 0
+        reads = reader.reads
+        conversions = sensor.conversions
+
+        samples = 0
+        cpu_start = time.process_time()
+        start = time.monotonic()
+        while time.monotonic() - start < seconds:
+            if reader.read() is not None:
+                samples += 1
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+        result = {
+            "sps": samples / elapsed,
+            "conversions": (sensor.conversions - conversions) / elapsed,
+            "dropped": reader.power_down_errors,
+            "missed": reader.missed_conversions,
+            "cpu": cpu / elapsed * 100,
+        }
+        # 最後の読み取りが破棄（パワーダウンでゲインが A128 に戻る）だった場合に備えて、1回読めるまで続ける
+        for _ in range(5):
+            if reader.read() is not None:
+                break
+        result["gain_ok"] = sensor.gain_pulses == GAIN_PULSES[gain]
+        return result
+    finally:
+        sensor.close()
+        reader.close()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    print(f"各モード {seconds:g} 秒ずつ測定します")
+    print(f"{'レート':>6} {'ゲイン':>6} {'実効SPS':>8} {'変換/秒':>8} {'破棄':>5} {'読み損ね':>8} {'CPU%':>6}")
+    for sample_rate in (RATE_10SPS, RATE_80SPS):
+        for gain in GAIN_PULSES:
+            result = bench_mode(sample_rate, gain, seconds)
+            mark = "" if result["gain_ok"] else "  (ゲイン指定が反映されていません)"
+            print(f"{sample_rate:6g} {gain:>6} {result['sps']:8.1f} {result['conversions']:8.1f} "
+                  f"{result['dropped']:5d} {result['missed']:8d} {result['cpu']:6.1f}{mark}")
+    print("破棄: PD_SCKのHIGH時間が60µsを超えて捨てた読み取り（パワーダウン扱い。スレッドが止められたときに起こる）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+hx711lib.HX711 の開始・停止を繰り返して、後始末の漏れと再開にかかる時間を確認するスクリプト
+
+模擬の書き込みプロセス（python hx711_memory.py --mock）を相手に start()/stop() を繰り返し、
+子プロセス・ファイルディスクリプタ・スレッド・共有メモリが残っていないかを確認します。
+
+使い方: python bench_hx711_restart.py [回数]
+"""
+import os
+import sys
+import time
+import threading
+
+from hx711lib import HX711
+from hx711_memory import SHM_NAME, SEM_NAME
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MOCK_COMMAND = [sys.executable, os.path.join(BASE_DIR, "hx711_memory.py"), "--mock", "--80sps"]
+
+
+def child_processes():
+    """このプロセスの子プロセスのPID（/proc から調べる）"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # stat の ")" の後ろは state, ppid の順
+        if int(fields[1]) == os.getpid():
+            children.append(int(entry))
+    return children
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def ring_exists():
+    return os.path.exists("/dev/shm" + SHM_NAME) or os.path.exists("/dev/shm/sem." + SEM_NAME.lstrip("/"))
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    sensor = HX711(command=MOCK_COMMAND)
+
+    # 1回目で import などを済ませてから基準を取る
+    sensor.start()
+    time.sleep(0.2)
+    sensor.stop()
+    fds = open_fds()
+    threads = threading.active_count()
+
+    restart_times = []
+    stop_times = []
+    failures = 0
+    for _ in range(cycles):
+        count = sensor.latency.count
+        start = time.monotonic()
+        sensor.start()
+        # 最初のサンプルが届くまでを再開にかかった時間とする
+        while sensor.latency.count == count:
+            if time.monotonic() - start > 2.0:
+                failures += 1
+                break
+            time.sleep(0.001)
+        restart_times.append(time.monotonic() - start)
+        start = time.monotonic()
+        sensor.stop()
+        stop_times.append(time.monotonic() - start)
+
+    restart_times.sort()
+    stop_times.sort()
+    print(f"{cycles}回の開始・停止")
+    print(f"再開（最初のサンプルまで）: 中央値 {restart_times[len(restart_times) // 2] * 1000:.1f} ms, "
+          f"最大 {restart_times[-1] * 1000:.1f} ms")
+    print(f"停止: 中央値 {stop_times[len(stop_times) // 2] * 1000:.1f} ms, 最大 {stop_times[-1] * 1000:.1f} ms")
+    print(f"サンプルが届かなかった回数: {failures}")
+
+    leaks = []
+    if child_processes():
+        leaks.append(f"子プロセス {child_processes()}")
+    if open_fds() != fds:
+        leaks.append(f"ファイルディスクリプタ {fds} -> {open_fds()}")
+    if threading.active_count() != threads:
+        leaks.append(f"スレッド {threads} -> {threading.active_count()}")
+    if ring_exists():
+        leaks.append("共有メモリまたはセマフォ")
+    print("残っているもの: " + (", ".join(leaks) if leaks else "なし"))
+    sys.exit(1 if leaks or failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+weight_pyramid のベンチマーク
+
+80SPS の模擬の記録（1日・1週間・4週間）を集計し、ブロックごとに足す速さと、
+画面の幅（800点）での表示の取り出しにかかる時間が記録の長さによらないことを確認します。
+
+使い方: python bench_pyramid.py [画面の幅の点数]
+"""
+import sys
+import time
+
+import numpy as np
+
+from weight_pyramid import WeightPyramid
+
+SAMPLE_RATE = 80.0
+BLOCK = 64          # 読み取りプロセスから届く程度のブロック
+DAYS = [1, 7, 28]
+# 表示する範囲（秒）: 1分、1時間、1日、全体
+SPANS = [60, 3600, 86400, None]
+
+
+def main():
+    max_points = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    rng = np.random.default_rng(0)
+    labels = "".join(f"{'取り出し ' + (f'{span}s' if span else '全体'):>18}" for span in SPANS)
+    print(f"{'日数':>6}{'サンプル数':>14}{'足す(ns/件)':>14}{labels}")
+    period_ns = int(1e9 / SAMPLE_RATE)
+    per_day = int(86400 * SAMPLE_RATE)
+    for days in DAYS:
+        count = days * per_day
+        pyramid = WeightPyramid()
+        added = None
+        # 1日分ずつ作って足す（メモリを抑えるため）。足す速さは最初の1日をブロックごとに足して測り、残りはまとめて足す
+        for day in range(days):
+            timestamps = (day * per_day + np.arange(per_day)) * period_ns
+            weights = 100.0 + rng.normal(0.0, 0.5, per_day)
+            if added is None:
+                start = time.perf_counter()
+                for first in range(0, per_day, BLOCK):
+                    pyramid.add(timestamps[first:first + BLOCK], weights[first:first + BLOCK])
+                added = (time.perf_counter() - start) / per_day
+            else:
+                pyramid.add(timestamps, weights)
+        end_ns = count * period_ns
+        cells = []
+        for span in SPANS:
+            span_ns = end_ns if span is None else span * 1_000_000_000
+            # 記録のあちこちを表示する（拡大・移動）
+            starts = rng.integers(0, max(end_ns - span_ns, 1), 200)
+            start = time.perf_counter()
+            for first in starts.tolist():
+                view = pyramid.query(first, first + span_ns, max_points)
+            elapsed = (time.perf_counter() - start) / len(starts)
+            cells.append(f"{elapsed * 1e6:.1f} us/{len(view)}点")
+        print(f"{days:>6}{count:>14,}{added * 1e9:>14.1f}" + "".join(f"{cell:>18}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+hx711lib.HX711 の最新値の読み取りのベンチマーク
+
+読み取りスレッドの代わりに書き込みスレッドが値を更新し続ける中で、
+1, 4, 16本のスレッドが get_sample() を呼び続けたときの1秒あたりの読み取り回数を測ります。
+比較のために、以前と同じようにロックを取って読む場合も測ります。
+
+使い方: python bench_snapshot.py [秒数]
+"""
+import sys
+import time
+import threading
+
+import numpy as np
+
+from hx711lib import HX711
+from hx711_memory import RECORD_DTYPE
+
+WRITE_BLOCK = 8  # 書き込み1回あたりのサンプル数
+
+
+def locked_sample(sensor):
+    """以前の get_sample() と同じくロックを取って読む"""
+    with sensor._lock:
+        snapshot = sensor._snapshot
+        return snapshot.seq, snapshot.timestamp_ns, snapshot.weight
+
+
+def run(readers, seconds, read):
+    sensor = HX711()
+    stop = threading.Event()
+    counts = [0] * readers
+    writes = [0]
+    torn = [0]
+
+    def writer():
+        seq = 0
+        block = np.zeros(WRITE_BLOCK, dtype=RECORD_DTYPE)
+        while not stop.is_set():
+            block["seq"] = np.arange(seq, seq + WRITE_BLOCK)
+            # seq と時刻、重量が常に対応するように書く（読む側で食い違いがあれば検出できる）
+            block["timestamp_ns"] = block["seq"] * 1000
+            block["weight"] = block["seq"]
+            sensor._on_records(block, 0)
+            seq += WRITE_BLOCK
+            writes[0] += 1
+
+    def reader(index):
+        count = 0
+        while not stop.is_set():
+            seq, timestamp_ns, weight = read(sensor)
+            if seq is not None and (timestamp_ns != seq * 1000 or weight != seq - sensor.reference_weight):
+                torn[0] += 1
+            count += 1
+        counts[index] = count
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds, writes[0] / seconds, torn[0]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    print(f"{'読み取り方':>8} {'スレッド数':>6} {'読み取り/秒':>12} {'書き込み/秒':>12} {'不整合':>6}")
+    for name, read in (("ロック", locked_sample), ("スナップショット", HX711.get_sample)):
+        for readers in (1, 4, 16):
+            reads, writes, torn = run(readers, seconds, read)
+            print(f"{name:>8} {readers:>6} {reads:12,.0f} {writes:12,.0f} {torn:6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,376 @@
 from gpiozero import DigitalInputDevice, DigitalOutputDevice
+import gc
 import time
+import threading
 
 # GPIOピンの設定
 HX711_DAT_PIN = 5  # GPIO5 (Pin29)
 HX711_CLK_PIN = 6  # GPIO6 (Pin31)
 
-data_pin = DigitalInputDevice(HX711_DAT_PIN, pull_up=True)
-clock_pin = DigitalOutputDevice(HX711_CLK_PIN)
+# PD_SCKを60µs以上HIGHにするとHX711がパワーダウンする（データシートの値）
+POWER_DOWN_NS = 60000
+
+# チャンネル・ゲインと1回の読み出しで送るクロック数（次の変換から有効になる）
+GAIN_PULSES = {"A128": 25, "B32": 26, "A64": 27}
+
+# RATEピンで選べる変換レート（LOW: 10SPS, HIGH: 80SPS）
+RATE_10SPS = 10.0
+RATE_80SPS = 80.0
+
+class HX711Reader:
+    """
+    gpiozeroのピンを直接読み書きしてHX711を読み取るクラス
+
+    .on()/.off()/.value のデバイス層と time.sleep を通さずにクロックを出すので、
+    1ビットあたりの処理が短く、PD_SCKのHIGH時間も短く保てる。
+    pin_factory に gpiozero の MockFactory を渡せば実機なしで動かせる（hx711_sim.py を参照）。
+    edge_triggered が True のときは DOUT の立ち下がり（DRDY）をエッジ割り込みで待ち、待機中はCPUを使わない。
+    sample_rate と gain は利用側に公開しており、80SPSで読んで後段で平均するといった使い方ができる。
+    """
+    def __init__(self, dat_pin=HX711_DAT_PIN, clk_pin=HX711_CLK_PIN, pin_factory=None,
+                 edge_triggered=True, sample_rate=RATE_10SPS, ready_timeout=1.0,
+                 gain="A128", rate_pin=None, power_down_ns=POWER_DOWN_NS):
+        """
+        初期化
+
+        Args:
+            dat_pin: DOUTを接続したGPIO
+            clk_pin: PD_SCKを接続したGPIO
+            pin_factory: gpiozeroのピンファクトリ（省略時はデフォルト）
+            edge_triggered (bool): DRDYをエッジ割り込みで待つか（False なら1msごとのポーリング）
+            sample_rate (float): 変換レート（SPS）。rate_pin を使う場合はそのレートに切り替える
+            ready_timeout (float): DRDYを待つ最大時間（秒）。None なら無期限
+            gain (str): チャンネルとゲイン（"A128", "A64", "B32"）
+            rate_pin: RATEを接続したGPIO（省略時はボードの配線どおりのレートとみなす）
+            power_down_ns (int): これより長いHIGH時間があった読み取りはパワーダウンの恐れがあるとして捨てる
+        """
+        if gain not in GAIN_PULSES:
+            raise ValueError(f"gain は {', '.join(GAIN_PULSES)} のいずれかです: {gain}")
+        self.data_device = DigitalInputDevice(dat_pin, pull_up=True, pin_factory=pin_factory)
+        self.clock_device = DigitalOutputDevice(clk_pin, pin_factory=pin_factory)
+        self.rate_device = None
+        if rate_pin is not None:
+            self.rate_device = DigitalOutputDevice(rate_pin, pin_factory=pin_factory)
+        self.gain = gain
+        self._pulses = GAIN_PULSES[gain]
+        # 電源投入直後の変換は A128 なので、それ以外を選んだら最初の1回は捨てる
+        self._discard = 1 if gain != "A128" else 0
+        self.pulse_widths_ns = [0] * 27  # 直前の読み取りでの各クロックのHIGH時間（上限値）
+        self.max_pulse_ns = 0            # これまでに観測した最大のHIGH時間
+        self.reads = 0                   # 成功した読み取り回数
+        self.power_down_errors = 0       # HIGH時間が power_down_ns を超えて読み取りを破棄した回数
+        self.power_down_ns = power_down_ns
+        self.edge_triggered = edge_triggered
+        self.sample_rate = sample_rate
+        self.period_ns = int(1e9 / sample_rate)
+        self.ready_timeout = ready_timeout
+        self.timeouts = 0                # DRDYが来なかった回数（センサー未接続など）
+        self.missed_conversions = 0      # 読み出せずに失われた変換の数
+        self.last_drdy_ns = None         # 直前に読み出した変換の完了時刻（time.monotonic_ns()）
+        self._drdy = threading.Event()
+        self._drdy_ns = 0
+        self.when_ready = None           # DRDYの立ち下がりで呼ぶ関数（複数のセンサーをまとめて待つときに使う）
+        if edge_triggered:
+            # pull_up=True なので DOUT が LOW になると activated になる（＝立ち下がり）
+            self.data_device.when_activated = self._on_drdy
+        if self.rate_device is not None:
+            self.set_rate(sample_rate)
+
+    def set_gain(self, gain):
+        """
+        チャンネルとゲインを切り替える
+
+        次の読み出しのクロック数で指定するので、その次の変換から有効になる。
+        切り替え前のゲインで変換された1回分は read() が捨てる。
+
+        Args:
+            gain (str): "A128", "A64", "B32" のいずれか
+        """
+        if gain not in GAIN_PULSES:
+            raise ValueError(f"gain は {', '.join(GAIN_PULSES)} のいずれかです: {gain}")
+        if gain != self.gain:
+            self.gain = gain
+            self._pulses = GAIN_PULSES[gain]
+            self._discard = 1
+
+    def set_rate(self, sample_rate):
+        """
+        RATEピンで変換レートを切り替える（10SPS か 80SPS）
+
+        Args:
+            sample_rate (float): RATE_10SPS か RATE_80SPS
+        """
+        if sample_rate not in (RATE_10SPS, RATE_80SPS):
+            raise ValueError(f"sample_rate は {RATE_10SPS:g} か {RATE_80SPS:g} です: {sample_rate}")
+        if self.rate_device is None:
+            raise RuntimeError("rate_pin が設定されていません")
+        self.rate_device.value = sample_rate == RATE_80SPS
+        self.sample_rate = sample_rate
+        self.period_ns = int(1e9 / sample_rate)
+        # 切り替えをまたいだ間隔で読み損ねを数えないようにする
+        self.last_drdy_ns = None
+
+    def _on_drdy(self):
+        self._drdy_ns = time.monotonic_ns()
+        self._drdy.set()
+        callback = self.when_ready
+        if callback is not None:
+            callback()
+
+    def is_ready(self):
+        """DOUTがLOWなら変換が終わっている"""
+        return not self.data_device.pin.state
+
+    def wait_ready(self, timeout=None):
+        """
+        変換が終わるまで待つ
+
+        Args:
+            timeout (float): 最大待ち時間（秒）。省略時は ready_timeout
+
+        Returns:
+            bool: 変換が終わっていれば True、タイムアウトなら False
+        """
+        if timeout is None:
+            timeout = self.ready_timeout
+        if self.edge_triggered:
+            if not self.is_ready():
+                self._drdy.clear()
+                if not self.is_ready() and not self._drdy.wait(timeout):
+                    self.timeouts += 1
+                    return False
+            # 割り込みを受けていればその時刻を使う（読み出し中のビットの変化の分は _shift_in の最後で消している）
+            ready_ns = self._drdy_ns if self._drdy.is_set() else time.monotonic_ns()
+            # DOUT が LOW になってから読み出すまでに周期以上たっていれば、その間にも変換は終わっている
+            # （DOUT は LOW のままなので割り込みは来ない。読み出すのは最後の変換なので時刻もそこに進める）
+            ready_ns += (time.monotonic_ns() - ready_ns) // self.period_ns * self.period_ns
+        else:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.is_ready():
+                if deadline is not None and time.monotonic() > deadline:
+                    self.timeouts += 1
+                    return False
+                time.sleep(0.001)
+            ready_ns = time.monotonic_ns()
+
+        # 前回の変換から周期の1.5倍以上空いていれば、その間の変換を読み損ねている
+        if self.last_drdy_ns is not None:
+            gap = ready_ns - self.last_drdy_ns
+            if gap > self.period_ns * 3 // 2:
+                self.missed_conversions += (gap + self.period_ns // 2) // self.period_ns - 1
+        self.last_drdy_ns = ready_ns
+        return True
+
+    def read(self, timeout=None):
+        """
+        24ビットの符号付き値を読み取る
+
+        Returns:
+            int: 読み取り値（タイムアウト、パワーダウンの恐れがある場合、ゲイン切り替え直後は None）
+        """
+        if not self.wait_ready(timeout):
+            return None
+        value = self._shift_in()
+        if value is not None and self._discard:
+            # ゲインを切り替える前の設定で変換された値
+            self._discard -= 1
+            return None
+        return value
+
+    def _shift_in(self):
+        # プロパティを経由せずにピンの読み書き関数を直接呼ぶ
+        get_data = self.data_device.pin._get_state
+        set_clock = self.clock_device.pin._set_state
+        clock_ns = time.perf_counter_ns
+        widths = self.pulse_widths_ns
+        pulses = self._pulses
+
+        value = 0
+        # 途中でGCが走るとHIGH時間が60µsを超えることがあるので止めておく
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(24):
+                t0 = clock_ns()
+                set_clock(1)
+                set_clock(0)
+                widths[i] = clock_ns() - t0
+                value = (value << 1) | get_data()
+            # 次の変換のチャンネル・ゲインを指定するパルス（A128: 1, B32: 2, A64: 3）
+            for i in range(24, pulses):
+                t0 = clock_ns()
+                set_clock(1)
+                set_clock(0)
+                widths[i] = clock_ns() - t0
+        finally:
+            if gc_enabled:
+                gc.enable()
+        # データビットの変化で立ったDRDYイベントを消す（DOUTは次の変換までHIGH）
+        self._drdy.clear()
+
+        longest = max(widths[:pulses])
+        if longest > self.max_pulse_ns:
+            self.max_pulse_ns = longest
+        if longest > self.power_down_ns:
+            # パワーダウンに入った可能性があるので値は使わない（次の変換で復帰する）
+            self.power_down_errors += 1
+            # パワーダウンから復帰すると A128 に戻るので、次の1回は捨てる
+            if self.gain != "A128":
+                self._discard = 1
+            return None
+        self.reads += 1
+
+        # 24ビットの符号付き値へ変換
+        if value & 0x800000:
+            value -= 0x1000000
+        return value
+
+    def close(self):
+        self.data_device.close()
+        self.clock_device.close()
+        if self.rate_device is not None:
+            self.rate_device.close()
+
+
+class SharedClockHX711:
+    """
+    PD_SCKを共有した複数のHX711をまとめて読み取るクラス
+
+    全てのDOUTがLOWになるのを待ってから、1本のクロックで全チャンネルを同時に読み出す。
+    同じクロックで読むので、得られる値は同じ読み出しサイクルのものになる。
+    DRDYはチャンネルごとのエッジ割り込みで待つので、待ち時間は一番遅いチャンネルの分だけで済む。
+    """
+    def __init__(self, dat_pins, clk_pin=HX711_CLK_PIN, pin_factory=None,
+                 sample_rate=RATE_10SPS, ready_timeout=1.0, gain="A128", power_down_ns=POWER_DOWN_NS):
+        """
+        初期化
+
+        Args:
+            dat_pins (list): 各HX711のDOUTを接続したGPIO
+            clk_pin: 共有しているPD_SCKのGPIO
+            pin_factory: gpiozeroのピンファクトリ（省略時はデフォルト）
+            sample_rate (float): 変換レート（SPS）
+            ready_timeout (float): DRDYを待つ最大時間（秒）。None なら無期限
+            gain (str): チャンネルとゲイン（全チャンネル共通）
+            power_down_ns (int): HX711Reader と同じ
+        """
+        if gain not in GAIN_PULSES:
+            raise ValueError(f"gain は {', '.join(GAIN_PULSES)} のいずれかです: {gain}")
+        self.data_devices = [DigitalInputDevice(pin, pull_up=True, pin_factory=pin_factory) for pin in dat_pins]
+        self.clock_device = DigitalOutputDevice(clk_pin, pin_factory=pin_factory)
+        self.gain = gain
+        self._pulses = GAIN_PULSES[gain]
+        self._discard = 1 if gain != "A128" else 0
+        self.sample_rate = sample_rate
+        self.ready_timeout = ready_timeout
+        self.pulse_widths_ns = [0] * 27
+        self.reads = 0
+        self.power_down_errors = 0
+        self.power_down_ns = power_down_ns
+        self.timeouts = 0
+        self.drdy_ns = [0] * len(dat_pins)  # 直前に読み出した変換の、チャンネルごとの完了時刻
+        self.last_drdy_ns = None            # 全チャンネルがそろった時刻
+        self._events = []
+        for index, device in enumerate(self.data_devices):
+            event = threading.Event()
+            device.when_activated = self._make_drdy_handler(index, event)
+            self._events.append(event)
+
+    def _make_drdy_handler(self, index, event):
+        def on_drdy():
+            self.drdy_ns[index] = time.monotonic_ns()
+            event.set()
+        return on_drdy
+
+    def wait_ready(self, timeout=None):
+        """
+        全チャンネルの変換が終わるまで待つ
+
+        Returns:
+            bool: そろえば True、タイムアウトなら False
+        """
+        if timeout is None:
+            timeout = self.ready_timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index, (device, event) in enumerate(zip(self.data_devices, self._events)):
+            if device.pin.state:
+                event.clear()
+                if device.pin.state:
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    if not event.wait(remaining):
+                        self.timeouts += 1
+                        return False
+            if not event.is_set():
+                self.drdy_ns[index] = time.monotonic_ns()
+        self.last_drdy_ns = max(self.drdy_ns)
+        return True
+
+    def read(self, timeout=None):
+        """
+        全チャンネルの24ビットの符号付き値を読み取る
+
+        Returns:
+            list: チャンネル順の読み取り値（タイムアウト、パワーダウンの恐れがある場合、ゲイン切り替え直後は None）
+        """
+        if not self.wait_ready(timeout):
+            return None
+        values = self._shift_in()
+        if values is not None and self._discard:
+            self._discard -= 1
+            return None
+        return values
+
+    def _shift_in(self):
+        getters = [device.pin._get_state for device in self.data_devices]
+        set_clock = self.clock_device.pin._set_state
+        clock_ns = time.perf_counter_ns
+        widths = self.pulse_widths_ns
+        pulses = self._pulses
+
+        values = [0] * len(getters)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(24):
+                t0 = clock_ns()
+                set_clock(1)
+                set_clock(0)
+                widths[i] = clock_ns() - t0
+                # 各チャンネルのビットはクロックがLOWの間に読むので、HIGH時間には影響しない
+                for k, get_data in enumerate(getters):
+                    values[k] = (values[k] << 1) | get_data()
+            for i in range(24, pulses):
+                t0 = clock_ns()
+                set_clock(1)
+                set_clock(0)
+                widths[i] = clock_ns() - t0
+        finally:
+            if gc_enabled:
+                gc.enable()
+        for event in self._events:
+            event.clear()
+
+        if max(widths[:pulses]) > self.power_down_ns:
+            self.power_down_errors += 1
+            if self.gain != "A128":
+                self._discard = 1
+            return None
+        self.reads += 1
+        return [value - 0x1000000 if value & 0x800000 else value for value in values]
+
+    def close(self):
+        for device in self.data_devices:
+            device.close()
+        self.clock_device.close()
+
+
+_default_reader = None
 
 def read_hx711():
-    # センサが準備できるまで待機（data_pinが LOW になるまで）
-    while data_pin.value:
-        time.sleep(0.001)
-    reading = 0
-    # 24ビット分、センサからデータを読み込む
-    for _ in range(24):
-        clock_pin.on()
-        time.sleep(0.000001)
-        reading = reading << 1
-        clock_pin.off()
-        time.sleep(0.000001)
-        if data_pin.value:
-            reading += 1
-    # ゲイン設定用の1パルス（必要に応じて調整）
-    clock_pin.on()
-    time.sleep(0.000001)
-    clock_pin.off()
-    # 24ビットの符号付き値へ変換
-    if reading & 0x800000:
-        reading = -((~reading & 0xffffff) + 1)
-    return reading
+    global _default_reader
+    if _default_reader is None:
+        _default_reader = HX711Reader()
+    return _default_reader.read()
 
 def main():
     while True:
@@ -1,10 +1,16 @@
 import mmap
 import ctypes
 import time
+import random
 import posix_ipc
+import numpy as np
 import subprocess
+import threading
 import os
 import sys
+from collections import namedtuple
+
+from weight_stream import LatencyStats
 
 
 is_windows = sys.platform.startswith('win')
@@ -15,40 +21,389 @@ else:
     EXECUTABLE_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_reader")
 
 SHM_NAME = "/weight_shm"
+SEM_NAME = "/weight_sem"  # 新しいデータを通知するセマフォ
+
+# リングバッファの識別子（weight_reader.cpp と一致させる）
+RING_MAGIC = 0x474E5257  # "WRNG"
+RING_VERSION = 1
+RECORD_WRITING = 0xFFFFFFFFFFFFFFFF
 
-class SensorData(ctypes.Structure):
+class RingHeader(ctypes.Structure):
     _fields_ = [
-        ("weight", ctypes.c_double),
-        ("ready", ctypes.c_bool)
+        ("magic", ctypes.c_uint32),
+        ("version", ctypes.c_uint32),
+        ("capacity", ctypes.c_uint32),
+        ("record_size", ctypes.c_uint32),
+        ("write_seq", ctypes.c_uint64),
+        ("read_seq", ctypes.c_uint64)
     ]
 
-def get_weight_data(callback=None):
+class SensorRecord(ctypes.Structure):
+    _fields_ = [
+        ("seq", ctypes.c_uint64),
+        ("timestamp_ns", ctypes.c_uint64),
+        ("weight", ctypes.c_double)
+    ]
+
+# 読み出した1サンプル分のデータ
+WeightRecord = namedtuple("WeightRecord", ["seq", "timestamp_ns", "weight"])
+
+# SensorRecord と同じ並びの NumPy の型（drain_array() が返す配列）
+RECORD_DTYPE = np.dtype([("seq", "<u8"), ("timestamp_ns", "<u8"), ("weight", "<f8")])
+
+
+class SensorRing:
     """
-    センサーからの生の読み取り値を取得するメソッド。
+    共有メモリ上のリングバッファ（書き込みは weight_reader のみ）を読み取るクラス
     """
-    process = subprocess.Popen([EXECUTABLE_PATH])
-    memory=posix_ipc.SharedMemory(SHM_NAME)
-    map_file=mmap.mmap(memory.fd,ctypes.sizeof(SensorData),mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
-    try:
+    def __init__(self, name=SHM_NAME, sem_name=SEM_NAME, timeout=5.0, is_alive=None):
+        """
+        書き込み側が共有メモリを初期化するまで待ってから割り当てる
+
+        Args:
+            name (str): 共有メモリの名前
+            sem_name (str): 新しいデータを通知するセマフォの名前
+            timeout (float): 初期化を待つ最大時間（秒）
+            is_alive: 待つのをやめる場合に False を返す関数（書き込み側の終了や停止の要求）
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.memory = posix_ipc.SharedMemory(name)
+                if self.memory.size >= ctypes.sizeof(RingHeader):
+                    self.map_file = mmap.mmap(self.memory.fd, self.memory.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+                    self.header = RingHeader.from_buffer(self.map_file)
+                    if self.header.magic == RING_MAGIC:
+                        break
+                    del self.header
+                    self.map_file.close()
+                self.memory.close_fd()
+            except posix_ipc.ExistentialError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"shared memory {name} was not initialized")
+            if is_alive is not None and not is_alive():
+                raise InterruptedError(f"stopped before shared memory {name} was initialized")
+            time.sleep(0.01)
+
+        # セマフォはmagicが書かれる前に作られている
+        self.semaphore = posix_ipc.Semaphore(sem_name)
+        if self.header.version != RING_VERSION or self.header.record_size != ctypes.sizeof(SensorRecord):
+            self.close()
+            raise ValueError("shared memory layout does not match weight_reader")
+        self.capacity = self.header.capacity
+        self.records = (SensorRecord * self.capacity).from_buffer(self.map_file, ctypes.sizeof(RingHeader))
+        self.record_array = np.frombuffer(self.map_file, dtype=RECORD_DTYPE, count=self.capacity,
+                                          offset=ctypes.sizeof(RingHeader))
+        self.read_seq = 0
+        self.lost = 0  # 書き込み側に追い越されて失ったレコード数の累計
+        self.latency = LatencyStats()  # 変換（DRDY）から drain までの遅延
+
+    def _load_write_seq(self):
+        # 32bit環境で64bit値が途中で読まれないよう、2回一致するまで読む
         while True:
-            map_file.seek(0)
-            sensor_data = SensorData.from_buffer_copy(map_file)
-            if sensor_data.ready:
-                weight = sensor_data.weight
+            first = self.header.write_seq
+            if self.header.write_seq == first:
+                return first
+
+    def wait(self, timeout=1.0):
+        """
+        新しいデータが書き込まれるまでブロックする
+
+        Returns:
+            bool: データが届いたら True、タイムアウトなら False
+        """
+        try:
+            if posix_ipc.SEMAPHORE_TIMEOUT_SUPPORTED:
+                self.semaphore.acquire(timeout)
+            else:
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        self.semaphore.acquire(0)
+                        break
+                    except posix_ipc.BusyError:
+                        if time.monotonic() > deadline:
+                            raise
+                        time.sleep(0.001)
+        except posix_ipc.BusyError:
+            return False
+        # 溜まっている通知はこの後の drain でまとめて処理するので消費しておく
+        try:
+            while True:
+                self.semaphore.acquire(0)
+        except posix_ipc.BusyError:
+            pass
+        return True
+
+    def drain(self):
+        """
+        未読のレコードをまとめて取り出す
+
+        Returns:
+            tuple: (WeightRecordのリスト, 今回追い越されて失ったレコード数)
+        """
+        write_seq = self._load_write_seq()
+        if write_seq < self.read_seq:
+            # 書き込み側が再起動してシーケンスが巻き戻った
+            self.read_seq = 0
+        lost = 0
+        if write_seq - self.read_seq > self.capacity:
+            # 書き込み側に1周以上追い越された分は読めない
+            lost = write_seq - self.capacity - self.read_seq
+            self.read_seq = write_seq - self.capacity
+
+        records = []
+        now_ns = time.monotonic_ns()
+        for seq in range(self.read_seq, write_seq):
+            record = self.records[seq % self.capacity]
+            if record.seq != seq:
+                lost += 1
+                continue
+            timestamp_ns = record.timestamp_ns
+            weight = record.weight
+            # 読んでいる間に上書きされていないか確認する
+            if record.seq != seq:
+                lost += 1
+                continue
+            records.append(WeightRecord(seq, timestamp_ns, weight))
+            self.latency.add(timestamp_ns, now_ns)
+
+        self.read_seq = write_seq
+        self.header.read_seq = write_seq
+        self.lost += lost
+        return records, lost
+
+    def drain_array(self):
+        """
+        未読のレコードをまとめて NumPy の配列（RECORD_DTYPE）で取り出す
+
+        drain() と同じ確認を1件ずつではなく配列全体に対して行う。
+
+        Returns:
+            tuple: (配列, 今回追い越されて失ったレコード数)
+        """
+        write_seq = self._load_write_seq()
+        if write_seq < self.read_seq:
+            self.read_seq = 0
+        lost = 0
+        if write_seq - self.read_seq > self.capacity:
+            lost = write_seq - self.capacity - self.read_seq
+            self.read_seq = write_seq - self.capacity
+
+        seqs = np.arange(self.read_seq, write_seq, dtype=np.uint64)
+        index = seqs % self.capacity
+        block = self.record_array[index]
+        # コピーした値とコピーした後の共有メモリの seq がどちらも期待どおりなら、途中で上書きされていない
+        valid = (block["seq"] == seqs) & (self.record_array["seq"][index] == seqs)
+        if not valid.all():
+            lost += int(np.count_nonzero(~valid))
+            block = block[valid]
+        self.latency.add_block(block["timestamp_ns"])
+
+        self.read_seq = write_seq
+        self.header.read_seq = write_seq
+        self.lost += lost
+        return block, lost
+
+    def close(self):
+        """共有メモリの割り当てを解除する"""
+        # from_buffer で作ったビューを先に破棄しないと mmap を閉じられない
+        self.record_array = None
+        self.records = None
+        self.header = None
+        self.map_file.close()
+        self.memory.close_fd()
+        self.semaphore.close()
 
-                if callback:
-                    callback(weight)
 
-                sensor_data.ready=False
-                map_file.seek(0)
-                map_file.write(bytes(sensor_data))
-                map_file.flush()
-            time.sleep(0.5)
+def unlink_ring(name=SHM_NAME, sem_name=SEM_NAME):
+    """共有メモリとセマフォを削除する（残っていなければ何もしない）"""
+    for unlink, target in ((posix_ipc.unlink_shared_memory, name), (posix_ipc.unlink_semaphore, sem_name)):
+        try:
+            unlink(target)
+        except posix_ipc.ExistentialError:
+            pass
 
+
+class AcquisitionEngine:
+    """
+    weight_reader を起動して共有メモリから読み続けるエンジン
+
+    start() でバックグラウンドの読み取りを始め、stop() で読み取りループ・子プロセス・
+    共有メモリとセマフォをすべて片付けてから戻る。stop() の後は何度でも start() できる。
+    """
+    def __init__(self, batch_callback, command=None, name=SHM_NAME, sem_name=SEM_NAME, as_array=False):
+        """
+        初期化
+
+        Args:
+            batch_callback: (レコードのリスト, 取りこぼした件数) を受け取る関数
+            command (list): 起動する書き込み側のコマンド（省略時は weight_reader）
+            name (str): 共有メモリの名前
+            sem_name (str): セマフォの名前
+            as_array (bool): True ならレコードのリストの代わりに NumPy の配列（RECORD_DTYPE）を渡す
+        """
+        self.batch_callback = batch_callback
+        self.as_array = as_array
+        self.command = command or [EXECUTABLE_PATH]
+        self.name = name
+        self.sem_name = sem_name
+        self.process = None
+        self.starts = 0          # start() した回数
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._ring = None
+        self._ring_lock = threading.Lock()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """読み取りを始める（動いていれば何もしない）"""
+        if self.is_running():
+            return
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.run, args=(self._stop_event,))
+        self._thread.daemon = True
+        self._thread.start()
+        self.starts += 1
+
+    def stop(self, timeout=3.0):
+        """
+        読み取りを止めて後始末が終わるまで待つ
+
+        Returns:
+            bool: 時間内に止まれば True
+        """
+        self._stop_event.set()
+        # セマフォで待っている読み取りループを起こす
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring.semaphore.release()
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        stopped = not self._thread.is_alive()
+        if stopped:
+            self._thread = None
+        return stopped
+
+    def restart(self):
+        """止めてから始め直す"""
+        self.stop()
+        self.start()
+
+    def run(self, stop_event=None):
+        """
+        止められるまで読み取りを続ける（start() からは別スレッドで呼ばれる）
+
+        Args:
+            stop_event (threading.Event): セットされたら終了する
+        """
+        stop_event = stop_event or threading.Event()
+        # 前回の実行で残った共有メモリとセマフォを削除してから起動する
+        unlink_ring(self.name, self.sem_name)
+        process = subprocess.Popen(self.command)
+        self.process = process
+        ring = None
+        try:
+            ring = SensorRing(self.name, self.sem_name,
+                              is_alive=lambda: process.poll() is None and not stop_event.is_set())
+            with self._ring_lock:
+                self._ring = ring
+            while not stop_event.is_set():
+                # 書き込み側からの通知を待つ（タイムアウトしても溜まっている分は確認する）
+                ring.wait(timeout=1.0)
+                if stop_event.is_set():
+                    break
+                records, lost = ring.drain_array() if self.as_array else ring.drain()
+                if len(records) or lost:
+                    self.batch_callback(records, lost)
+                if process.poll() is not None:
+                    print(f"書き込み側のプロセスが終了しました（終了コード {process.returncode}）")
+                    break
+        except InterruptedError:
+            if not stop_event.is_set():
+                print(f"書き込み側のプロセスが共有メモリを用意する前に終了しました（終了コード {process.returncode}）")
+        except (TimeoutError, ValueError) as e:
+            print(f"共有メモリを開けませんでした: {e}")
+        finally:
+            with self._ring_lock:
+                self._ring = None
+            if ring:
+                ring.close()
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=1.0)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            unlink_ring(self.name, self.sem_name)
+            self.process = None
+
+
+def get_weight_data(callback=None, batch_callback=None, stop_event=None):
+    """
+    センサーからの生の読み取り値を取得するメソッド。
+    溜まっているレコードをまとめて取り出し、callback には1件ずつ重量を、
+    batch_callback には (レコードのリスト, 取りこぼした件数) を渡す。
+    各レコードの timestamp_ns は変換完了（DRDY）時点の time.monotonic_ns() と同じ時計。
+    stop_event を渡すと、セットされたところで後始末をして戻る。
+    """
+    def on_batch(records, lost):
+        if lost and batch_callback is None:
+            print(f"読み取りが間に合わず{lost}件のデータを取りこぼしました")
+        if batch_callback:
+            batch_callback(records, lost)
+        if callback:
+            for record in records:
+                callback(record.weight)
+
+    try:
+        AcquisitionEngine(on_batch).run(stop_event)
     except KeyboardInterrupt:
         print("closed")
 
-    finally:
-        map_file.close()
-        memory.close()
-        process.terminate()
\ No newline at end of file
+
+def run_mock_writer(rate=10.0, capacity=1024, name=SHM_NAME, sem_name=SEM_NAME):
+    """ハードウェアなしで試すための模擬 weight_reader（同じ形式のリングバッファに書き込む）"""
+    size = ctypes.sizeof(RingHeader) + capacity * ctypes.sizeof(SensorRecord)
+    # 読み取り側が待つセマフォは magic より先に作る
+    semaphore = posix_ipc.Semaphore(sem_name, posix_ipc.O_CREAT, initial_value=0)
+    memory = posix_ipc.SharedMemory(name, posix_ipc.O_CREAT, size=size)
+    map_file = mmap.mmap(memory.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+    memory.close_fd()
+    header = RingHeader.from_buffer(map_file)
+    records = (SensorRecord * capacity).from_buffer(map_file, ctypes.sizeof(RingHeader))
+    header.version = RING_VERSION
+    header.capacity = capacity
+    header.record_size = ctypes.sizeof(SensorRecord)
+    for record in records:
+        record.seq = RECORD_WRITING
+    header.magic = RING_MAGIC
+
+    base_weight = 8300000
+    noise = 60.0  # 実機の HX711 と同じくらいのノイズ（標準偏差、カウント）
+    seq = 0
+    try:
+        while True:
+            record = records[seq % capacity]
+            record.seq = RECORD_WRITING
+            record.timestamp_ns = time.monotonic_ns()
+            record.weight = round(random.gauss(base_weight, noise))
+            record.seq = seq
+            seq += 1
+            header.write_seq = seq
+            semaphore.release()
+            time.sleep(1.0 / rate)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    if "--mock" in sys.argv:
+        run_mock_writer(80.0 if "--80sps" in sys.argv else 10.0)
+    else:
+        get_weight_data(callback=print)
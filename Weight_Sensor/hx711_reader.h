@@ -0,0 +1,125 @@
+// HX711の読み取り処理（weight_reader.cpp / weight_stream.cpp で共通）
+#pragma once
+#include <cstdint>
+#include <ctime>
+#include <cstring>
+#include <chrono>
+#include <mutex>
+#include <condition_variable>
+#include <wiringPi.h>
+
+//CLOCK_MONOTONICのナノ秒（Pythonの time.monotonic_ns() と同じ時計）
+static uint64_t monotonic_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return uint64_t(ts.tv_sec) * 1000000000ull + uint64_t(ts.tv_nsec);
+}
+
+//DRDY（DOUTの立ち下がり）待ちの状態。割り込みは1本のDOUTにだけ設定する
+static std::mutex drdyMutex;
+static std::condition_variable drdyCond;
+static uint64_t drdyCount = 0;          //変換完了の立ち下がりを受けた回数
+static uint64_t drdyConsumed = 0;       //読み出しに使った立ち下がりの回数
+static uint64_t drdyLastNs = 0;         //最後の立ち下がりの時刻
+static uint64_t drdyPrevNs = 0;         //前回読み出した変換の時刻
+static bool hx711Shifting = false;      //読み出し中（データビットの変化を無視する）
+static uint64_t hx711PeriodNs = 100000000ull; //変換周期（10SPS）
+static int hx711GainPulses = 25;        //1回の読み出しのクロック数（25:A/128, 26:B/32, 27:A/64）
+static unsigned long hx711Timeouts = 0; //タイムアウトした回数（センサー未接続など）
+static unsigned long hx711Missed = 0;   //読み出せずに失われた変換の数
+
+//DOUTの立ち下がり割り込み（wiringPiの割り込みスレッドで呼ばれる）
+static void onHx711Drdy() {
+    uint64_t now = monotonic_ns();
+    std::lock_guard<std::mutex> lock(drdyMutex);
+    if (hx711Shifting) return;
+    drdyCount++;
+    drdyLastNs = now;
+    drdyCond.notify_one();
+}
+
+//HX711の初期化（wiringPiSetupGpioはプロセス起動時に一度だけ呼ぶ）
+static void setupHx711(int GpioPinDT = 2, int GpioPinSCK = 3) {
+    wiringPiSetupGpio();
+    pinMode(GpioPinDT, OUTPUT);
+    digitalWrite(GpioPinDT, HIGH);
+    pinMode(GpioPinSCK, OUTPUT);
+    digitalWrite(GpioPinSCK, LOW);
+    pinMode(GpioPinDT, INPUT);
+    wiringPiISR(GpioPinDT, INT_EDGE_FALLING, &onHx711Drdy);
+}
+
+//チャンネルとゲインの指定（"A128", "B32", "A64"）。次の読み出しの後の変換から有効になる
+static bool setHx711Gain(const char* gain) {
+    if (strcmp(gain, "A128") == 0) hx711GainPulses = 25;
+    else if (strcmp(gain, "B32") == 0) hx711GainPulses = 26;
+    else if (strcmp(gain, "A64") == 0) hx711GainPulses = 27;
+    else return false;
+    return true;
+}
+
+//RATEピンで変換レートを切り替える（HIGH: 80SPS, LOW: 10SPS）
+static void setHx711Rate(int GpioPinRATE, bool highRate) {
+    pinMode(GpioPinRATE, OUTPUT);
+    digitalWrite(GpioPinRATE, highRate ? HIGH : LOW);
+    hx711PeriodNs = highRate ? 12500000ull : 100000000ull;
+}
+
+//変換が終わる（DOUTが立ち下がる）まで眠って待つ。すでにLOWならすぐ戻る
+//timeout_ms以内に来なければfalse（センサーが外れている場合など）
+static bool waitHx711Ready(int GpioPinDT, int timeout_ms, uint64_t* drdy_ns = nullptr) {
+    std::unique_lock<std::mutex> lock(drdyMutex);
+    if (digitalRead(GpioPinDT) == 1) {
+        uint64_t seen = drdyCount;
+        if (!drdyCond.wait_for(lock, std::chrono::milliseconds(timeout_ms),
+                               [&] { return drdyCount != seen; })) {
+            hx711Timeouts++;
+            return false;
+        }
+    }
+    //割り込みを受けていればその時刻、受けていなければ今を変換時刻とする
+    uint64_t ready_ns = drdyCount != drdyConsumed ? drdyLastNs : monotonic_ns();
+    drdyConsumed = drdyCount;
+    //前回の変換から周期の1.5倍以上空いていれば、その間の変換を読み損ねている
+    if (drdyPrevNs != 0 && ready_ns - drdyPrevNs > hx711PeriodNs + hx711PeriodNs / 2) {
+        hx711Missed += (ready_ns - drdyPrevNs + hx711PeriodNs / 2) / hx711PeriodNs - 1;
+    }
+    drdyPrevNs = ready_ns;
+    if (drdy_ns) *drdy_ns = ready_ns;
+    return true;
+}
+
+//センサデータの取得（setupHx711を呼んだ後で使う）
+//drdy_nsを渡すと、DOUTがLOWになった（変換が終わった）時刻を書き込む
+static unsigned int readHx711Count(int GpioPinDT = 2, int GpioPinSCK = 3, uint64_t* drdy_ns = nullptr) {
+    int i;
+    unsigned int Count = 0;
+    while (digitalRead(GpioPinDT) == 1) {
+        i = 0;
+    }
+    if (drdy_ns) *drdy_ns = monotonic_ns();
+    {
+        std::lock_guard<std::mutex> lock(drdyMutex);
+        hx711Shifting = true;
+    }
+    for (i = 0; i < 24; i++) {
+        digitalWrite(GpioPinSCK, HIGH);
+        Count = Count << 1;
+
+        digitalWrite(GpioPinSCK, LOW);
+        if (digitalRead(GpioPinDT) == 0) {
+            Count = Count + 1;
+        }
+    }
+    Count = Count ^ 0x800000;
+    //次の変換のチャンネル・ゲインを指定するパルス
+    for (i = 24; i < hx711GainPulses; i++) {
+        digitalWrite(GpioPinSCK, HIGH);
+        digitalWrite(GpioPinSCK, LOW);
+    }
+    {
+        std::lock_guard<std::mutex> lock(drdyMutex);
+        hx711Shifting = false;
+    }
+    return Count;
+}
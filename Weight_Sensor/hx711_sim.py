@@ -0,0 +1,212 @@
+"""
+gpiozero の MockFactory 上で動く模擬HX711
+
+実機なしで hx711.HX711Reader を動かすためのもの。
+PD_SCKの立ち上がりでDOUTに次のビットを出し、25パルス目で次の変換を始める。
+PD_SCKが60µs以上HIGHのままだとパワーダウンしたものとして扱う。
+変換の完了時には別スレッドからDOUTを下げるので、エッジ割り込みでの待機も試せる。
+"""
+import time
+import random
+import threading
+
+from gpiozero.pins.mock import MockFactory, MockPin
+
+from hx711 import HX711Reader, HX711_DAT_PIN, HX711_CLK_PIN, POWER_DOWN_NS, RATE_10SPS, RATE_80SPS
+
+
+class _FastMockPin(MockPin):
+    """状態の履歴（states）を残さないMockPin（長時間のベンチマークでもメモリが増えない）"""
+    def _change_state(self, value):
+        if self._state != value:
+            self._last_change = time.monotonic()
+            self._state = value
+            return True
+        return False
+
+
+# 直前の読み出しのクロック数ごとの、次の変換の倍率（A128を1とする）
+GAIN_SCALE = {25: 1.0, 26: 0.25, 27: 0.5}
+
+
+class HX711ClockPin(_FastMockPin):
+    """状態が変わるたびに模擬HX711へ通知するクロックピン（複数のHX711で共有できる）"""
+    def __init__(self, factory, info):
+        super().__init__(factory, info)
+        self.sensors = []
+
+    def _set_state(self, value):
+        super()._set_state(value)
+        for sensor in self.sensors:
+            sensor.on_clock(bool(value))
+
+
+class HX711DataPin(_FastMockPin):
+    """読まれたときに変換が終わっていればLOWになるデータピン"""
+    def __init__(self, factory, info):
+        super().__init__(factory, info)
+        self.hx711 = None
+
+    def _get_state(self):
+        if self.hx711 is not None and self.hx711._next_ready is not None:
+            self.hx711.update()
+        return self._state
+
+    def shift_out(self, bit):
+        """
+        読み出し中のビットを出す（エッジの通知はしない）
+
+        実機ではDOUTの変化による割り込みは別のスレッドで処理され、クロックのHIGH時間には入らない。
+        模擬でその場で通知するとHIGH時間が実機より大きく延びるので、ビットの変化では通知しない。
+        """
+        self._change_state(bool(bit))
+
+    def end_shift(self):
+        """読み出しの終わりにDOUTをHIGHに戻す（ビットの変化を通知していないので、状態が同じでも通知する）"""
+        self._change_state(True)
+        if self._edges in ("both", "rising") and self._when_changed is not None:
+            self._call_when_changed()
+
+
+class MockHX711:
+    """
+    模擬HX711
+
+    Args:
+        pin_factory: MockFactory
+        dat_pin, clk_pin: 接続するピン
+        sample_rate (float): 変換レート（SPS）。rate_pin を使う場合は無視する
+        source: 次の読み取り値（A128での24ビット符号付き整数）を返す関数
+        rate_pin: RATEピン（HIGHで80SPS、LOWで10SPS）
+        power_down_ns (int): PD_SCKがこれより長くHIGHならパワーダウンする（実機は60µs）
+    """
+    def __init__(self, pin_factory, dat_pin=HX711_DAT_PIN, clk_pin=HX711_CLK_PIN, sample_rate=10.0, source=None,
+                 rate_pin=None, power_down_ns=POWER_DOWN_NS):
+        self.clock_pin = pin_factory.pin(clk_pin, pin_class=HX711ClockPin)
+        self.data_pin = pin_factory.pin(dat_pin, pin_class=HX711DataPin)
+        self.clock_pin.sensors.append(self)
+        self.data_pin.hx711 = self
+        self.rate_pin = None
+        if rate_pin is not None:
+            self.rate_pin = pin_factory.pin(rate_pin, pin_class=_FastMockPin)
+        self.sample_rate = sample_rate
+        self.power_down_ns = power_down_ns
+        self.period = 1.0 / self._current_rate()
+        self.source = source or (lambda: int(random.gauss(100000, 50)))
+        self.pulses = 0          # 今回の読み出しで受けたクロック数
+        self.value = 0           # 出力中の値
+        self.gain_pulses = 25    # 直前の読み出しで指定されたゲイン（25:A/128, 26:B/32, 27:A/64）
+        self.conversions = 0     # 変換回数
+        self.power_downs = 0     # パワーダウンした回数
+        self._high_since = None
+        self._ready_at = None    # 直前の変換が終わった（予定の）時刻
+        self._next_ready = time.monotonic() + self.period
+        self._closed = False
+        self._cond = threading.Condition(threading.RLock())
+        # 変換の完了時刻になったらDOUTを下げるスレッド
+        # （読み出し中にスレッドを起動するとクロックのHIGH時間が延びるので、常駐させておく）
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _current_rate(self):
+        if self.rate_pin is None:
+            return self.sample_rate
+        return RATE_80SPS if self.rate_pin.state else RATE_10SPS
+
+    def _start_conversion(self, restart=False):
+        # RATEピンは変換を始めるときに読む
+        period = 1.0 / self._current_rate()
+        now = time.monotonic()
+        if restart or self._ready_at is None or period != self.period:
+            self._next_ready = now + period
+            self.period = period
+            self._cond.notify()
+        else:
+            # 実機と同じく変換は読み出しと関係なく一定の周期で続く（読み出しが遅れて過ぎた回の変換は失われる）
+            # スレッドは次の完了時刻に自分で起きるので通知しない
+            # （25発目のクロックの中で起こすと、そのスレッドへの切り替えでHIGH時間が延びる）
+            self._next_ready = self._ready_at + (int((now - self._ready_at) // period) + 1) * period
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if self._next_ready is None:
+                    # 読み出されるまでは、周期どおりに次の変換が終わる時刻ごとに起きて確かめる
+                    elapsed = time.monotonic() - self._ready_at
+                    self._cond.wait(self.period - elapsed % self.period)
+                    continue
+                remaining = self._next_ready - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                else:
+                    self.update()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def update(self):
+        """変換が終わっていればDOUTをLOWにする"""
+        with self._cond:
+            if self._next_ready is not None and time.monotonic() >= self._next_ready:
+                self._ready_at, self._next_ready = self._next_ready, None
+                self.pulses = 0
+                value = int(self.source() * GAIN_SCALE[self.gain_pulses])
+                self.value = max(-0x800000, min(0x7FFFFF, value)) & 0xFFFFFF
+                self.conversions += 1
+                self.data_pin.drive_low()
+
+    def on_clock(self, high):
+        now = time.perf_counter_ns()
+        with self._cond:
+            self._on_clock(high, now)
+
+    def _on_clock(self, high, now):
+        if not high:
+            if self._high_since is not None and now - self._high_since > self.power_down_ns:
+                # パワーダウンからの復帰はリセット扱い（A128に戻る）
+                self.power_downs += 1
+                self.gain_pulses = 25
+                self.data_pin.end_shift()
+                self._start_conversion(restart=True)
+            self._high_since = None
+            return
+
+        self._high_since = now
+        if self._next_ready is not None:
+            self.update()
+        if self._next_ready is None:
+            self.pulses += 1
+            if self.pulses <= 24:
+                # 立ち上がりでMSBから順にビットを出す
+                self.data_pin.shift_out((self.value >> (24 - self.pulses)) & 1)
+            else:
+                # 25パルス目でDOUTをHIGHに戻して次の変換を始める
+                self.data_pin.end_shift()
+                self.gain_pulses = self.pulses
+                self._start_conversion()
+        elif 25 <= self.pulses < 27:
+            # 26, 27パルス目は次の変換のゲイン・チャンネル指定
+            self.pulses += 1
+            self.gain_pulses = self.pulses
+
+
+def create_mock_reader(sample_rate=10.0, source=None, rate_pin=None, **kwargs):
+    """模擬HX711につながった HX711Reader を作る（kwargs は HX711Reader に渡す）"""
+    factory = MockFactory()
+    sensor = MockHX711(factory, sample_rate=sample_rate, source=source, rate_pin=rate_pin)
+    reader = HX711Reader(pin_factory=factory, sample_rate=sample_rate, rate_pin=rate_pin, **kwargs)
+    return reader, sensor
+
+
+if __name__ == "__main__":
+    values = iter([123456, -123456, 0x7FFFFF, -0x800000, 1, -1])
+    reader, sensor = create_mock_reader(sample_rate=80.0, source=lambda: next(values))
+    for _ in range(6):
+        value = reader.read(timeout=1.0)
+        print(f"読み取り値: {value}, 最大HIGH時間: {max(reader.pulse_widths_ns) / 1000:.1f} µs")
+    print(f"パワーダウン: {sensor.power_downs}, 破棄: {reader.power_down_errors}")
+    print(f"読み損ね: {reader.missed_conversions}, タイムアウト: {reader.timeouts}")
@@ -1,52 +1,528 @@
-from hx711_memory import get_weight_data
+from hx711_memory import AcquisitionEngine, RECORD_DTYPE
+from weight_stream import LatencyStats
+from sensor_broker import connect_broker
+from weight_filters import StabilityDetector
+from collections import namedtuple, deque
+from concurrent.futures import Future
+import numpy as np
+import asyncio
 import threading
 import time
 
+# 安定とみなす重量の標準偏差の既定値（g）
+STABLE_TOLERANCE = 0.5
+# factor を渡さない（重量が生の値の差＝カウントの）ときに、g で決めた既定値をカウントに直す目安
+# （アプリの既定の校正値: 300g で 113318 カウント）
+NOMINAL_COUNTS_PER_GRAM = 113318.0 / 300.0
+
+# subscribe() で渡すブロックの型
+BLOCK_DTYPE = np.dtype([("seq", "<u8"), ("timestamp_ns", "<u8"), ("raw", "<f8"), ("weight", "<f8")])
+
+# readings() が返す1件分の読み取り値
+Reading = namedtuple("Reading", ["seq", "timestamp_ns", "raw", "weight"])
+
+# get_sample() が返す最新値（変更できないので、参照を取り出せば常にそろった値になる）
+Snapshot = namedtuple("Snapshot", ["seq", "timestamp_ns", "weight"])
+
+
+class BlockSubscription:
+    """
+    HX711.subscribe() の購読
+
+    読み取り値を max_block 件たまるか、一番古い値の変換から max_latency 秒たった時点で
+    連続した NumPy の配列（BLOCK_DTYPE）にまとめ、購読ごとのスレッドからコールバックに渡す。
+    コールバックが遅くても読み取りや他の購読は待たされない。
+    """
+    def __init__(self, callback, max_block=256, max_latency=0.1, max_pending=None):
+        """
+        初期化
+
+        Args:
+            callback: ブロック（BLOCK_DTYPE の配列）を受け取る関数
+            max_block (int): 1回に渡す最大の件数
+            max_latency (float): 変換からコールバックまでの最大の待ち時間（秒）
+            max_pending (int): 渡しきれずに溜めておく最大の件数（超えたら古いものから捨てる）
+        """
+        self.callback = callback
+        self.max_block = max_block
+        self.max_latency_ns = int(max_latency * 1e9)
+        self.max_pending = max_pending or max_block * 16
+        self.delivered = 0      # コールバックに渡した件数
+        self.overflows = 0      # 溜めきれずに捨てた件数
+        self._pending = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def push(self, block):
+        """ブロックを追加する（読み取りスレッドから呼ばれるので待たない）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append(block)
+            self._count += len(block)
+            if self._count > self.max_pending:
+                # 古いものから捨てる
+                merged = np.concatenate(self._pending)
+                self.overflows += len(merged) - self.max_pending
+                self._pending = [merged[-self.max_pending:]]
+                self._count = self.max_pending
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._count < self.max_block:
+                    if not self._count:
+                        self._cond.wait()
+                        continue
+                    oldest_ns = int(self._pending[0]["timestamp_ns"][0])
+                    remaining = (oldest_ns + self.max_latency_ns - time.monotonic_ns()) / 1e9
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._count:
+                    return
+                pending = np.concatenate(self._pending)
+                self._pending = []
+                self._count = 0
+            for start in range(0, len(pending), self.max_block):
+                block = pending[start:start + self.max_block]
+                self.callback(block)
+                self.delivered += len(block)
+
+    def close(self, timeout=2.0):
+        """溜まっている分を渡してから購読をやめる"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+
+class _TareRequest:
+    """
+    実行中の風袋引き（読み取りスレッドが生の値を集め、そろったら基準値を差し替える）
+    """
+    def __init__(self, samples, wait_stable, timeout):
+        self.samples = samples
+        self.wait_stable = wait_stable
+        self.timeout = timeout
+        self.values = deque(maxlen=samples)
+        self.future = Future()
+        self.timer = None   # timeout を過ぎたら終わらせるタイマー（サンプルが届かなくても動く）
+
+    def add(self, raw, stable):
+        """
+        生の値を加える
+
+        Returns:
+            float: そろったら新しい基準値（まだなら None）
+        """
+        if self.wait_stable and not stable:
+            # 落ち着くまでの値は使わない
+            self.values.clear()
+        else:
+            self.values.extend(raw.tolist())
+        if len(self.values) >= self.samples:
+            return sum(self.values) / len(self.values)
+        return None
+
+    def timeout_error(self):
+        reason = "重量が安定しませんでした" if self.wait_stable else "サンプルが集まりませんでした"
+        return TimeoutError(f"風袋引きがタイムアウトしました（{reason}）")
+
+
 class HX711:
-    def __init__(self):
+    def __init__(self, command=None, filters=None, stability=None, zero_tracker=None, decimator=None,
+                 factor=None):
+        """
+        初期化
+
+        重量は基準値との生の値の差に factor をかけたもの（factor を渡せば g、渡さなければ ADC のカウント）。
+        フィルター・安定の判定・ゼロ点の追従・next_stable_weight() はすべてこの重量の単位で動く。
+
+        Args:
+            command (list): 共有メモリに書き込むプロセスのコマンド（省略時は weight_reader）
+            filters: 重量にかけるフィルター（weight_filters.FilterPipeline など。省略時はかけない）
+            stability (StabilityDetector): 安定の判定（省略時は直近16件の標準偏差が0.5g以下で安定。
+                                           factor が無ければ同じ目安をカウントに直した値を使う）
+            zero_tracker (ZeroTracker): ゼロ点の自動追従（省略時は行わない。band などは重量の単位で指定する）
+            decimator (Decimator): 読み取り値を間引いてから使う（省略時は間引かない）。
+                                   current_weight・購読・readings() はすべて間引いた後の値になる
+            factor (float): 生の値の差を g にする係数（weight_calibration の factor。None ならカウントのまま）
+        """
+        if zero_tracker is not None and (zero_tracker.unit == "g") != (factor is not None):
+            # 単位が合わないと band などが桁違いになり、追従がまったく働かないか、載せた物まで消してしまう
+            weight_unit = "g" if factor is not None else "counts"
+            raise ValueError(f"ZeroTracker の単位（{zero_tracker.unit}）が重量の単位（{weight_unit}）と合いません。"
+                             "g で使うには factor を渡してください")
         self.reference_weight = None
-        self.current_weight = 0
-        self.is_running = False
+        self.factor = factor
+        self.filters = filters
+        if stability is None:
+            tolerance = STABLE_TOLERANCE if factor is not None else STABLE_TOLERANCE * NOMINAL_COUNTS_PER_GRAM
+            stability = StabilityDetector(tolerance=tolerance)
+        self.stability = stability
+        self.zero_tracker = zero_tracker
+        self.decimator = decimator
+        # 最新値。読み取りスレッドが新しい Snapshot を作って差し替えるだけなので、読む側はロックを取らない
+        self._snapshot = Snapshot(None, None, 0)
+        self.lost = 0                  # 取りこぼしたサンプル数
+        self.latency = LatencyStats()  # 変換から取り込みまでの遅延
+        self._running = False          # start() されてから stop() されるまで True
+        self._subscriptions = []
+        self._listeners = []           # 読み取りスレッドでブロックごとに呼ぶ関数（readings() が使う）
+        self._engine = AcquisitionEngine(self._on_records, command, as_array=True)
+        self._stream = None            # センサーブローカーから受け取る場合の接続
+        self._tare = None              # 実行中の風袋引き（_TareRequest）
         self._thread = None
         self._lock = threading.Lock()
     
     def start(self):
-        """センサーの読み取りを開始する"""
+        """センサーの読み取りを開始する（stop() の後や、読み取りスレッドが止まった後に呼べば再開する）"""
         if self.is_running:
             return
+        if self._running:
+            # 読み取りスレッドが例外や書き込み側の終了で止まっている。後始末をしてから始め直す
+            self.stop()
             
-        self.is_running = True
-        self._thread = threading.Thread(target=self._read_weight_loop)
-        self._thread.daemon = True
-        self._thread.start()
+        self._running = True
+        # センサーブローカーが動いていれば、読み取りプロセスを起動せずにそこから受け取る
+        self._stream = connect_broker()
+        if self._stream is not None:
+            self._thread = threading.Thread(target=self._read_broker_loop, args=(self._stream,))
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._engine.start()
         
     def stop(self):
-        """センサーの読み取りを停止する"""
-        self.is_running = False
+        """センサーの読み取りを停止する（読み取りプロセスと共有メモリの後始末が終わるまで待つ）"""
+        self._running = False
+        if self._stream is not None:
+            # 接続を閉じると read_sample() の待ちが解ける
+            self._stream.close()
+            self._stream = None
         if self._thread:
             self._thread.join(timeout=2.0)
-            
-    def _read_weight_loop(self):
-        """バックグラウンドでセンサーから読み取りを行うスレッド関数"""
-        def weight_callback(weight):
+            self._thread = None
+        self._engine.stop()
+        with self._lock:
+            tare, self._tare = self._tare, None
+        if tare is not None:
+            tare.future.cancel()
+
+    def restart(self):
+        """読み取りを止めてから始め直す"""
+        self.stop()
+        self.start()
+
+    @property
+    def is_running(self):
+        """読み取り中か（start() した後でも、読み取りスレッドが止まっていれば False）"""
+        if not self._running:
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        # ブローカーから受け取っていて、接続が切れた後に読み取りプロセスへ切り替えた場合も含む
+        return self._engine.is_running()
+
+    def subscribe(self, callback, max_block=256, max_latency=0.1):
+        """
+        読み取り値を NumPy のブロックでまとめて受け取る
+
+        Args:
+            callback: BLOCK_DTYPE（seq, timestamp_ns, raw, weight）の配列を受け取る関数
+            max_block (int): 1回に渡す最大の件数
+            max_latency (float): 変換からコールバックまでの最大の待ち時間（秒）
+
+        Returns:
+            BlockSubscription: unsubscribe() に渡す
+        """
+        subscription = BlockSubscription(callback, max_block, max_latency)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def subscribe_samples(self, callback, max_latency=0.1):
+        """
+        読み取り値を1件ずつ callback(seq, timestamp_ns, weight) で受け取る（subscribe() の上の簡易版）
+        """
+        def on_block(block):
+            for seq, timestamp_ns, weight in zip(block["seq"].tolist(), block["timestamp_ns"].tolist(),
+                                                 block["weight"].tolist()):
+                callback(seq, timestamp_ns, weight)
+        return self.subscribe(on_block, max_latency=max_latency)
+
+    def unsubscribe(self, subscription):
+        """購読をやめる（溜まっている分は渡してから終わる）"""
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        subscription.close()
+
+    def _on_records(self, records, lost):
+        """読み取ったレコード（RECORD_DTYPE の配列）をまとめて反映する（読み取りスレッドから呼ばれる）"""
+        now_ns = time.monotonic_ns()
+        with self._lock:
+            self.lost += lost
+            if not len(records):
+                return
+            # 初回の計測は基準値として設定し、以降は基準値との差分
+            if self.reference_weight is None:
+                self._set_reference(float(records["weight"][0]))
+            self.latency.add_block(records["timestamp_ns"], now_ns)
+            raw, rows = records["weight"], records
+            if self.decimator is not None:
+                # 生の値のまま間引くので、基準値が変わっても間引きの状態はそのまま使える
+                raw, index = self.decimator.process(raw)
+                rows = records[index]
+            block = np.empty(len(rows), dtype=BLOCK_DTYPE)
+            block["seq"] = rows["seq"]
+            block["timestamp_ns"] = rows["timestamp_ns"]
+            block["raw"] = raw
+            block["weight"] = raw - self.reference_weight
+            if self.factor is not None:
+                block["weight"] *= self.factor
+            if len(block):
+                if self.filters is not None:
+                    block["weight"] = self.filters.process(block["weight"])
+                if self.zero_tracker is not None:
+                    block["weight"] = self.zero_tracker.apply(block["weight"])
+                # 属性への代入は1回の参照の差し替えなので、読む側が途中の状態を見ることはない
+                self._snapshot = Snapshot(int(block["seq"][-1]), int(block["timestamp_ns"][-1]),
+                                          float(block["weight"][-1]))
+                self.stability.add_block(block["weight"], block["timestamp_ns"])
+                if self.zero_tracker is not None:
+                    self.zero_tracker.update(self.stability, int(block["timestamp_ns"][-1]))
+            tare, reference = self._tare, None
+            if tare is not None:
+                reference = tare.add(records["weight"], self.stability.is_stable)
+                if reference is not None:
+                    # 次のブロックから新しい基準値で計算する
+                    self._set_reference(reference)
+                    self._tare = None
+            subscriptions = self._subscriptions
+            listeners = self._listeners
+        # コールバックから HX711 を呼んでもよいように、ロックを外してから知らせる
+        if reference is not None:
+            self._finish_tare(tare, reference)
+        if not len(block):
+            return
+        for subscription in subscriptions:
+            subscription.push(block)
+        for listener in listeners:
+            listener(block)
+
+    def _finish_tare(self, tare, reference=None, error=None):
+        """
+        風袋引きの結果を Future に入れる（self._tare から外した側だけが、ロックを外してから呼ぶ）
+
+        呼び出し側が先に Future を取り消していたら何もしない（取り消し済みの Future に結果を入れると
+        InvalidStateError になり、読み取りスレッドが止まってしまう）。
+        """
+        if tare.timer is not None:
+            tare.timer.cancel()
+        if not tare.future.set_running_or_notify_cancel():
+            return
+        if error is None:
+            tare.future.set_result(reference)
+        else:
+            tare.future.set_exception(error)
+
+    def _expire_tare(self, tare):
+        """timeout を過ぎた風袋引きを TimeoutError にする（タイマーのスレッドから呼ばれる）"""
+        with self._lock:
+            if self._tare is not tare:
+                return
+            self._tare = None
+        self._finish_tare(tare, error=tare.timeout_error())
+
+    def _forget_tare(self, tare):
+        """終わった（取り消された）風袋引きを外す。次の tare() で新しく始められるようにする"""
+        if tare.timer is not None:
+            tare.timer.cancel()
+        with self._lock:
+            if self._tare is tare:
+                self._tare = None
+
+    def _set_reference(self, reference):
+        """基準値を差し替える（ロックを取った状態で呼ぶ）"""
+        self.reference_weight = reference
+        # 基準値が変わると重量が飛ぶので、フィルターの状態も初めからにする
+        if self.filters is not None:
+            self.filters.reset()
+        self.stability.reset()
+        if self.zero_tracker is not None:
+            self.zero_tracker.reset()
+
+    async def readings(self, max_queue=256):
+        """
+        読み取り値を1件ずつ返す非同期イテレーター（async for reading in scale.readings()）
+
+        読み取りスレッドが call_soon_threadsafe でイベントループを起こすので、ポーリングはしない。
+        start() を呼んでから使う。
+
+        Args:
+            max_queue (int): 取り出されずに溜めておく最大のブロック数（超えたら古いものから捨てる）
+
+        Yields:
+            Reading: (seq, timestamp_ns, raw, weight)
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(max_queue)
+
+        def put(block):
+            # イベントループのスレッドで呼ばれる
+            if queue.full():
+                # 取りこぼした分は Reading の seq の飛びで分かる
+                queue.get_nowait()
+            queue.put_nowait(block)
+
+        def listener(block):
+            # 読み取りスレッドで呼ばれる
+            try:
+                loop.call_soon_threadsafe(put, block)
+            except RuntimeError:
+                # イベントループが閉じられている
+                pass
+
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+        try:
+            while True:
+                block = await queue.get()
+                for row in block.tolist():
+                    yield Reading(*row)
+        finally:
             with self._lock:
-                # 初回の計測は基準値として設定
-                if self.reference_weight is None:
-                    self.reference_weight = weight
-                    self.current_weight = 0
-                else:
-                    # 2回目以降は差分を計算
-                    self.current_weight = weight - self.reference_weight
-        
-        # センサーからの読み取り開始（コールバック関数を渡す）
-        get_weight_data(callback=weight_callback)
-    
+                self._listeners = [l for l in self._listeners if l is not listener]
+
+    async def next_stable_weight(self, window=None, tolerance=None, timeout=None):
+        """
+        重量が安定するまで待ってその値を返す
+
+        判定は StabilityDetector と同じ（直近 window 件の標準偏差が tolerance 以下）で、
+        単位は重量と同じ（factor を渡していれば g、渡していなければカウント）。
+
+        Args:
+            window (int): 安定の判定に使う直近の件数（省略時は stability と同じ）
+            tolerance (float): 安定とみなす標準偏差の上限（省略時は stability と同じ）
+            timeout (float): 最大の待ち時間（秒）。超えたら asyncio.TimeoutError
+
+        Returns:
+            float: 安定した window 件の平均
+        """
+        detector = StabilityDetector(window or self.stability.window,
+                                     self.stability.tolerance if tolerance is None else tolerance)
+
+        async def wait_stable():
+            readings = self.readings()
+            try:
+                async for reading in readings:
+                    detector.add(reading.weight, reading.timestamp_ns)
+                    if detector.is_stable:
+                        return detector.mean
+            finally:
+                await readings.aclose()
+
+        return await asyncio.wait_for(wait_stable(), timeout)
+
+    def _read_broker_loop(self, stream):
+        """ブローカーから受け取ったサンプルを共有メモリのレコードと同じ形で渡す"""
+        last_seq = None
+        while self._running:
+            sample = stream.read_sample(timeout=1.0)
+            if sample is None:
+                if not stream.is_running():
+                    break
+                continue
+            lost = 0 if last_seq is None else (sample.seq - last_seq - 1) & 0xFFFFFFFF
+            last_seq = sample.seq
+            self._on_records(np.array([(sample.seq, sample.timestamp_ns, sample.raw)], dtype=RECORD_DTYPE), lost)
+        if self._running:
+            # ブローカーが止まったら、センサーが空いているので自分で読み取りプロセスを起動して続ける
+            # （stop() はこのスレッドの終わりを待ってから engine を止めるので、ここで起動しても残らない）
+            print("センサーブローカーとの接続が切れたので、読み取りプロセスを起動します")
+            stream.close()
+            self._engine.start()
+
+    @property
+    def current_weight(self):
+        """最新の重量（基準値との差分。factor を渡していれば g）"""
+        return self._snapshot.weight
+
+    @property
+    def last_seq(self):
+        """最新サンプルのシーケンス番号"""
+        return self._snapshot.seq
+
+    @property
+    def last_timestamp_ns(self):
+        """最新サンプルの変換時刻（time.monotonic_ns() と同じ時計）"""
+        return self._snapshot.timestamp_ns
+
+    @property
+    def is_stable(self):
+        """重量が落ち着いているか"""
+        return self.stability.is_stable
+
+    @property
+    def time_since_stable(self):
+        """安定になってからの秒数（変換時刻が基準。不安定なら None）"""
+        return self.stability.time_since_stable()
+
+    @property
+    def settled_value(self):
+        """安定している間の平均重量（不安定になっても最後に安定していたときの値を返す。まだ一度も安定していなければ None）"""
+        return self.stability.settled_value
+
     def get_weight(self):
         """現在の重量を取得（基準値との差分）"""
-        with self._lock:
-            return self.current_weight
+        return self._snapshot.weight
     
-    def tare(self):
-        """現在の重量を0にリセット（基準値を再設定）"""
+    def get_sample(self):
+        """最新の Snapshot(シーケンス番号, 変換時刻[ns], 重量) を取得（ロックを取らない）"""
+        return self._snapshot
+
+    def tare(self, samples=16, wait_stable=False, timeout=10.0, callback=None):
+        """
+        現在の重量を0にリセット（基準値を再設定）
+
+        待たずに戻り、読み取りスレッドが samples 件の生の値を集めた時点で、その平均を新しい基準値にする。
+        それまでは前の基準値で読み取り値を返し続ける。実行中に呼んだ場合は実行中のものを返す。
+
+        Args:
+            samples (int): 平均する件数
+            wait_stable (bool): True なら重量が安定してからの samples 件を使う
+            timeout (float): 最大の待ち時間（秒）。超えたら Future は TimeoutError になる（None なら待ち続ける）
+            callback: 終わったときに Future を受け取る関数（読み取りスレッドかタイマーのスレッドから呼ばれる）
+
+        Returns:
+            concurrent.futures.Future: 新しい基準値（生の値の平均）。stop() や future.cancel() で取り消せる
+        """
         with self._lock:
-            self.reference_weight = None
\ No newline at end of file
+            tare = self._tare
+            created = tare is None
+            if created:
+                tare = self._tare = _TareRequest(max(1, samples), wait_stable, timeout)
+                if timeout is not None:
+                    # サンプルが届かなくなっても待ち続けないように、読み取りとは別に期限を切る
+                    tare.timer = threading.Timer(timeout, self._expire_tare, args=(tare,))
+                    tare.timer.daemon = True
+            future = tare.future
+        if created:
+            # 取り消されたときも self._tare から外す（ロックを外してから登録する。終わっていればすぐ呼ばれる）
+            future.add_done_callback(lambda _: self._forget_tare(tare))
+            if tare.timer is not None:
+                tare.timer.start()
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    async def tare_async(self, samples=16, wait_stable=False, timeout=10.0):
+        """tare() を await で待つ（戻り値は新しい基準値）"""
+        return await asyncio.wrap_future(self.tare(samples, wait_stable, timeout))
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+重量センサーのブローカー
+
+センサー（weight_stream の読み取りプロセス）を1つのプロセスだけが持ち、
+Unixドメインソケットで接続してきた任意の数のアプリに読み取り値を配信します。
+フレームは weight_stream と同じ20バイトの形式なので、受け取り側は WeightStream と同じように扱えます。
+
+購読者ごとに上限付きのキューを持ち、あふれたときの扱いを選べます。
+- drop-oldest: 一番古いフレームを捨てる（途中が抜けても新しい値を順に受け取りたい場合）
+- coalesce-latest: キューの末尾を最新のフレームで上書きする（溜まった分は残しつつ、最新値を必ず届けたい場合）
+遅い購読者があっても、センサーの読み取りや他の購読者への配信は止まりません。
+
+起動: python sensor_broker.py [--mock]
+"""
+import os
+import sys
+import signal
+import socket
+import threading
+from collections import deque
+
+from weight_stream import WeightStream, STREAM_PATH, FRAME_SIZE
+
+BROKER_SOCKET = "/tmp/weight_broker.sock"
+DROP_OLDEST = "drop-oldest"
+COALESCE_LATEST = "coalesce-latest"
+POLICIES = (DROP_OLDEST, COALESCE_LATEST)
+DEFAULT_QUEUE_SIZE = 64
+
+
+class Subscriber:
+    """
+    1つの接続への配信を受け持つクラス（キューと送信スレッドを持つ）
+    """
+    def __init__(self, conn, policy=DROP_OLDEST, maxsize=DEFAULT_QUEUE_SIZE):
+        self.conn = conn
+        self.policy = policy
+        self.maxsize = maxsize
+        self.sent = 0           # 送ったフレーム数
+        self.dropped = 0        # drop-oldest で捨てたフレーム数
+        self.coalesced = 0      # coalesce-latest で上書きしたフレーム数
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._send_loop)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, frame):
+        """フレームをキューに入れる（センサーの読み取りスレッドから呼ばれるので待たない）"""
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                if self.policy == COALESCE_LATEST:
+                    self._queue[-1] = frame
+                    self.coalesced += 1
+                    return
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    break
+                # 溜まっている分をまとめて送る
+                frames = b"".join(self._queue)
+                count = len(self._queue)
+                self._queue.clear()
+            try:
+                self.conn.sendall(frames)
+            except OSError:
+                break
+            self.sent += count
+        self.close()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class SensorBroker:
+    """
+    センサーを持ち、購読者にフレームを配信するブローカー
+    """
+    def __init__(self, socket_path=BROKER_SOCKET, command=None):
+        """
+        初期化
+
+        Args:
+            socket_path (str): 待ち受けるUnixドメインソケットのパス
+            command (list): センサーの読み取りコマンド（省略時は weight_stream）
+        """
+        self.socket_path = socket_path
+        self.stream = WeightStream(command or [STREAM_PATH])
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._running = False
+
+    def publish(self, frame):
+        """全ての購読者にフレームを配る"""
+        with self._lock:
+            subscribers = self.subscribers
+        for subscriber in subscribers:
+            subscriber.put(frame)
+
+    def start(self):
+        """ソケットを開いてセンサーの読み取りを始める"""
+        if self._running:
+            return
+        if os.path.exists(self.socket_path):
+            if broker_running(self.socket_path):
+                raise RuntimeError(f"ブローカーはすでに動いています: {self.socket_path}")
+            # 前回の実行で残ったソケットファイル
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen()
+        self._running = True
+        self.stream.on_frame = self.publish
+        self.stream.start()
+        thread = threading.Thread(target=self._accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            thread = threading.Thread(target=self._handshake, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _handshake(self, conn):
+        """購読の申し込み（"SUBSCRIBE <policy> <queue_size>\\n"）を受け取る"""
+        conn.settimeout(2.0)
+        try:
+            with conn.makefile("rb") as f:
+                fields = f.readline().decode("ascii", "replace").split()
+            if not fields:
+                # broker_running() による確認の接続
+                conn.close()
+                return
+            if len(fields) != 3 or fields[0] != "SUBSCRIBE" or fields[1] not in POLICIES:
+                raise ValueError(f"不正な購読の申し込み: {fields}")
+            maxsize = int(fields[2])
+            if maxsize < 1:
+                raise ValueError(f"キューの大きさは1以上です: {maxsize}")
+        except (OSError, ValueError) as e:
+            print(f"購読を受け付けられませんでした: {e}")
+            conn.close()
+            return
+        conn.settimeout(None)
+        # ソケットのバッファに溜まる分を小さくして、あふれた分はキューの方針で扱う
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, max(4096, maxsize * FRAME_SIZE))
+        subscriber = Subscriber(conn, fields[1], maxsize)
+        with self._lock:
+            # 配信中のリストを書き換えないように、作り直して差し替える
+            self.subscribers = [s for s in self.subscribers if not s.closed] + [subscriber]
+        subscriber.start()
+
+    def serve_forever(self):
+        """止められるまで配信を続ける"""
+        self.start()
+        try:
+            while self._running and self.stream.is_running():
+                self.stream._thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+        self.stream.close()
+
+
+class BrokerStream(WeightStream):
+    """
+    ブローカーからフレームを受け取るクライアント（使い方は WeightStream と同じ）
+    """
+    def __init__(self, socket_path=BROKER_SOCKET, policy=DROP_OLDEST, maxsize=DEFAULT_QUEUE_SIZE):
+        """
+        初期化
+
+        Args:
+            socket_path (str): ブローカーのソケットのパス
+            policy (str): キューがあふれたときの扱い（"drop-oldest" か "coalesce-latest"）
+            maxsize (int): ブローカー側のキューの大きさ（フレーム数）
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy は {', '.join(POLICIES)} のいずれかです: {policy}")
+        super().__init__(command=["broker", socket_path])
+        self.socket_path = socket_path
+        self.policy = policy
+        self.maxsize = maxsize
+        self._sock = None
+
+    def start(self):
+        """ブローカーに接続する（接続済みなら何もしない）"""
+        if self.is_running():
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(f"SUBSCRIBE {self.policy} {self.maxsize}\n".encode("ascii"))
+        except OSError:
+            # ブローカーが止まっている（ソケットファイルだけが残っている場合を含む）
+            sock.close()
+            raise
+        self._sock = sock
+        self._thread = threading.Thread(target=self._reader_loop, args=(sock.makefile("rb", buffering=0),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_running(self):
+        return self._sock is not None and self._thread is not None and self._thread.is_alive()
+
+    def read_sample(self, timeout=2.0):
+        """
+        WeightStream.read_sample() と同じ（ブローカーが止まって接続し直せなければ接続を閉じて None を返す）
+
+        その後は is_running() が False のままなので、get_shared_stream() は読み取りプロセスに切り替える。
+        """
+        try:
+            return super().read_sample(timeout)
+        except OSError as e:
+            print(f"センサーブローカーに接続できません: {e}")
+            self.close()
+            return None
+
+    def close(self):
+        """ブローカーとの接続を閉じる"""
+        # 別のスレッドから同時に閉じられても二重に閉じないように、先に取り出す
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+
+def broker_running(socket_path=BROKER_SOCKET):
+    """ブローカーが接続を受け付けているか"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def connect_broker(socket_path=BROKER_SOCKET, policy=DROP_OLDEST, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    ブローカーが動いていれば接続した BrokerStream を返す
+
+    Returns:
+        BrokerStream: 動いていなければ None
+    """
+    if not os.path.exists(socket_path):
+        return None
+    stream = BrokerStream(socket_path, policy, maxsize)
+    try:
+        stream.start()
+    except OSError:
+        return None
+    return stream
+
+
+if __name__ == "__main__":
+    command = None
+    if "--mock" in sys.argv:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_stream.py"), "--mock"]
+    broker = SensorBroker(command=command)
+    # kill などで止められてもソケットファイルを消してから終わる
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"ブローカーを起動しました: {broker.socket_path}")
+    broker.serve_forever()
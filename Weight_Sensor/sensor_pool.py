@@ -0,0 +1,216 @@
+"""
+複数のロードセル（HX711）をまとめて読み取るプール
+
+四隅のロードセルのように複数のHX711を使う場合に、チャンネルごとの読み取り値を
+変換サイクル単位のベクトル（PoolSample）にそろえて返します。
+
+- チャンネルごとに DAT/CLK を分けた配線: 各HX711のDRDYを同時に待ち、準備できたものから読み出す
+- PD_SCKを共有した配線: 全チャンネルのDRDYがそろってから1本のクロックで同時に読み出す
+
+どちらも読み取りスレッドは1本で、DRDYはエッジ割り込みで待つので、
+あるチャンネルの待ち時間が他のチャンネルの読み取りを遅らせることはありません。
+
+チャンネルごとの配線では各HX711が自分の発振器で変換するので、同じサイクルの値でも変換完了時刻は
+最大で1周期ずれます。各チャンネルの値は変換完了（DRDY）時刻で組み合わせ、ずれが1周期（1/sample_rate）
+以上になった組は使わずに古い方を捨てるので、返すベクトルの skew_ns は常に1周期未満です。
+同じ時点の値が必要な場合はPD_SCKを共有した配線を使ってください（ずれは読み出しにかかる時間だけになります）。
+"""
+import time
+import threading
+from collections import namedtuple
+
+from hx711 import HX711Reader, SharedClockHX711, RATE_10SPS, POWER_DOWN_NS
+
+# 1サイクル分の読み取り値
+# timestamp_ns: 最後にそろったチャンネルの変換完了時刻（time.monotonic_ns()）
+# values: チャンネル順の読み取り値
+# skew_ns: チャンネル間の変換完了時刻のずれ（1周期未満）
+PoolSample = namedtuple("PoolSample", ["seq", "timestamp_ns", "values", "skew_ns"])
+
+
+class SensorPool:
+    """
+    複数のHX711を並行して読み取り、サイクルごとの値のベクトルを返すクラス
+    """
+    def __init__(self, channels, clk_pin=None, pin_factory=None, sample_rate=RATE_10SPS,
+                 ready_timeout=1.0, gain="A128", power_down_ns=POWER_DOWN_NS):
+        """
+        初期化
+
+        Args:
+            channels (list): clk_pin が None なら (DATピン, CLKピン) のリスト、
+                             clk_pin を指定した場合は DATピンのリスト
+            clk_pin: 共有しているPD_SCKのGPIO（None ならチャンネルごとに別のクロック）
+            pin_factory: gpiozeroのピンファクトリ（省略時はデフォルト）
+            sample_rate (float): 変換レート（SPS）
+            ready_timeout (float): DRDYを待つ最大時間（秒）
+            gain (str): チャンネルとゲイン（全チャンネル共通）
+            power_down_ns (int): HX711Reader と同じ（パワーダウンの恐れがある読み取りを捨てるHIGH時間）
+        """
+        self.size = len(channels)
+        self.sample_rate = sample_rate
+        self.period_ns = int(1e9 / sample_rate)
+        self.ready_timeout = ready_timeout
+        self.readers = []
+        self.shared = None
+        if clk_pin is None:
+            for dat_pin, channel_clk_pin in channels:
+                reader = HX711Reader(dat_pin, channel_clk_pin, pin_factory=pin_factory,
+                                     sample_rate=sample_rate, ready_timeout=ready_timeout, gain=gain,
+                                     power_down_ns=power_down_ns)
+                self.readers.append(reader)
+        else:
+            self.shared = SharedClockHX711(channels, clk_pin, pin_factory=pin_factory,
+                                           sample_rate=sample_rate, ready_timeout=ready_timeout, gain=gain,
+                                           power_down_ns=power_down_ns)
+
+        self.latest = None      # 最新の PoolSample
+        self.count = 0          # そろったサイクル数
+        self.overruns = 0       # 他のチャンネルがそろう前に次の値が来て上書きした回数
+        self.timeouts = 0       # どのチャンネルからもDRDYが来なかった回数
+        self.misaligned = 0     # 他のチャンネルと1周期以上ずれていて捨てた値の数
+        self._pending = [None] * self.size  # チャンネルごとの (timestamp_ns, value)
+        self._read_count = 0
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """読み取りスレッドを開始する（開始済みなら何もしない）"""
+        if self._running:
+            return
+        self._running = True
+        if self.shared is None:
+            for reader in self.readers:
+                reader.when_ready = self._wake.set
+            target = self._channel_loop
+        else:
+            target = self._shared_loop
+        self._thread = threading.Thread(target=target)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _channel_loop(self):
+        """チャンネルごとに配線した場合: 準備できたチャンネルから読み出す"""
+        while self._running:
+            # 読み出し中のデータビットの変化でも起こされるので、調べる前に消しておく
+            self._wake.clear()
+            found = False
+            for index, reader in enumerate(self.readers):
+                if not reader.is_ready():
+                    continue
+                found = True
+                value = reader.read(timeout=0)
+                if value is not None:
+                    self._put(index, reader.last_drdy_ns, value)
+            if not found and not self._wake.wait(self.ready_timeout):
+                self.timeouts += 1
+
+    def _shared_loop(self):
+        """クロックを共有した場合: 全チャンネルを同時に読み出す"""
+        while self._running:
+            values = self.shared.read()
+            if values is None:
+                continue
+            drdy_ns = self.shared.drdy_ns
+            self._publish(max(drdy_ns), values, max(drdy_ns) - min(drdy_ns))
+
+    def _put(self, index, timestamp_ns, value):
+        with self._cond:
+            if self._pending[index] is not None:
+                self.overruns += 1
+            self._pending[index] = (timestamp_ns, value)
+            if None in self._pending:
+                return
+            timestamps = [pending[0] for pending in self._pending]
+            # 一番新しい値から1周期以上前の値は前のサイクルのものなので、そのチャンネルの次の値を待つ
+            newest = max(timestamps)
+            stale = [i for i, t in enumerate(timestamps) if newest - t >= self.period_ns]
+            if stale:
+                self.misaligned += len(stale)
+                for i in stale:
+                    self._pending[i] = None
+                return
+            values = [pending[1] for pending in self._pending]
+            self._pending = [None] * self.size
+            self._publish(max(timestamps), values, max(timestamps) - min(timestamps))
+
+    def _publish(self, timestamp_ns, values, skew_ns):
+        with self._cond:
+            self.latest = PoolSample(self.count, timestamp_ns, tuple(values), skew_ns)
+            self.count += 1
+            self._cond.notify_all()
+
+    def read(self, timeout=2.0):
+        """
+        前回の読み取り以降にそろった新しいサイクルの値を返す
+
+        Returns:
+            PoolSample: (seq, timestamp_ns, values, skew_ns)（タイムアウト時は None）
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.count == self._read_count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._read_count = self.count
+            return self.latest
+
+    def close(self):
+        """読み取りスレッドを止めてピンを解放する"""
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=(self.ready_timeout or 1.0) + 1.0)
+            self._thread = None
+        for reader in self.readers:
+            reader.when_ready = None
+            reader.close()
+        if self.shared is not None:
+            self.shared.close()
+
+
+if __name__ == "__main__":
+    # 模擬HX711を4つつないで動かす
+    import random
+    from gpiozero.pins.mock import MockFactory
+    from hx711_sim import MockHX711
+
+    factory = MockFactory()
+    sensors = []
+    corner_pins = [(5, 6), (19, 26), (20, 21), (16, 12)]
+    for index, (dat_pin, clk_pin) in enumerate(corner_pins):
+        base = 100000 * (index + 1)
+        sensors.append(MockHX711(factory, dat_pin, clk_pin, sample_rate=80.0,
+                                 source=lambda base=base: int(random.gauss(base, 50))))
+    pool = SensorPool(corner_pins, pin_factory=factory, sample_rate=80.0)
+    for _ in range(5):
+        sample = pool.read()
+        print(sample.seq, sample.values, f"ずれ {sample.skew_ns / 1e6:.2f} ms（1周期 {pool.period_ns / 1e6:.1f} ms 未満）")
+    print(f"上書き: {pool.overruns}, ずれて捨てた値: {pool.misaligned}, タイムアウト: {pool.timeouts}")
+    pool.close()
+    for sensor in sensors:
+        sensor.close()
+
+    # PD_SCKを共有した配線
+    # 模擬HX711はクロックの変化ごとに4つ分の処理を Python で行うので、HIGH時間が実機の60µsに収まらない。
+    # 模擬ではパワーダウンとみなす時間を長くしておく（実機では既定の POWER_DOWN_NS のまま使う）
+    simulated_power_down_ns = 5_000_000
+    factory = MockFactory()
+    dat_pins = [5, 19, 20, 16]
+    sensors = [MockHX711(factory, dat_pin, 6, sample_rate=80.0, source=lambda i=i: 1000 * (i + 1),
+                         power_down_ns=simulated_power_down_ns)
+               for i, dat_pin in enumerate(dat_pins)]
+    pool = SensorPool(dat_pins, clk_pin=6, pin_factory=factory, sample_rate=80.0,
+                      power_down_ns=simulated_power_down_ns)
+    for _ in range(5):
+        sample = pool.read()
+        print(sample.seq, sample.values, f"ずれ {sample.skew_ns / 1e6:.2f} ms")
+    print(f"破棄: {pool.shared.power_down_errors}")
+    pool.close()
+    for sensor in sensors:
+        sensor.close()
@@ -0,0 +1,321 @@
+"""
+長時間の連続記録（一定の大きさで区切ったセグメントと時刻の索引）
+
+何週間も動かし続けるモニター用です。記録は weight_recorder のバイナリ形式（.wrec）で、
+segment_records 件ごとに新しいセグメントのファイルに切り替えます。
+セグメントごとの最初と最後の時刻を索引（index.tsv）に残すので、時刻の範囲を指定した読み出しでは
+範囲にかかるセグメントだけを開き、その中は変換時刻の二分探索で位置を決めます（全体を読むことはありません）。
+
+    log = SessionLog("weight_data/session")
+    scale.subscribe(log.write_block)
+    ...
+    records = log.query(datetime(2026, 10, 13, 9, 0), datetime(2026, 10, 13, 9, 5))
+    view = log.overview(datetime(2026, 10, 1), datetime(2026, 10, 15), max_points=800)   # 表示用の集計
+
+重量は weight_pyramid.WeightPyramid（1秒〜10分ごとの最小・最大・平均）にも記録しながら足していくので、
+何週間分でも overview() で表示に必要な点だけをすぐに取り出せます。
+
+コマンドラインから:
+    python session_log.py record [ディレクトリ]              センサーの値を Ctrl+C まで記録する
+    python session_log.py query ディレクトリ 開始 終了 [出力.csv]  例: "2026-10-13 09:00" "2026-10-13 09:05"
+"""
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from weight_pyramid import WeightPyramid
+from weight_recorder import BinaryRecorder, Recording, RECORD_FILE_DTYPE, RECORD_SIZE, HEADER_SIZE, CSV_HEADER
+
+INDEX_FILE = "index.tsv"
+SEGMENT_SUFFIX = ".wrec"
+DEFAULT_SEGMENT_RECORDS = 1_000_000   # 1セグメントの件数（20MB、80SPS で約3.5時間）
+
+# query() が返す配列の型（レコードに時刻を足したもの）
+QUERY_DTYPE = np.dtype(RECORD_FILE_DTYPE.descr + [("wall_ns", "<i8")])
+
+
+def _to_wall_ns(value):
+    """datetime・UNIX時刻（秒）・ナノ秒の整数を time.time_ns() と同じ単位にする"""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1e9)
+    if isinstance(value, float):
+        return int(value * 1e9)
+    return int(value)
+
+
+class SessionLog:
+    """
+    セグメントに区切って記録し、時刻の範囲で読み出すクラス
+    """
+    def __init__(self, directory, segment_records=DEFAULT_SEGMENT_RECORDS, initial_offset=0.0, factor=0.0,
+                 durability="flush", pyramid=True):
+        """
+        初期化（ディレクトリと索引を用意する。セグメントは最初の書き込みで作る）
+
+        Args:
+            directory (str): セグメントと索引を置くディレクトリ
+            segment_records (int): 1セグメントの件数
+            initial_offset (float): 各セグメントのヘッダーに残すゼロ点
+            factor (float): 同じく係数
+            durability (str): weight_recorder の "none" / "flush" / "fsync"
+            pyramid (bool): 表示用の集計（WeightPyramid）を記録しながら更新する
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        self.initial_offset = initial_offset
+        self.factor = factor
+        self.durability = durability
+        self.segments_opened = 0    # 直前の query() で開いたセグメントの数
+        self._recorder = None
+        self._segment_name = None
+        self._segment_count = 0
+        self._segment_first_ns = None
+        self._segment_last_ns = None
+        self._serial = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load_index()
+        self._recover()
+        self.pyramid = None
+        if pyramid:
+            rebuild = not os.path.exists(os.path.join(directory, "pyramid_1s.bin"))
+            self.pyramid = WeightPyramid(directory)
+            if rebuild:
+                self._rebuild_pyramid()
+
+    # 索引 ----------------------------------------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self):
+        """索引を読む（セグメント名 -> (最初の時刻, 最後の時刻, 件数)）"""
+        index = {}
+        if not os.path.exists(self._index_path()):
+            return index
+        with open(self._index_path()) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 4:
+                    continue
+                index[fields[0]] = (int(fields[1]), int(fields[2]), int(fields[3]))
+        return index
+
+    def _append_index(self, name, first_ns, last_ns, count):
+        with open(self._index_path(), "a") as f:
+            f.write(f"{name}\t{first_ns}\t{last_ns}\t{count}\n")
+            f.flush()
+            if self.durability == "fsync":
+                os.fsync(f.fileno())
+        self.index[name] = (first_ns, last_ns, count)
+
+    def _recover(self):
+        """
+        索引に無いセグメントや件数が合わないセグメント（前回の実行が途中で止まったときの最後のセグメントなど）を
+        ファイルから読み直して索引に加える（同じ名前は後の行が優先される）
+        """
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            if name in self.index and self.index[name][2] == (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE:
+                continue
+            try:
+                recording = Recording(path)
+            except (OSError, ValueError) as e:
+                print(f"セグメントを読めませんでした: {name}: {e}")
+                continue
+            if len(recording):
+                wall = self._wall_ns(recording, recording.records["timestamp_ns"][[0, -1]])
+                self._append_index(name, int(wall[0]), int(wall[1]), len(recording))
+
+    @staticmethod
+    def _wall_ns(recording, timestamps_ns):
+        """セグメント（Recording または BinaryRecorder）の変換時刻（time.monotonic_ns()）を time.time_ns() の時刻にする"""
+        header = recording.header
+        return np.asarray(timestamps_ns).astype(np.int64) - header["start_monotonic_ns"] + header["start_wall_ns"]
+
+    def _rebuild_pyramid(self, chunk_size=1 << 20):
+        """集計のファイルが無いときに、これまでのセグメントから作る"""
+        for name in sorted(self.index, key=lambda n: self.index[n][0]):
+            recording = Recording(os.path.join(self.directory, name))
+            for start in range(0, len(recording), chunk_size):
+                chunk = recording.records[start:start + chunk_size]
+                self.pyramid.add(self._wall_ns(recording, chunk["timestamp_ns"]), chunk["weight"])
+
+    # 書き込み ------------------------------------------------------------
+
+    def _open_segment(self):
+        start_wall_ns = time.time_ns()
+        stamp = datetime.fromtimestamp(start_wall_ns / 1e9).strftime("%Y%m%d_%H%M%S")
+        # 同じ秒に切り替わったときや前回の実行と重なったときは番号で区別する
+        while True:
+            self._serial += 1
+            name = f"segment_{stamp}_{self._serial:04d}{SEGMENT_SUFFIX}"
+            if not os.path.exists(os.path.join(self.directory, name)):
+                break
+        self._recorder = BinaryRecorder(os.path.join(self.directory, name), self.initial_offset, self.factor,
+                                        start_wall_ns=start_wall_ns, start_monotonic_ns=time.monotonic_ns(),
+                                        durability=self.durability)
+        self._segment_name = name
+        self._segment_count = 0
+        self._segment_first_ns = None
+
+    def _close_segment(self):
+        if self._recorder is None:
+            return
+        self._recorder.close()
+        if self._segment_count:
+            header = self._recorder.header
+            offset = header["start_wall_ns"] - header["start_monotonic_ns"]
+            self._append_index(self._segment_name, self._segment_first_ns + offset,
+                               self._segment_last_ns + offset, self._segment_count)
+        else:
+            os.remove(os.path.join(self.directory, self._segment_name))
+        self._recorder = None
+
+    def write_block(self, block):
+        """
+        ブロックを記録する（hx711lib.HX711.subscribe() のコールバックにそのまま使える）
+
+        Args:
+            block: seq, timestamp_ns, raw, weight の列を持つ構造化配列
+        """
+        with self._lock:
+            position = 0
+            while position < len(block):
+                if self._recorder is None:
+                    self._open_segment()
+                # セグメントの残りに入る分だけ書き、あふれる分は次のセグメントへ
+                room = self.segment_records - self._segment_count
+                part = block[position:position + room]
+                self._recorder.write_block(part)
+                if self.pyramid is not None:
+                    self.pyramid.add(self._wall_ns(self._recorder, part["timestamp_ns"]), part["weight"])
+                if self._segment_first_ns is None:
+                    self._segment_first_ns = int(part["timestamp_ns"][0])
+                self._segment_last_ns = int(part["timestamp_ns"][-1])
+                self._segment_count += len(part)
+                position += len(part)
+                if self._segment_count >= self.segment_records:
+                    self._close_segment()
+
+    def close(self):
+        """記録中のセグメントを閉じて索引に加える"""
+        with self._lock:
+            self._close_segment()
+            if self.pyramid is not None:
+                self.pyramid.close()
+
+    # 読み出し ------------------------------------------------------------
+
+    def query(self, start, end):
+        """
+        [start, end) の時刻のサンプルを読み出す
+
+        Args:
+            start, end: datetime、UNIX時刻（秒、float）、または time.time_ns() のナノ秒
+
+        Returns:
+            ndarray: QUERY_DTYPE（seq, timestamp_ns, raw, weight, wall_ns）の配列（時刻順）
+        """
+        start_ns, end_ns = _to_wall_ns(start), _to_wall_ns(end)
+        with self._lock:
+            candidates = [name for name, (first_ns, last_ns, _) in self.index.items()
+                          if first_ns < end_ns and last_ns >= start_ns]
+            if self._segment_name is not None and self._recorder is not None and self._segment_count:
+                # 記録中のセグメント（書き込みスレッドに溜まっている分はまだ読めない）
+                offset = self._recorder.header["start_wall_ns"] - self._recorder.header["start_monotonic_ns"]
+                if self._segment_first_ns + offset < end_ns and self._segment_last_ns + offset >= start_ns:
+                    candidates.append(self._segment_name)
+        parts = []
+        self.segments_opened = 0
+        for name in sorted(candidates, key=lambda n: self.index.get(n, (float("inf"),))[0]):
+            recording = Recording(os.path.join(self.directory, name))
+            self.segments_opened += 1
+            if not len(recording):
+                continue
+            header = recording.header
+            offset = header["start_wall_ns"] - header["start_monotonic_ns"]
+            timestamps = recording.records["timestamp_ns"]
+            # セグメントの中は変換時刻の順なので二分探索で範囲を決める
+            lo = np.searchsorted(timestamps, max(start_ns - offset, 0), side="left")
+            hi = np.searchsorted(timestamps, max(end_ns - offset, 0), side="left")
+            if lo >= hi:
+                continue
+            records = recording.records[lo:hi]
+            part = np.empty(len(records), dtype=QUERY_DTYPE)
+            for field in RECORD_FILE_DTYPE.names:
+                part[field] = records[field]
+            part["wall_ns"] = records["timestamp_ns"].astype(np.int64) + offset
+            parts.append(part)
+        if not parts:
+            return np.zeros(0, dtype=QUERY_DTYPE)
+        return np.concatenate(parts)
+
+
+    def overview(self, start, end, max_points=1000):
+        """
+        [start, end) を max_points 点以内にまとめた重量の最小・最大・平均（表示用。セグメントは開かない）
+
+        Args:
+            start, end: query() と同じ
+            max_points (int): 点の数の上限（グラフの横のピクセル数など）
+
+        Returns:
+            ndarray: weight_pyramid.VIEW_DTYPE の配列（time_ns は time.time_ns() の時刻）
+        """
+        if self.pyramid is None:
+            raise ValueError("pyramid=False で開いたので集計がありません")
+        with self._lock:
+            return self.pyramid.query(_to_wall_ns(start), _to_wall_ns(end), max_points)
+
+
+def export_csv(records, path):
+    """query() の結果を CSV に書き出す（time 列は UNIX 時刻の秒）"""
+    with open(path, "w") as f:
+        f.write(CSV_HEADER + "\n")
+        rows = zip((records["wall_ns"] / 1e9).tolist(), records["seq"].tolist(), records["timestamp_ns"].tolist(),
+                   records["raw"].tolist(), records["weight"].tolist())
+        f.write("".join("%.3f,%d,%d,%d,%.2f\n" % row for row in rows))
+
+
+def _parse_time(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S" if text.count(":") == 2 else "%Y-%m-%d %H:%M")
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "record":
+        from hx711lib import HX711
+        directory = sys.argv[2] if len(sys.argv) > 2 else os.path.join("weight_data", "session")
+        log = SessionLog(directory)
+        scale = HX711()
+        scale.subscribe(log.write_block)
+        scale.start()
+        print(f"記録を開始しました: {directory}（Ctrl+Cで終了）")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scale.stop()
+            log.close()
+        return
+    if len(sys.argv) >= 5 and sys.argv[1] == "query":
+        log = SessionLog(sys.argv[2], pyramid=False)
+        records = log.query(_parse_time(sys.argv[3]), _parse_time(sys.argv[4]))
+        print(f"{len(records)}件（開いたセグメント: {log.segments_opened}/{len(log.index)}）")
+        if len(sys.argv) > 5:
+            export_csv(records, sys.argv[5])
+            print(f"書き出しました: {sys.argv[5]}")
+        return
+    print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+hx711.HX711Reader のテスト（gpiozero の MockFactory 上の模擬HX711（hx711_sim.MockHX711）を相手に動かす）
+"""
+import time
+
+import pytest
+
+pytest.importorskip("gpiozero")
+
+from gpiozero.pins.mock import MockFactory
+
+from hx711 import HX711Reader, GAIN_PULSES, RATE_80SPS
+from hx711_sim import MockHX711, GAIN_SCALE
+
+# テストの計算機が一瞬止まっても誤って捨てないように、パワーダウンの判定を大きくしておく
+NEVER_NS = 10**12
+
+
+def make_reader(source=None, sample_rate=RATE_80SPS, power_down_ns=NEVER_NS, **kwargs):
+    factory = MockFactory()
+    sensor = MockHX711(factory, sample_rate=sample_rate, source=source, power_down_ns=power_down_ns)
+    reader = HX711Reader(pin_factory=factory, sample_rate=sample_rate, power_down_ns=power_down_ns, **kwargs)
+    return reader, sensor
+
+
+@pytest.fixture
+def mock_reader(request):
+    created = []
+
+    def create(*args, **kwargs):
+        reader, sensor = make_reader(*args, **kwargs)
+        created.append((reader, sensor))
+        return reader, sensor
+
+    yield create
+    for reader, sensor in created:
+        sensor.close()
+        reader.close()
+
+
+@pytest.mark.parametrize("edge_triggered", [True, False])
+def test_read_times_out_without_drdy(edge_triggered):
+    # センサーがつながっていない（DOUT がプルアップで HIGH のまま）
+    reader = HX711Reader(pin_factory=MockFactory(), edge_triggered=edge_triggered)
+    try:
+        start = time.monotonic()
+        assert reader.read(timeout=0.1) is None
+        assert 0.09 <= time.monotonic() - start < 1.0
+        assert reader.timeouts == 1
+        assert reader.reads == 0
+    finally:
+        reader.close()
+
+
+@pytest.mark.parametrize("edge_triggered", [True, False])
+def test_missed_conversions_are_counted(mock_reader, edge_triggered):
+    reader, sensor = mock_reader(edge_triggered=edge_triggered)
+    for _ in range(3):
+        assert reader.read(timeout=1.0) is not None
+    missed = reader.missed_conversions
+    # 読み出さずに4周期と少し待つと、その間に終わった変換のうち最後の1回だけが読める
+    time.sleep(4.4 * reader.period_ns / 1e9)
+    assert reader.read(timeout=1.0) is not None
+    assert 3 <= reader.missed_conversions - missed <= 4
+    # 遅れを取り戻した後は数えない
+    missed = reader.missed_conversions
+    for _ in range(5):
+        assert reader.read(timeout=1.0) is not None
+    assert reader.missed_conversions - missed <= 1
+
+
+VALUES = [0, 1, -1, 2, -2, 123456, -123456, 0x400000, 0x7FFFFF, -0x800000, 0x555555, -0x2AAAAB]
+
+
+@pytest.mark.parametrize("edge_triggered", [True, False])
+def test_decodes_24bit_twos_complement(mock_reader, edge_triggered):
+    values = iter(VALUES)
+    reader, sensor = mock_reader(source=lambda: next(values), edge_triggered=edge_triggered)
+    assert [reader.read(timeout=1.0) for _ in VALUES] == VALUES
+    assert reader.reads == len(VALUES)
+    assert reader.power_down_errors == 0
+
+
+def test_reads_pin_level_not_pull_up_inverted_value(mock_reader):
+    # DOUT はプルアップなので DigitalInputDevice.value は線の状態と逆になる。
+    # 以前の read_hx711 はこの value をビットにしていたので全ビットが反転し、v ではなく -v-1 になっていた
+    value = 0x123456
+    reader, sensor = mock_reader(source=lambda: value)
+    assert reader.read(timeout=1.0) == value
+    assert sensor.data_pin.state == 1
+    assert reader.data_device.value == 0
+    inverted = ~value & 0xFFFFFF
+    assert inverted - 0x1000000 == -value - 1
+
+
+class _Stall:
+    """PD_SCK を HIGH にしたところで一度だけ止まる（読み出しの途中でスレッドが待たされた場合）"""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.armed = False
+
+    def on_clock(self, high):
+        if high and self.armed:
+            self.armed = False
+            time.sleep(self.seconds)
+
+
+@pytest.mark.parametrize("gain", ["A128", "B32"])
+def test_long_clock_high_discards_read(mock_reader, gain):
+    # 判定の時間を大きくして、止める時間だけで判定されるようにする（60µs と同じ扱いになるかを見る）
+    power_down_ns = 20_000_000
+    reader, sensor = mock_reader(source=lambda: 4000, power_down_ns=power_down_ns, gain=gain)
+    stall = _Stall(0.05)
+    sensor.clock_pin.sensors.append(stall)
+    while reader.read(timeout=1.0) is None:
+        pass
+
+    stall.armed = True
+    assert reader.read(timeout=1.0) is None
+    assert reader.power_down_errors == 1
+    assert reader.max_pulse_ns > power_down_ns
+    assert sensor.power_downs == 1
+    # 復帰すると A128 に戻るので、A128 以外ならもう1回捨ててから元のゲインで読める
+    if gain != "A128":
+        assert reader.read(timeout=1.0) is None
+    assert reader.read(timeout=1.0) == int(4000 * GAIN_SCALE[GAIN_PULSES[gain]])
+    assert reader.power_down_errors == 1
+
+
+def test_first_read_discarded_when_starting_with_other_gain(mock_reader):
+    reader, sensor = mock_reader(source=lambda: 4000, gain="B32")
+    # 電源投入直後の変換は A128 なので捨てる
+    assert reader.read(timeout=1.0) is None
+    assert reader.read(timeout=1.0) == int(4000 * GAIN_SCALE[GAIN_PULSES["B32"]])
+    assert sensor.gain_pulses == GAIN_PULSES["B32"]
+
+
+def test_read_after_gain_change_is_discarded(mock_reader):
+    reader, sensor = mock_reader(source=lambda: 4000)
+    assert reader.read(timeout=1.0) == 4000
+    reader.set_gain("A64")
+    # この読み出しのクロック数で A64 を指定するので、読める値はまだ A128 で変換したもの
+    assert reader.read(timeout=1.0) is None
+    assert reader.read(timeout=1.0) == int(4000 * GAIN_SCALE[GAIN_PULSES["A64"]])
+    # 同じゲインを指定し直しても捨てない
+    reader.set_gain("A64")
+    assert reader.read(timeout=1.0) == int(4000 * GAIN_SCALE[GAIN_PULSES["A64"]])
+    assert reader.power_down_errors == 0
+
+
+def test_rate_pin_switches_conversion_rate():
+    factory = MockFactory()
+    sensor = MockHX711(factory, source=lambda: 1, rate_pin=13, power_down_ns=NEVER_NS)
+    reader = HX711Reader(pin_factory=factory, rate_pin=13, sample_rate=RATE_80SPS, power_down_ns=NEVER_NS)
+    try:
+        reader.read(timeout=1.0)
+        start = time.monotonic()
+        reads = sum(reader.read(timeout=1.0) is not None for _ in range(20))
+        elapsed = time.monotonic() - start
+        assert reads == 20
+        # 10SPS なら2秒かかる
+        assert elapsed < 0.6
+        assert sensor.period == pytest.approx(1 / RATE_80SPS)
+    finally:
+        sensor.close()
+        reader.close()
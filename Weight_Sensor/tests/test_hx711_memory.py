@@ -0,0 +1,138 @@
+"""
+hx711_memory.SensorRing のテスト（weight_reader の代わりにテストから共有メモリへ書き込む）
+"""
+import ctypes
+import mmap
+import os
+
+import pytest
+
+posix_ipc = pytest.importorskip("posix_ipc")
+
+from hx711_memory import (SensorRing, RingHeader, SensorRecord, RING_MAGIC, RING_VERSION, RECORD_WRITING,
+                          unlink_ring)
+
+CAPACITY = 16
+
+
+class RingWriter:
+    """run_mock_writer と同じ形式で、1件ずつ決めた値を書き込む書き込み側"""
+    def __init__(self, name, sem_name, capacity=CAPACITY):
+        size = ctypes.sizeof(RingHeader) + capacity * ctypes.sizeof(SensorRecord)
+        self.semaphore = posix_ipc.Semaphore(sem_name, posix_ipc.O_CREAT, initial_value=0)
+        memory = posix_ipc.SharedMemory(name, posix_ipc.O_CREAT, size=size)
+        self.map_file = mmap.mmap(memory.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        memory.close_fd()
+        self.header = RingHeader.from_buffer(self.map_file)
+        self.records = (SensorRecord * capacity).from_buffer(self.map_file, ctypes.sizeof(RingHeader))
+        self.capacity = capacity
+        self.header.version = RING_VERSION
+        self.header.capacity = capacity
+        self.header.record_size = ctypes.sizeof(SensorRecord)
+        for record in self.records:
+            record.seq = RECORD_WRITING
+        self.header.magic = RING_MAGIC
+        self.seq = 0
+
+    def write(self, count=1):
+        for _ in range(count):
+            record = self.records[self.seq % self.capacity]
+            record.seq = RECORD_WRITING
+            record.timestamp_ns = 10**9 + self.seq
+            record.weight = 1000.0 + self.seq
+            record.seq = self.seq
+            self.seq += 1
+            self.header.write_seq = self.seq
+            self.semaphore.release()
+
+    def close(self):
+        self.header = None
+        self.records = None
+        self.map_file.close()
+        self.semaphore.close()
+
+
+@pytest.fixture
+def ring():
+    name = f"/weight_test_shm_{os.getpid()}"
+    sem_name = f"/weight_test_sem_{os.getpid()}"
+    unlink_ring(name, sem_name)
+    writer = RingWriter(name, sem_name)
+    reader = SensorRing(name, sem_name, timeout=1.0)
+    yield writer, reader
+    reader.close()
+    writer.close()
+    unlink_ring(name, sem_name)
+
+
+def drain_seqs(reader, as_array):
+    if as_array:
+        block, lost = reader.drain_array()
+        return [int(seq) for seq in block["seq"]], [float(weight) for weight in block["weight"]], lost
+    records, lost = reader.drain()
+    return [record.seq for record in records], [record.weight for record in records], lost
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_drain_returns_unread_records(ring, as_array):
+    writer, reader = ring
+    assert drain_seqs(reader, as_array) == ([], [], 0)
+    writer.write(5)
+    assert reader.wait(timeout=0.1)
+    assert drain_seqs(reader, as_array) == (list(range(5)), [1000.0 + seq for seq in range(5)], 0)
+    writer.write(3)
+    seqs, _, lost = drain_seqs(reader, as_array)
+    assert seqs == [5, 6, 7]
+    assert lost == 0
+    # 読んだ位置を書き込み側にも知らせる
+    assert writer.header.read_seq == 8
+
+
+def test_wait_times_out_without_data(ring):
+    _, reader = ring
+    assert not reader.wait(timeout=0.01)
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_lapped_reader_counts_lost_records(ring, as_array):
+    writer, reader = ring
+    writer.write(3)
+    drain_seqs(reader, as_array)
+    # 1周と5件分書かれると、読めるのは最後の1周分だけ
+    writer.write(CAPACITY + 5)
+    seqs, _, lost = drain_seqs(reader, as_array)
+    assert seqs == list(range(8, 8 + CAPACITY))
+    assert lost == 5
+    assert reader.lost == 5
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_record_being_written_is_lost(ring, as_array):
+    writer, reader = ring
+    writer.write(4)
+    # 書き込み側が seq=2 の枠を次の周のために書き換えている途中
+    writer.records[2].seq = RECORD_WRITING
+    seqs, _, lost = drain_seqs(reader, as_array)
+    assert seqs == [0, 1, 3]
+    assert lost == 1
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_writer_restart_rewinds_read_position(ring, as_array):
+    writer, reader = ring
+    writer.write(10)
+    drain_seqs(reader, as_array)
+    # 書き込み側が再起動してシーケンスが0からやり直す
+    writer.seq = 0
+    writer.header.write_seq = 0
+    writer.write(2)
+    seqs, _, lost = drain_seqs(reader, as_array)
+    assert seqs == [0, 1]
+    assert lost == 0
+
+
+def test_layout_mismatch_is_rejected(ring):
+    writer, _ = ring
+    writer.header.record_size = ctypes.sizeof(SensorRecord) + 8
+    with pytest.raises(ValueError):
+        SensorRing(f"/weight_test_shm_{os.getpid()}", f"/weight_test_sem_{os.getpid()}", timeout=0.1)
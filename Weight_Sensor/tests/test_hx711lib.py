@@ -0,0 +1,133 @@
+"""
+hx711lib.HX711 のテスト（模擬の書き込みプロセス python hx711_memory.py --mock を相手に動かす）
+"""
+import asyncio
+import sys
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("posix_ipc")
+if not sys.platform.startswith("linux"):
+    pytest.skip("共有メモリとセマフォを使うので Linux のみ", allow_module_level=True)
+
+from hx711lib import HX711
+from bench_hx711_restart import MOCK_COMMAND, child_processes, open_fds, ring_exists
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def scale():
+    sensor = HX711(command=MOCK_COMMAND)
+    yield sensor
+    sensor.stop()
+
+
+def test_restart_cycles_do_not_leak(scale):
+    # 1回目で import などを済ませてから基準を取る
+    scale.start()
+    assert wait_until(lambda: scale.last_seq is not None)
+    scale.stop()
+    fds = open_fds()
+    threads = threading.active_count()
+
+    for cycle in range(300):
+        scale.start()
+        assert scale.is_running
+        if cycle % 50 == 0:
+            # ときどき最初のサンプルが届くまで待ち、再開した読み取りが動いていることも確かめる
+            count = scale.latency.count
+            assert wait_until(lambda: scale.latency.count > count), f"{cycle}回目の再開でサンプルが届かない"
+        scale.stop()
+        assert not scale.is_running
+
+    assert child_processes() == []
+    assert open_fds() == fds
+    assert wait_until(lambda: threading.active_count() == threads)
+    assert not ring_exists()
+
+
+def test_start_after_engine_thread_died(scale):
+    scale.start()
+    assert wait_until(lambda: scale.last_seq is not None)
+    # 読み取りスレッドの中で例外が起きて止まった場合
+    def fail(block):
+        raise RuntimeError("listener failed")
+    scale._listeners = [fail]
+    original_hook = threading.excepthook
+    threading.excepthook = lambda args: None
+    try:
+        assert wait_until(lambda: not scale.is_running)
+    finally:
+        threading.excepthook = original_hook
+    scale._listeners = []
+
+    # is_running が False になるので start() で始め直せる
+    scale.start()
+    seq = scale.last_seq
+    assert wait_until(lambda: scale.last_seq != seq)
+    assert scale.is_running
+
+
+@pytest.mark.parametrize("factor", [None, 300.0 / 113318.0])
+def test_tare_wait_stable_resolves_on_sensor_noise(factor):
+    # 重量の単位（カウント / g）に合った既定の許容値なら、実機程度のノイズで安定と判定される
+    scale = HX711(command=MOCK_COMMAND, factor=factor)
+    scale.start()
+    try:
+        reference = scale.tare(samples=16, wait_stable=True, timeout=5.0).result(timeout=10.0)
+        assert abs(reference - 8300000) < 100
+        assert wait_until(lambda: scale.is_stable)
+        assert abs(scale.current_weight) < (1.0 if factor else 400.0)
+    finally:
+        scale.stop()
+
+
+def test_next_stable_weight_resolves_without_timeout(scale):
+    # 既定の判定（重量の単位に合った許容値）なら、timeout を渡さなくても実機程度のノイズで値が返る
+    scale.start()
+
+    async def measure():
+        return await asyncio.wait_for(scale.next_stable_weight(), 10.0)
+
+    weight = asyncio.run(measure())
+    assert abs(weight) < 400.0
+
+
+def test_cancelled_tare_does_not_stop_engine(scale):
+    scale.start()
+    assert wait_until(lambda: scale.last_seq is not None)
+    # 集まりきらない件数にして、読み取りスレッドが集めている途中で取り消す
+    future = scale.tare(samples=10**6, timeout=None)
+    assert future.cancel()
+    assert scale._tare is None
+
+    # 取り消した直後に集め終わる場合も、読み取りスレッドは止まらない
+    for _ in range(20):
+        scale.tare(samples=1, timeout=None).cancel()
+    seq = scale.last_seq
+    assert wait_until(lambda: scale.last_seq != seq)
+    assert scale.is_running
+
+    # 次の風袋引きは新しく始まって終わる
+    reference = scale.tare(samples=4, timeout=5.0).result(timeout=10.0)
+    assert abs(reference - 8300000) < 1000
+    assert scale.is_running
+
+
+def test_tare_times_out_without_samples(scale):
+    # 読み取りを始めていない（サンプルが1件も届かない）ときも timeout で終わる
+    future = scale.tare(timeout=0.2)
+    with pytest.raises(TimeoutError):
+        future.result(timeout=2.0)
+    assert scale._tare is None
+    assert not scale.tare(timeout=0.2).done()
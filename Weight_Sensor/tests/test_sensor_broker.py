@@ -0,0 +1,117 @@
+"""
+sensor_broker のテスト（python sensor_broker.py --mock を別プロセスで動かし、止めても読み取りが続くことを確かめる）
+"""
+import gc
+import os
+import signal
+import subprocess
+import sys
+import time
+import warnings
+
+import pytest
+
+if not sys.platform.startswith("linux"):
+    pytest.skip("Unixドメインソケットと /proc を使うので Linux のみ", allow_module_level=True)
+
+import weight_stream
+from sensor_broker import BROKER_SOCKET, BrokerStream, broker_running, connect_broker
+from weight_stream import WeightStream, get_shared_stream
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch):
+    if os.path.exists(BROKER_SOCKET):
+        pytest.skip(f"ブローカーのソケットがすでにあります: {BROKER_SOCKET}")
+    # ブローカーが止まった後に get_shared_stream() が起動する読み取りプロセスも模擬にする
+    reader = tmp_path / "weight_stream"
+    reader.write_text(f"#!/bin/sh\nexec {sys.executable} {os.path.join(BASE_DIR, 'weight_stream.py')} --mock --80sps\n")
+    reader.chmod(0o755)
+    monkeypatch.setattr(weight_stream, "STREAM_PATH", str(reader))
+    monkeypatch.setattr(weight_stream, "_shared_streams", {})
+
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "sensor_broker.py"), "--mock"],
+                               stdout=subprocess.DEVNULL)
+    assert wait_until(broker_running), "ブローカーが起動しない"
+    yield process
+    for stream in weight_stream._shared_streams.values():
+        stream.close()
+    if process.poll() is None:
+        process.terminate()
+        process.wait()
+    if os.path.exists(BROKER_SOCKET):
+        os.unlink(BROKER_SOCKET)
+
+
+@pytest.mark.parametrize("sig", [signal.SIGTERM, signal.SIGKILL])
+def test_shared_stream_falls_back_when_broker_stops(broker, sig):
+    stream = get_shared_stream()
+    assert isinstance(stream, BrokerStream)
+    assert stream.read_sample(timeout=2.0) is not None
+
+    # SIGTERM ならソケットファイルを消して終わり、SIGKILL ならソケットファイルが残る
+    broker.send_signal(sig)
+    broker.wait()
+    assert os.path.exists(BROKER_SOCKET) == (sig == signal.SIGKILL)
+
+    # アプリと同じく毎回 get_shared_stream() から読む。例外を出さずに読み取りプロセスに切り替わる
+    samples = []
+    deadline = time.monotonic() + 10.0
+    while len(samples) < 5 and time.monotonic() < deadline:
+        sample = get_shared_stream().read_sample(timeout=0.5)
+        if sample is not None and not isinstance(get_shared_stream(), BrokerStream):
+            samples.append(sample)
+    assert len(samples) == 5
+    assert type(get_shared_stream()) is WeightStream
+    assert not stream.is_running()
+
+
+def test_connect_broker_does_not_leak_socket_on_stale_path(broker):
+    broker.kill()
+    broker.wait()
+    fds = open_fds()
+    with warnings.catch_warnings(record=True) as caught:
+        # 閉じずに捨てたソケットは ResourceWarning になる
+        warnings.simplefilter("always", ResourceWarning)
+        for _ in range(50):
+            assert connect_broker() is None
+        gc.collect()
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+    assert open_fds() == fds
+
+
+def test_hx711_switches_to_local_reader_when_broker_stops(broker):
+    pytest.importorskip("posix_ipc")
+    from hx711lib import HX711
+    from bench_hx711_restart import MOCK_COMMAND
+
+    scale = HX711(command=MOCK_COMMAND)
+    scale.start()
+    try:
+        assert scale._stream is not None, "ブローカーから受け取っていない"
+        assert wait_until(lambda: scale.last_seq is not None)
+        broker.kill()
+        broker.wait()
+        # 読み取りプロセス（MOCK_COMMAND）に切り替わり、サンプルが届き続ける
+        assert wait_until(lambda: scale._engine.is_running())
+        count = scale.latency.count
+        assert wait_until(lambda: scale.latency.count > count + 10)
+        assert scale.is_running
+    finally:
+        scale.stop()
+    assert not scale.is_running
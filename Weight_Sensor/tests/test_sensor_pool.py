@@ -0,0 +1,105 @@
+"""
+sensor_pool.SensorPool のテスト（gpiozero の MockFactory 上の模擬HX711（hx711_sim.MockHX711）を相手に動かす）
+"""
+import pytest
+
+pytest.importorskip("gpiozero")
+
+from gpiozero.pins.mock import MockFactory
+
+from hx711_sim import MockHX711
+from sensor_pool import SensorPool
+
+# テストの計算機が一瞬止まっても誤って捨てないように、パワーダウンの判定を大きくしておく
+NEVER_NS = 10**12
+RATE = 80.0
+CORNER_PINS = [(5, 6), (19, 26), (20, 21), (16, 12)]
+
+
+@pytest.fixture
+def channel_pool():
+    """チャンネルごとにDAT/CLKを分けた4チャンネルのプール（チャンネル i の値は 1000 * (i + 1)）"""
+    factory = MockFactory()
+    sensors = [MockHX711(factory, dat_pin, clk_pin, sample_rate=RATE, source=lambda i=i: 1000 * (i + 1),
+                         power_down_ns=NEVER_NS)
+               for i, (dat_pin, clk_pin) in enumerate(CORNER_PINS)]
+    pool = SensorPool(CORNER_PINS, pin_factory=factory, sample_rate=RATE, power_down_ns=NEVER_NS)
+    yield pool
+    pool.close()
+    for sensor in sensors:
+        sensor.close()
+
+
+def test_channel_pool_aligns_values_within_one_period(channel_pool):
+    samples = [channel_pool.read() for _ in range(10)]
+    assert None not in samples
+    assert [sample.seq for sample in samples] == sorted(set(sample.seq for sample in samples))
+    for sample in samples:
+        # 値はチャンネル順にそろい、変換完了時刻のずれは1周期未満
+        assert sample.values == (1000, 2000, 3000, 4000)
+        assert 0 <= sample.skew_ns < channel_pool.period_ns
+    timestamps = [sample.timestamp_ns for sample in samples]
+    assert timestamps == sorted(timestamps)
+
+
+def test_shared_clock_pool_reads_all_channels_at_once():
+    factory = MockFactory()
+    dat_pins = [5, 19, 20, 16]
+    sensors = [MockHX711(factory, dat_pin, 6, sample_rate=RATE, source=lambda i=i: -1000 * (i + 1),
+                         power_down_ns=NEVER_NS)
+               for i, dat_pin in enumerate(dat_pins)]
+    pool = SensorPool(dat_pins, clk_pin=6, pin_factory=factory, sample_rate=RATE, power_down_ns=NEVER_NS)
+    try:
+        for _ in range(5):
+            sample = pool.read()
+            assert sample is not None
+            assert sample.values == (-1000, -2000, -3000, -4000)
+            assert sample.skew_ns < pool.period_ns
+    finally:
+        pool.close()
+        for sensor in sensors:
+            sensor.close()
+
+
+@pytest.fixture
+def idle_pool():
+    """読み取りスレッドを動かさずに _put で変換完了時刻を直接与える2チャンネルのプール"""
+    pool = SensorPool([(5, 6), (19, 26)], pin_factory=MockFactory(), sample_rate=RATE)
+    yield pool
+    pool.close()
+
+
+def test_stale_channel_is_dropped_and_reported(idle_pool):
+    period = idle_pool.period_ns
+    idle_pool._put(0, 0, 10)
+    # チャンネル1の値はチャンネル0より1周期以上新しいので、チャンネル0の値は前のサイクルのもの
+    idle_pool._put(1, period + 1_000_000, 21)
+    assert idle_pool.count == 0
+    assert idle_pool.misaligned == 1
+
+    idle_pool._put(0, period + 3_000_000, 11)
+    sample = idle_pool.read(timeout=0)
+    assert sample.values == (11, 21)
+    assert sample.timestamp_ns == period + 3_000_000
+    assert sample.skew_ns == 2_000_000
+    assert idle_pool.misaligned == 1
+
+
+def test_values_just_under_one_period_are_combined(idle_pool):
+    period = idle_pool.period_ns
+    idle_pool._put(0, 0, 10)
+    idle_pool._put(1, period - 1, 20)
+    sample = idle_pool.read(timeout=0)
+    assert sample.values == (10, 20)
+    assert sample.skew_ns == period - 1
+    assert idle_pool.misaligned == 0
+
+
+def test_overrun_keeps_newest_value(idle_pool):
+    idle_pool._put(0, 0, 10)
+    idle_pool._put(0, 1_000_000, 11)
+    idle_pool._put(1, 2_000_000, 20)
+    assert idle_pool.overruns == 1
+    assert idle_pool.read(timeout=0).values == (11, 20)
+    # 新しいサイクルがなければ None
+    assert idle_pool.read(timeout=0) is None
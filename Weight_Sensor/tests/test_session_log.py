@@ -0,0 +1,142 @@
+"""
+session_log.SessionLog のテスト（セグメントの切り替え、再起動での索引の作り直し、範囲にかかるセグメントだけの読み出し）
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from session_log import SessionLog, INDEX_FILE, SEGMENT_SUFFIX
+from weight_recorder import RECORD_FILE_DTYPE, Recording
+
+PERIOD_NS = 12_500_000   # 80SPS
+SEGMENT = 1000
+
+
+def make_records(first, count, base_ns):
+    records = np.zeros(count, dtype=RECORD_FILE_DTYPE)
+    records["seq"] = np.arange(first, first + count)
+    records["timestamp_ns"] = base_ns + np.arange(first, first + count) * PERIOD_NS
+    records["raw"] = 8300000 + np.arange(first, first + count) % 500
+    records["weight"] = np.arange(first, first + count) * 0.01
+    return records
+
+
+def write_in_blocks(log, records, rng):
+    # セグメントの切れ目をまたぐ大きさのブロックも混ぜる
+    position = 0
+    while position < len(records):
+        size = int(rng.integers(1, 300))
+        log.write_block(records[position:position + size])
+        position += size
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """3.5セグメント分を記録して閉じたディレクトリ"""
+    directory = str(tmp_path / "session")
+    records = make_records(0, 3500, time.monotonic_ns())
+    log = SessionLog(directory, segment_records=SEGMENT)
+    write_in_blocks(log, records, np.random.default_rng(0))
+    log.close()
+    return directory, records
+
+
+def all_records(log):
+    return log.query(0, 2**62)
+
+
+def test_segments_rotate_at_segment_records(recorded):
+    directory, records = recorded
+    names = segments(directory)
+    assert [len(Recording(os.path.join(directory, name))) for name in names] == [1000, 1000, 1000, 500]
+    log = SessionLog(directory, segment_records=SEGMENT, pyramid=False)
+    assert sorted(log.index) == names
+    assert [log.index[name][2] for name in names] == [1000, 1000, 1000, 500]
+    # セグメントの最初と最後の時刻は重ならず、記録の順に並ぶ
+    spans = [log.index[name][:2] for name in names]
+    assert all(first <= last < next_first for (first, last), (next_first, _) in zip(spans, spans[1:]))
+    restored = all_records(log)
+    np.testing.assert_array_equal(restored["seq"], records["seq"])
+    np.testing.assert_array_equal(restored["weight"], records["weight"])
+
+
+@pytest.mark.parametrize("first, last, opened", [
+    (1200, 1300, 1),   # 1つのセグメントの中
+    (950, 1050, 2),    # 切れ目をまたぐ
+    (3400, 3500, 1),   # 最後の半端なセグメント
+    (0, 3500, 4),
+])
+def test_query_opens_only_overlapping_segments(recorded, first, last, opened):
+    directory, records = recorded
+    log = SessionLog(directory, segment_records=SEGMENT, pyramid=False)
+    wall = all_records(log)["wall_ns"]
+    end = wall[last] if last < len(wall) else wall[-1] + 1
+    result = log.query(int(wall[first]), int(end))
+    assert log.segments_opened == opened
+    np.testing.assert_array_equal(result["seq"], records["seq"][first:last])
+
+
+def test_query_outside_recording_opens_nothing(recorded):
+    directory, _ = recorded
+    log = SessionLog(directory, segment_records=SEGMENT, pyramid=False)
+    wall = all_records(log)["wall_ns"]
+    assert len(log.query(int(wall[-1]) + 1, int(wall[-1]) + 10**12)) == 0
+    assert log.segments_opened == 0
+
+
+def test_index_is_rebuilt_after_restart(recorded):
+    directory, records = recorded
+    index = SessionLog(directory, pyramid=False).index
+    # 索引が無くなっていても、セグメントのファイルから同じ索引を作り直す
+    os.remove(os.path.join(directory, INDEX_FILE))
+    assert SessionLog(directory, pyramid=False).index == index
+    # 索引を書く前に止まった最後のセグメントも加える
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        lines = f.readlines()
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        f.writelines(lines[:-1])
+    log = SessionLog(directory, pyramid=False)
+    assert log.index == index
+    np.testing.assert_array_equal(all_records(log)["seq"], records["seq"])
+
+
+def test_recording_continues_after_interrupted_run(tmp_path):
+    directory = str(tmp_path / "session")
+    base_ns = time.monotonic_ns()
+    rng = np.random.default_rng(1)
+    first = make_records(0, 1500, base_ns)
+    log = SessionLog(directory, segment_records=SEGMENT)
+    write_in_blocks(log, first, rng)
+    # close() せずに止まった（書き込みスレッドの分はファイルに届いたが、索引には最後のセグメントが無い）
+    log._recorder.close()
+    with open(os.path.join(directory, segments(directory)[-1]), "ab") as f:
+        f.write(b"\x01" * 7)   # 途中で途切れたレコード
+
+    log = SessionLog(directory, segment_records=SEGMENT)
+    assert sum(count for _, _, count in log.index.values()) == 1500
+    second = make_records(1500, 700, base_ns)
+    write_in_blocks(log, second, rng)
+    log.close()
+
+    log = SessionLog(directory, segment_records=SEGMENT)
+    assert len(segments(directory)) == 3
+    np.testing.assert_array_equal(all_records(log)["seq"], np.arange(2200))
+    # 集計も前回の分から続いている（close() せずに止まった分は最後の1秒ほど（80件まで）が失われる）
+    assert 2200 - 80 <= log.overview(0, 2**62, max_points=100)["count"].sum() <= 2200
+
+
+def test_pyramid_is_rebuilt_from_segments(recorded):
+    directory, records = recorded
+    for name in os.listdir(directory):
+        if name.startswith("pyramid_"):
+            os.remove(os.path.join(directory, name))
+    log = SessionLog(directory, segment_records=SEGMENT)
+    view = log.overview(0, 2**62, max_points=100)
+    assert view["count"].sum() == len(records)
+    assert view["max"].max() == pytest.approx(records["weight"].max())
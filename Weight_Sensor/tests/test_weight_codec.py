@@ -0,0 +1,58 @@
+"""
+weight_codec のテスト
+"""
+import numpy as np
+
+from weight_codec import compress_records, open_compressed, decompress_records
+from weight_recorder import RECORD_FILE_DTYPE, Recording, write_recording
+
+
+def make_records(count, rng):
+    raw = np.rint(8300000.0 + np.cumsum(rng.normal(0.0, 1.0, count)) + rng.normal(0.0, 60.0, count))
+    weight = ((raw - raw[0]) * (300.0 / 113318.0)).astype(np.float32)
+    weight[::97] = -weight[::97]   # 0 をまたぐ値（符号のビットが変わる）
+    return {"seq": np.arange(count, dtype=np.int64) + 5,
+            "timestamp_ns": (10**12 + np.arange(count) * 12500000 + rng.integers(-20000, 20000, count)).astype(np.int64),
+            "raw": raw.astype(np.int64), "weight": weight}
+
+
+def test_compress_records_round_trips_every_column():
+    rng = np.random.default_rng(3)
+    records = make_records(10000, rng)
+    data = compress_records(records, chunk_size=1000)
+    restored = decompress_records(data)
+    assert set(restored) == set(records)
+    for name in records:
+        np.testing.assert_array_equal(restored[name], records[name])
+    assert restored["weight"].dtype == np.float32
+
+    # 途中の区間だけを取り出しても同じ
+    part = decompress_records(data, 2500, 3700)
+    for name in records:
+        np.testing.assert_array_equal(part[name], records[name][2500:3700])
+
+
+def test_compress_records_without_weight():
+    rng = np.random.default_rng(4)
+    records = make_records(3000, rng)
+    del records["weight"]
+    data = compress_records(records)
+    assert set(open_compressed(data)) == {"seq", "timestamp_ns", "raw"}
+    np.testing.assert_array_equal(decompress_records(data)["raw"], records["raw"])
+
+
+def test_compress_records_accepts_wrec_arrays(tmp_path):
+    rng = np.random.default_rng(5)
+    columns = make_records(5000, rng)
+    records = np.zeros(len(columns["raw"]), dtype=RECORD_FILE_DTYPE)
+    for name in RECORD_FILE_DTYPE.names:
+        records[name] = columns[name]
+    path = str(tmp_path / "session.wrec")
+    write_recording(path, records)
+
+    # 構造化配列と、mmap した記録（Recording.records）をそのまま渡す
+    for source in (records, Recording(path).records):
+        restored = decompress_records(compress_records(source, chunk_size=700))
+        assert set(restored) == set(RECORD_FILE_DTYPE.names)
+        for name in RECORD_FILE_DTYPE.names:
+            np.testing.assert_array_equal(restored[name], records[name])
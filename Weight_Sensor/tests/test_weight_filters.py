@@ -0,0 +1,90 @@
+"""
+weight_filters のテスト
+"""
+import numpy as np
+import pytest
+
+from weight_filters import SpikeRejector, Decimator, cic_taps, lowpass_taps
+
+
+def test_spike_rejector_removes_single_sample_spikes():
+    rng = np.random.default_rng(0)
+    data = 100.0 + rng.normal(0.0, 2.0, 20000)
+    spikes = np.arange(100, len(data), 97)
+    data[spikes] += rng.choice([-1.0, 1.0], len(spikes)) * rng.uniform(100.0, 1000.0, len(spikes))
+    rejector = SpikeRejector()
+    out = rejector.process(data)
+    assert rejector.last_mask[spikes].all()
+    assert np.max(np.abs(out - 100.0)) < 20.0
+    # ノイズを外れ値と誤るのはわずか
+    assert rejector.rejected - len(spikes) < 0.002 * len(data)
+
+
+@pytest.mark.parametrize("height", [50.0, -300.0, 2000.0])
+def test_spike_rejector_passes_level_change_within_persist(height):
+    rng = np.random.default_rng(1)
+    data = rng.normal(0.0, 2.0, 400)
+    data[200:] += height
+    rejector = SpikeRejector(persist=3)
+    out = rejector.process(data)
+    # 置き換わるのは変化の最初の persist - 1 件まで、その後は入力がそのまま出る
+    assert not rejector.last_mask[200 + rejector.persist - 1:].any()
+    np.testing.assert_array_equal(out[200 + rejector.persist - 1:], data[200 + rejector.persist - 1:])
+    assert rejector.level_changes == 1
+
+
+def test_spike_rejector_block_split_matches_whole():
+    rng = np.random.default_rng(2)
+    data = np.repeat(rng.uniform(0.0, 500.0, 20), 300) + rng.normal(0.0, 2.0, 6000)
+    data[rng.random(6000) < 0.01] += 400.0
+    whole = SpikeRejector().process(data)
+    rejector = SpikeRejector()
+    bounds = np.append(np.arange(0, 6000, 37), 6000)
+    split = np.concatenate([rejector.process(data[a:b]) for a, b in zip(bounds[:-1], bounds[1:])])
+    np.testing.assert_array_equal(split, whole)
+
+
+def reference_decimate(x, taps, factor):
+    """畳み込みを全部計算してから間引く（Decimator と同じく、始まりは最初の値が続いていたものとする）"""
+    padded = np.concatenate((np.full(len(taps) - 1, x[0]), x))
+    return np.convolve(padded, taps, "valid")[::factor]
+
+
+@pytest.mark.parametrize("kind, factor, taps", [
+    ("cic", 4, cic_taps(4, 3)),
+    ("cic", 7, cic_taps(7, 2)),
+    ("fir", 4, lowpass_taps(4)),
+    ("fir", 8, lowpass_taps(8)),
+])
+def test_decimator_matches_offline_reference(kind, factor, taps):
+    rng = np.random.default_rng(2)
+    x = 8300000.0 + np.cumsum(rng.normal(0.0, 5.0, 5000)) + rng.normal(0.0, 60.0, 5000)
+    decimator = Decimator(factor, kind, order=3 if factor == 4 else 2)
+    np.testing.assert_allclose(decimator.taps, taps)
+    # ブロックの切れ目が間引く位置とずれていても結果は変わらない
+    sizes = rng.integers(1, 50, 400)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    bounds = np.append(bounds[bounds < len(x)], len(x))
+    outputs, positions = [], []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        y, index = decimator.process(x[a:b])
+        outputs.append(y)
+        positions.append(index + a)
+    np.testing.assert_allclose(np.concatenate(outputs), reference_decimate(x, taps, factor), rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(np.concatenate(positions), np.arange(0, len(x), factor))
+
+
+@pytest.mark.parametrize("kind", ["cic", "fir"])
+def test_decimator_factor_one_passes_through(kind):
+    x = np.arange(100, dtype=np.float64)
+    decimator = Decimator(1, kind)
+    y, index = decimator.process(x)
+    np.testing.assert_array_equal(y, x)
+    np.testing.assert_array_equal(index, np.arange(100))
+    assert decimator.group_delay == 0
+
+
+@pytest.mark.parametrize("factor", [0, 2.5])
+def test_decimator_rejects_bad_factor(factor):
+    with pytest.raises(ValueError):
+        Decimator(factor)
@@ -0,0 +1,45 @@
+"""
+weight_pyramid のテスト
+"""
+import numpy as np
+import pytest
+
+from weight_pyramid import WeightPyramid
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture(scope="module")
+def pyramid():
+    # 28日分（1秒ごとに1件）
+    pyramid = WeightPyramid()
+    timestamps = np.arange(28 * 86400, dtype=np.int64) * SECOND + SECOND // 2
+    pyramid.add(timestamps, np.arange(len(timestamps), dtype=np.float64))
+    return pyramid
+
+
+@pytest.mark.parametrize("max_points", [2, 3, 100, 800, 1000])
+@pytest.mark.parametrize("start_s, span_s", [
+    (0, 28 * 86400),          # 一番粗い段でも収まらない
+    (1234, 20 * 86400 + 17),  # 両端が格子の途中
+    (5000, 3600),
+    (777, 59),
+])
+def test_query_fits_max_points(pyramid, max_points, start_s, span_s):
+    start_ns, end_ns = start_s * SECOND, (start_s + span_s) * SECOND
+    view = pyramid.query(start_ns, end_ns, max_points)
+    assert 0 < len(view) <= max_points
+    assert np.all(np.diff(view["time_ns"]) > 0)
+    # まとめても範囲にかかるサンプルがすべて入り、最小・最大・平均が変わらない
+    first, last = start_s, start_s + span_s - 1
+    assert view["min"][0] <= first and view["max"][-1] >= last
+    assert view["count"].sum() >= span_s
+    total = (view["mean"].astype(np.float64) * view["count"]).sum()
+    expected = np.arange(view["min"][0], view["max"][-1] + 1, dtype=np.float64).sum()
+    assert total == pytest.approx(expected, rel=1e-6)
+
+
+def test_query_uses_finest_level_that_fits(pyramid):
+    view = pyramid.query(0, 600 * SECOND, 800)
+    assert len(view) == 600
+    assert np.all(view["count"] == 1)
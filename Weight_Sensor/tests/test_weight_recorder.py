@@ -0,0 +1,36 @@
+"""
+weight_recorder のテスト
+"""
+import time
+
+import pytest
+
+from weight_recorder import CsvRecorder
+
+
+def wait_for_lines(path, count, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        if len(lines) >= count:
+            return lines
+        time.sleep(0.01)
+    return None
+
+
+@pytest.mark.parametrize("idle", [0.0, 0.3])
+def test_single_row_is_written_within_flush_interval(tmp_path, idle):
+    path = tmp_path / "log.csv"
+    recorder = CsvRecorder(str(path), "time,weight", "{:.3f},{:.2f}", batch_size=256, flush_interval=0.2)
+    try:
+        # 書き込みスレッドが空のまま待ちに入ってから1行だけ書く
+        time.sleep(idle)
+        start = time.monotonic()
+        recorder.write(1.0, 12.5)
+        lines = wait_for_lines(path, 2, timeout=2.0)
+        elapsed = time.monotonic() - start
+        assert lines == ["time,weight", "1.000,12.50"]
+        assert elapsed < 0.2 + 0.3
+    finally:
+        recorder.close()
@@ -0,0 +1,108 @@
+"""
+weight_stream.WeightStream のフレーム解析のテスト（読み取りプロセスの代わりにバイト列を流し込む）
+"""
+import struct
+
+import pytest
+
+from weight_stream import (WeightStream, FRAME_FORMAT, FRAME_MAGIC, FRAME_SIZE, STATUS_TIMEOUT,
+                           STATUS_RATE_80SPS, STATUS_GAIN_SHIFT)
+
+
+class FakePipe:
+    """決めた大きさに区切って返すパイプ（最後は b"" で終わりを知らせる）"""
+    def __init__(self, data, chunk_sizes=None):
+        self.chunks = []
+        pos = 0
+        for size in chunk_sizes or []:
+            self.chunks.append(data[pos:pos + size])
+            pos += size
+        if pos < len(data):
+            self.chunks.append(data[pos:])
+
+    def read(self, size):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def frame(seq, raw=1000, status=0, timestamp_ns=None, magic=FRAME_MAGIC):
+    return struct.pack(FRAME_FORMAT, magic, status, raw, seq, 10**9 + seq if timestamp_ns is None else timestamp_ns)
+
+
+def feed(data, chunk_sizes=None):
+    stream = WeightStream(command=["unused"])
+    frames = []
+    stream.on_frame = frames.append
+    stream._reader_loop(FakePipe(data, chunk_sizes))
+    return stream, frames
+
+
+def test_frame_layout():
+    assert FRAME_SIZE == 20
+    magic, status, raw, seq, timestamp_ns = struct.unpack(FRAME_FORMAT, frame(7, raw=0xABCDEF, status=3))
+    assert (magic, status, raw, seq, timestamp_ns) == (FRAME_MAGIC, 3, 0xABCDEF, 7, 10**9 + 7)
+
+
+def test_frames_split_across_reads():
+    data = frame(0, raw=10) + frame(1, raw=11) + frame(2, raw=12)
+    # フレームの途中で区切れた読み取り（1バイトずつも含む）
+    stream, frames = feed(data, [7, 13, 1, 1, 1, 30])
+    assert stream.count == 3
+    assert stream.errors == 0
+    assert stream.latest == (2, 10**9 + 2, 12.0)
+    assert frames == [data[i:i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+
+
+def test_short_read_at_end_is_not_a_frame():
+    stream, frames = feed(frame(0) + frame(1)[:FRAME_SIZE - 1], [5])
+    assert stream.count == 1
+    assert stream.latest.seq == 0
+    assert stream.errors == 0
+    assert len(frames) == 1
+
+
+@pytest.mark.parametrize("garbage", [b"\x00", b"\x01\x02\x03", b"\x48" * 5])
+def test_bad_magic_resyncs(garbage):
+    stream, frames = feed(garbage + frame(0) + frame(1), [2])
+    assert stream.errors == len(garbage)
+    assert stream.count == 2
+    assert stream.latest.seq == 1
+    assert len(frames) == 2
+
+
+def test_frame_with_wrong_magic_is_skipped():
+    stream, _ = feed(frame(0) + frame(1, magic=0x1234) + frame(2))
+    # 壊れたフレームは1バイトずつずらして捨てるので、1フレーム分のエラーになる
+    assert stream.errors == FRAME_SIZE
+    assert stream.count == 2
+    assert stream.dropped == 1
+
+
+def test_seq_gaps_are_counted_as_dropped():
+    stream, _ = feed(frame(5) + frame(6) + frame(9) + frame(10) + frame(20))
+    assert stream.count == 5
+    assert stream.dropped == 2 + 9
+
+
+def test_seq_wraps_without_drop():
+    stream, _ = feed(frame(0xFFFFFFFE) + frame(0xFFFFFFFF) + frame(0) + frame(2))
+    assert stream.dropped == 1
+    assert stream.latest.seq == 2
+
+
+def test_timeout_frame_keeps_latest_sample():
+    stream, frames = feed(frame(0, raw=10) + frame(0, raw=0, status=STATUS_TIMEOUT) + frame(1, raw=11))
+    assert stream.timeouts == 1
+    assert stream.count == 2
+    assert stream.dropped == 0
+    assert stream.latest.raw == 11.0
+    # 配信はタイムアウトのフレームも含めてそのまま行う
+    assert len(frames) == 3
+
+
+@pytest.mark.parametrize("gain_index, gain", [(0, "A128"), (1, "B32"), (2, "A64")])
+def test_status_reports_rate_and_gain(gain_index, gain):
+    stream, _ = feed(frame(0, status=STATUS_RATE_80SPS | gain_index << STATUS_GAIN_SHIFT))
+    assert stream.sample_rate == 80.0
+    assert stream.gain == gain
+    stream, _ = feed(frame(0, status=gain_index << STATUS_GAIN_SHIFT))
+    assert stream.sample_rate == 10.0
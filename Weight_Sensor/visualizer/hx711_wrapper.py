@@ -1,16 +1,21 @@
-import subprocess
+import os
+import sys
+
+#Weight_Sensor直下のweight_streamを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weight_stream import get_shared_stream
 
 class HX711:
-    def get_raw_reading(EXECUTABLE_PATH):
+    def get_raw_reading(EXECUTABLE_PATH=None):
         """
         センサーからの生の読み取り値を取得するメソッド。
+        常駐している読み取りプロセス（weight_stream）から最新の値を受け取る。
         """
         try:
-            result=subprocess.run([EXECUTABLE_PATH], capture_output=True, text=True, check=True)
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-            else:
-                print("Error:", result.stderr.decode())
+            reading = get_shared_stream().read()
+            if reading is not None:
+                return reading
+            print("Error: no data from weight_stream")
         except Exception as e:
             print("Error:", e)
         return None
@@ -8,12 +8,18 @@ from datetime import datetime, timedelta
 import time
 from collections import deque
 import threading
+import os
+import sys
+
+#Weight_Sensor直下のweight_filtersを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weight_filters import SpikeRejector
 
 class WeightVisualizer:
     """
     重量データをリアルタイムで可視化するクラス
     """
-    def __init__(self, data_source, window_size=100, update_interval=100):
+    def __init__(self, data_source, window_size=100, update_interval=100, spike_rejector=None):
         """
         初期化
         
@@ -21,8 +27,11 @@ class WeightVisualizer:
             data_source: データを取得するオブジェクト (get_weight_data メソッドを持つ)
             window_size (int): グラフに表示するデータポイントの数
             update_interval (int): グラフの更新間隔 (ミリ秒)
+            spike_rejector: 外れ値を除くフィルター（省略時は SpikeRejector()）
         """
         self.data_source = data_source
+        # 読み取りの失敗などで1件だけ飛んだ値がグラフの軸を崩さないように除く
+        self.spike_rejector = spike_rejector or SpikeRejector()
         self.window_size = window_size
         self.update_interval = update_interval
         
@@ -79,12 +88,14 @@ class WeightVisualizer:
     def update_plot(self):
         """グラフを更新する"""
         timestamp, weight = self.data_source.get_weight_data()
+        weight, _ = self.spike_rejector.add(weight)
         
         self.timestamps.append(timestamp)
         self.weights.append(weight)
         
-        # 重量表示の更新
-        self.weight_label.config(text=f"現在の重量: {weight:.2f} g")
+        # 重量表示の更新（除いた外れ値の数もあわせて表示）
+        self.weight_label.config(
+            text=f"現在の重量: {weight:.2f} g（外れ値 {self.spike_rejector.rejected}件）")
         
         # グラフデータの更新
         self.line.set_data(self.timestamps, self.weights)
@@ -9,14 +9,19 @@ import sys
 import time
 import subprocess
 import json
-import statistics
 from datetime import datetime
 
+from weight_stream import get_shared_stream
+from weight_filters import StabilityDetector
+
 # 設定
 EXECUTABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_reader")
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_config.json")
-CALIBRATION_SAMPLES = 20  # キャリブレーションに使用するサンプル数
-SAMPLE_INTERVAL = 0.1     # サンプリング間隔（秒）
+CALIBRATION_SAMPLES = 20  # キャリブレーションに使用するサンプル数（安定の判定に使う窓の大きさ）
+SAMPLE_INTERVAL = 0.1     # サンプリング間隔（秒。Windowsの模擬データと、読み取りに失敗したときの待ち時間）
+STABLE_TOLERANCE = 0.5    # 安定とみなす標準偏差の上限（グラム）
+STABLE_TIMEOUT = 30.0     # 安定するまで待つ最大の時間（秒）
+NOMINAL_COUNTS_PER_GRAM = 113318.0 / 300.0  # 係数がまだ無いときの目安（既定の校正値: 300g で 113318 カウント）
 
 # Windowsでの実行かどうかを確認
 is_windows = sys.platform.startswith('win')
@@ -41,7 +46,8 @@ class CalibrationUtility:
             "initial_offset": 8156931,
             "factor": -300.0 / 113318.0,
             "last_calibration": "",
-            "calibration_weights": []
+            "calibration_weights": [],
+            "cells": []  # 複数のロードセルを使う場合のセルごとの設定（weight_fusion を参照）
         }
         
         try:
@@ -62,6 +68,16 @@ class CalibrationUtility:
         except Exception as e:
             print(f"設定の保存に失敗しました: {e}")
 
+    def get_fusion(self):
+        """
+        現在の設定から合計重量・荷重中心の計算器を作る
+
+        Returns:
+            PlatformFusion: "cells" が無ければ initial_offset / factor の1セル
+        """
+        from weight_fusion import PlatformFusion
+        return PlatformFusion.from_config(self.config)
+
     def prepare_executable(self):
         """環境に応じた実行ファイルの準備"""
         if is_windows:
@@ -152,48 +168,74 @@ int main() {
                 # Windows環境ではPythonスクリプトで模擬データを生成
                 result = subprocess.run([sys.executable, MOCK_SCRIPT], 
                                        capture_output=True, text=True, check=True)
+                reading = float(result.stdout.strip())
             else:
-                # Linux/RaspberryPi環境では実行ファイルを使用
-                result = subprocess.run([EXECUTABLE_PATH], 
-                                       capture_output=True, text=True, check=True)
-                
-            reading = float(result.stdout.strip())
+                # Linux/Raspberry Piでは常駐している読み取りプロセスから取得
+                reading = get_shared_stream().read()
+                if reading is None:
+                    raise ValueError("no data from weight_stream")
+
             return reading
         except Exception as e:
             print(f"重量センサー読み取りエラー: {e}")
             return None
 
+    def measure_stable(self):
+        """
+        読み取り値が落ち着くまで測定し、落ち着いた区間の平均を返す
+
+        直近 CALIBRATION_SAMPLES 件の標準偏差が STABLE_TOLERANCE（グラム換算）以下になった時点で終える。
+        係数がまだ無いときは、既定の校正値（NOMINAL_COUNTS_PER_GRAM）でカウントに直した許容値を使う。
+        STABLE_TIMEOUT 秒たっても落ち着かない場合は、その時点の直近の平均を使う。
+
+        Returns:
+            float: 平均の読み取り値（有効な測定値が無い場合は None）
+        """
+        # 許容する標準偏差を読み取り値の単位に直す
+        if self.config.get("factor"):
+            tolerance = STABLE_TOLERANCE / abs(self.config["factor"])
+        else:
+            tolerance = STABLE_TOLERANCE * NOMINAL_COUNTS_PER_GRAM
+        detector = StabilityDetector(CALIBRATION_SAMPLES, tolerance)
+        print(f"読み取り値が落ち着くまで測定します（直近{CALIBRATION_SAMPLES}回の標準偏差が{STABLE_TOLERANCE}g以下）...")
+        count = 0
+        deadline = time.monotonic() + STABLE_TIMEOUT
+        while time.monotonic() < deadline:
+            reading = self.get_reading()
+            if reading is None:
+                # 読み取りに失敗したときは少し待ってからやり直す（待たずに繰り返すとエラーを出し続けるだけになる）
+                print(" エラー")
+                time.sleep(SAMPLE_INTERVAL)
+                continue
+            count += 1
+            detector.add(reading)
+            std = detector.std
+            print(f"測定 {count}: 読み取り値: {reading:.2f}" + (f", 標準偏差: {std:.2f}" if std is not None else ""))
+            if detector.is_stable:
+                break
+            if is_windows:
+                time.sleep(SAMPLE_INTERVAL)
+
+        if count == 0:
+            print("エラー: 有効な測定値がありません")
+            return None
+        if detector.is_stable:
+            print(f"\n測定結果: 平均={detector.settled_value:.2f}, 標準偏差={detector.std:.2f}（{count}回で安定）")
+            return detector.settled_value
+        std = detector.std
+        print(f"\n警告: {STABLE_TIMEOUT:.0f}秒以内に安定しませんでした。直近の平均を使います")
+        print(f"測定結果: 平均={detector.mean:.2f}" + (f", 標準偏差={std:.2f}" if std is not None else ""))
+        return detector.mean
+
     def measure_zero_point(self):
         """ゼロポイント（何も載せていない状態）の測定"""
         print("\nゼロポイントのキャリブレーションを開始します")
         print("プラットフォームから全ての重りを取り除いてください")
         input("準備ができたらEnterキーを押してください...")
         
-        print(f"{CALIBRATION_SAMPLES}回の測定を行います...")
-        
-        # 複数回測定
-        readings = []
-        for i in range(CALIBRATION_SAMPLES):
-            print(f"測定 {i+1}/{CALIBRATION_SAMPLES}...", end="", flush=True)
-            reading = self.get_reading()
-            if reading is not None:
-                readings.append(reading)
-                print(f" 読み取り値: {reading:.2f}")
-            else:
-                print(" エラー")
-            time.sleep(SAMPLE_INTERVAL)
-        
-        if not readings:
-            print("エラー: 有効な測定値がありません")
+        mean_value = self.measure_stable()
+        if mean_value is None:
             return None
-            
-        # 統計情報の計算
-        mean_value = statistics.mean(readings)
-        if len(readings) > 1:
-            stddev = statistics.stdev(readings)
-            print(f"\n測定結果: 平均={mean_value:.2f}, 標準偏差={stddev:.2f}")
-        else:
-            print(f"\n測定結果: 値={mean_value:.2f}")
         
         # 設定に保存
         self.config["initial_offset"] = mean_value
@@ -214,26 +256,9 @@ int main() {
         print(f"{weight}グラムの重りをプラットフォームに載せてください")
         input("準備ができたらEnterキーを押してください...")
         
-        print(f"{CALIBRATION_SAMPLES}回の測定を行います...")
-        
-        # 複数回測定
-        readings = []
-        for i in range(CALIBRATION_SAMPLES):
-            print(f"測定 {i+1}/{CALIBRATION_SAMPLES}...", end="", flush=True)
-            reading = self.get_reading()
-            if reading is not None:
-                readings.append(reading)
-                print(f" 読み取り値: {reading:.2f}")
-            else:
-                print(" エラー")
-            time.sleep(SAMPLE_INTERVAL)
-        
-        if not readings:
-            print("エラー: 有効な測定値がありません")
+        mean_value = self.measure_stable()
+        if mean_value is None:
             return
-            
-        # 統計情報の計算
-        mean_value = statistics.mean(readings)
         
         # 係数の計算
         raw_diff = self.config["initial_offset"] - mean_value
@@ -289,6 +314,12 @@ int main() {
                     print("\nキャリブレーション履歴:")
                     for i, cal in enumerate(self.config["calibration_weights"]):
                         print(f"{i+1}. {cal['date']} - {cal['weight']}g (係数: {cal['factor']:.8f})")
+
+                if self.config.get("cells"):
+                    print("\nロードセルごとの設定:")
+                    for i, cell in enumerate(self.config["cells"]):
+                        position = f", 位置: ({cell['x']}, {cell['y']})" if "x" in cell else ""
+                        print(f"{i+1}. オフセット: {cell['initial_offset']:.2f}, 係数: {cell['factor']:.8f}{position}")
             elif choice == "4":
                 self.save_config()
                 break
@@ -0,0 +1,278 @@
+"""
+整数の列（生の読み取り値・変換時刻など）の圧縮
+
+隣り合うサンプルの差（order=2 なら差の差）を zigzag 符号化して負の値を小さな正の値にし、
+7ビットずつの可変長整数（varint）にします。HX711 の生の値は隣との差が数百程度なので
+1サンプル2バイト前後、80SPS の変換時刻は差の差（ゆらぎ）だけになるので2〜3バイトで済みます。
+
+chunk_size 件ごとに独立して符号化するので、途中の区間だけを取り出すときはその区間のチャンクだけを復号します。
+符号化・復号はどちらも NumPy でまとめて行います（1件ずつの Python のループは使いません）。
+
+    column = ChunkedColumn.encode(raw_readings, order=1)
+    data = column.to_bytes()
+    ChunkedColumn.from_bytes(data).decode(start, stop)
+"""
+import struct
+
+import numpy as np
+
+COLUMN_MAGIC = b"WZC1"
+# 列のヘッダー: マジック, 件数, チャンクの件数, 差を取る回数, チャンク数
+COLUMN_HEADER_FORMAT = "<4sQIBI"
+COLUMN_HEADER_SIZE = struct.calcsize(COLUMN_HEADER_FORMAT)
+MAX_VARINT_BYTES = 10
+
+
+def zigzag_encode(values):
+    """符号付き整数を 0, -1, 1, -2, 2 ... -> 0, 1, 2, 3, 4 ... の符号なし整数にする"""
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values):
+    """zigzag_encode() の逆"""
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def varint_lengths(values):
+    """各値を varint にしたときのバイト数"""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, MAX_VARINT_BYTES):
+        lengths += values >= np.uint64(1 << (7 * k))
+    return lengths
+
+
+def varint_encode(values, lengths=None):
+    """
+    符号なし整数の配列を varint のバイト列にする（下位7ビットから順に、続きがあるバイトは最上位ビットを1にする）
+
+    Returns:
+        ndarray: uint8 の配列
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if lengths is None:
+        lengths = varint_lengths(values)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    # k バイト目を持つ値だけをまとめて書く（最大10回）
+    for k in range(int(lengths.max(initial=0))):
+        has = lengths > k
+        byte = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[has] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has] + k] = (byte | more).astype(np.uint8)
+    return out
+
+
+def varint_decode(data, count=None):
+    """
+    varint のバイト列を符号なし整数の配列に戻す
+
+    Args:
+        data (array): uint8 の配列（または bytes）
+        count (int): 値の数（確かめるのに使う。省略可）
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        raise ValueError("varint が途中で切れています")
+    if count is not None and len(ends) != count:
+        raise ValueError(f"値の数が合いません: {len(ends)} != {count}")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # 各バイトが値の何バイト目か
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def _chunk_starts(count, chunk_size):
+    return np.arange(0, count, chunk_size)
+
+
+def delta_encode(values, chunk_size, order=1):
+    """チャンクごとに差を取る（各チャンクの先頭はそのままの値から始める）"""
+    d = np.asarray(values, dtype=np.int64)
+    starts = _chunk_starts(len(d), chunk_size)
+    for _ in range(order):
+        previous = d
+        d = np.diff(previous, prepend=np.int64(0))
+        d[starts] = previous[starts]
+    return d
+
+
+def delta_decode(deltas, chunk_size, order=1):
+    """delta_encode() の逆（チャンクごとの累積和）"""
+    x = np.asarray(deltas, dtype=np.int64)
+    starts = _chunk_starts(len(x), chunk_size)
+    for _ in range(order):
+        total = np.cumsum(x)
+        # 前のチャンクまでの累積を引いて、チャンクごとの累積和にする
+        before = np.concatenate(([0], total[starts[1:] - 1]))
+        x = total - np.repeat(before, np.diff(np.append(starts, len(x))))
+    return x
+
+
+class ChunkedColumn:
+    """
+    チャンクに分けて符号化した整数の列
+
+    Attributes:
+        data (ndarray): 全チャンクの varint（uint8）
+        offsets (ndarray): チャンクごとの data の開始位置（チャンク数+1）
+        count (int): 値の数
+        chunk_size (int): 1チャンクの件数
+        order (int): 差を取った回数（0: そのまま, 1: 差, 2: 差の差）
+    """
+    def __init__(self, data, offsets, count, chunk_size, order):
+        self.data = data
+        self.offsets = offsets
+        self.count = count
+        self.chunk_size = chunk_size
+        self.order = order
+
+    @classmethod
+    def encode(cls, values, chunk_size=4096, order=1):
+        """
+        整数の列を符号化する
+
+        Args:
+            values (array): 整数の配列
+            chunk_size (int): 1チャンクの件数（途中から取り出すときの単位）
+            order (int): 差を取る回数（生の読み取り値は1、一定間隔の時刻は2）
+        """
+        values = np.asarray(values)
+        if values.dtype.kind not in "iu":
+            raise ValueError(f"整数の配列を渡してください: {values.dtype}")
+        encoded = zigzag_encode(delta_encode(values.astype(np.int64), chunk_size, order))
+        lengths = varint_lengths(encoded)
+        starts = _chunk_starts(len(values), chunk_size)
+        chunk_bytes = np.add.reduceat(lengths, starts) if len(values) else np.zeros(0, dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(chunk_bytes))).astype(np.int64)
+        return cls(varint_encode(encoded, lengths), offsets, len(values), chunk_size, order)
+
+    @property
+    def chunks(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        """to_bytes() の大きさ"""
+        return COLUMN_HEADER_SIZE + self.offsets.nbytes + self.data.nbytes
+
+    def decode_chunk(self, index):
+        """index 番目のチャンクだけを復号する"""
+        first = index * self.chunk_size
+        count = min(self.chunk_size, self.count - first)
+        encoded = varint_decode(self.data[self.offsets[index]:self.offsets[index + 1]], count)
+        return delta_decode(zigzag_decode(encoded), self.chunk_size, self.order)
+
+    def decode(self, start=0, stop=None):
+        """
+        [start, stop) の値を復号する（必要なチャンクだけを復号する）
+
+        Returns:
+            ndarray: int64 の配列
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return np.zeros(0, dtype=np.int64)
+        first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+        begin = first * self.chunk_size
+        count = min((last + 1) * self.chunk_size, self.count) - begin
+        encoded = varint_decode(self.data[self.offsets[first]:self.offsets[last + 1]], count)
+        values = delta_decode(zigzag_decode(encoded), self.chunk_size, self.order)
+        return values[start - begin:stop - begin]
+
+    def to_bytes(self):
+        header = struct.pack(COLUMN_HEADER_FORMAT, COLUMN_MAGIC, self.count, self.chunk_size, self.order,
+                             self.chunks)
+        return header + self.offsets.astype("<i8").tobytes() + self.data.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buffer, position=0):
+        """
+        to_bytes() の結果から作る（data と offsets は buffer をコピーせずに参照する）
+
+        Returns:
+            ChunkedColumn
+        """
+        magic, count, chunk_size, order, chunks = struct.unpack_from(COLUMN_HEADER_FORMAT, buffer, position)
+        if magic != COLUMN_MAGIC:
+            raise ValueError("圧縮した列ではありません")
+        position += COLUMN_HEADER_SIZE
+        offsets = np.frombuffer(buffer, dtype="<i8", count=chunks + 1, offset=position)
+        position += offsets.nbytes
+        data = np.frombuffer(buffer, dtype=np.uint8, count=int(offsets[-1]), offset=position)
+        return cls(data, offsets, count, chunk_size, order)
+
+
+RECORD_COLUMNS = ("seq", "timestamp_ns", "raw", "weight")
+
+
+def compress_records(records, chunk_size=4096):
+    """
+    記録（seq, timestamp_ns, raw, weight の列）を圧縮する
+
+    seq と変換時刻は一定間隔なので差の差、生の値は差で符号化する。
+    重量はフィルターやゼロ点の追従を通した値で生の値からは計算し直せないので、
+    float32 のビット列を整数として差で符号化する（元の値にそのまま戻る）。
+    weight が無い記録は3つの列だけにする。
+
+    Args:
+        records: 列の名前で引ける記録（.wrec の構造化配列 Recording.records や、列ごとの配列の dict）
+
+    Returns:
+        bytes: 列を続けたもの
+    """
+    columns = [
+        ChunkedColumn.encode(np.asarray(records["seq"], dtype=np.int64), chunk_size, order=2),
+        ChunkedColumn.encode(np.asarray(records["timestamp_ns"]).astype(np.int64), chunk_size, order=2),
+        ChunkedColumn.encode(np.rint(records["raw"]).astype(np.int64), chunk_size, order=1),
+    ]
+    # 構造化配列に in を使うと列の名前ではなく要素と比べてしまうので、列の名前で調べる
+    names = getattr(getattr(records, "dtype", None), "names", None) or records.keys()
+    if "weight" in names:
+        bits = np.ascontiguousarray(records["weight"], dtype="<f4").view("<i4")
+        columns.append(ChunkedColumn.encode(bits, chunk_size, order=1))
+    return b"".join(column.to_bytes() for column in columns)
+
+
+def open_compressed(buffer):
+    """
+    compress_records() の結果を列ごとに開く（まだ復号しない）
+
+    Returns:
+        dict: "seq", "timestamp_ns", "raw"（あれば "weight"）の ChunkedColumn。
+              weight は float32 のビット列なので decompress_records() か decode_weight() で戻す
+    """
+    columns = {}
+    position = 0
+    for name in RECORD_COLUMNS:
+        if name == "weight" and position >= len(buffer):
+            break
+        column = ChunkedColumn.from_bytes(buffer, position)
+        columns[name] = column
+        position += column.nbytes
+    return columns
+
+
+def decode_weight(column, start=0, stop=None):
+    """重量の列の [start, stop) を float32 の配列に戻す"""
+    return column.decode(start, stop).astype("<i4").view("<f4")
+
+
+def decompress_records(buffer, start=0, stop=None):
+    """
+    compress_records() の結果の [start, stop) を復号する
+
+    Returns:
+        dict: 列の名前ごとの配列（seq, timestamp_ns, raw は int64、weight は float32）
+    """
+    columns = open_compressed(buffer)
+    records = {}
+    for name, column in columns.items():
+        records[name] = decode_weight(column, start, stop) if name == "weight" else column.decode(start, stop)
+    return records
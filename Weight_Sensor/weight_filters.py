@@ -0,0 +1,706 @@
+"""
+重量データ用のフィルター
+
+サンプルのブロック（NumPy の1次元配列）をまとめて処理し、ブロックをまたいで状態を引き継ぐ
+フィルターの段を組み合わせて使います。
+
+    pipeline = FilterPipeline([MedianFilter(5), ExponentialFilter(0.3)])
+    filtered = pipeline.process(block)       # ブロックごと
+    value = pipeline.process_one(weight)     # 1件ずつ
+
+各段の group_delay は、ゆっくりした変化に対する遅れ（サンプル数）です。
+SpikeRejector は1件ずつのスパイク（読み取り中のビットずれなど）だけを移動中央値に置き換え、置き換えた数を数えます。
+StabilityDetector は直近の標準偏差から重量が落ち着いたか（安定）を判定します。
+ZeroTracker は何も載っていない安定した状態でだけゼロ点をゆっくり動かし、ずれを補正します。
+Decimator は最大のレートで読んだ値をローパスフィルター（CIC か FIR）に通してから間引き、
+低いレートでノイズの少ない値にします（出力の件数は入力より少なくなります）。
+scipy があれば指数移動平均とカルマンフィルターの定常部分は scipy.signal.lfilter で計算します。
+"""
+import math
+import random
+import time
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+# 指数移動平均をまとめて計算するときの1区間の長さの上限
+EMA_CHUNK = 4096
+
+
+def _ema(x, alpha, y_prev):
+    """
+    y[n] = alpha * x[n] + (1 - alpha) * y[n-1] をまとめて計算する
+
+    scipy が無い場合は区間に分け、区間内を
+    y[k] = d^(k+1) * y_prev + alpha * d^k * Σ x[j] / d^j （d = 1 - alpha）
+    として累積和で求める。d^k が小さくなりすぎない長さで区切る。
+    """
+    if lfilter is not None:
+        y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, zi=[(1.0 - alpha) * y_prev])
+        return y
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return x.astype(np.float64, copy=True)
+    # 区間の最後で d^k が 1e-6 を下回らないようにする（桁落ちを抑える）
+    chunk = int(min(EMA_CHUNK, max(1, math.log(1e-6) / math.log(decay))))
+    powers = decay ** np.arange(chunk + 1)
+    y = np.empty(len(x), dtype=np.float64)
+    for start in range(0, len(x), chunk):
+        segment = x[start:start + chunk]
+        n = len(segment)
+        acc = np.cumsum(segment / powers[:n])
+        y[start:start + n] = powers[1:n + 1] * y_prev + alpha * powers[:n] * acc
+        y_prev = y[start + n - 1]
+    return y
+
+
+class FilterStage:
+    """フィルターの段の基底クラス"""
+    group_delay = 0.0
+
+    def process(self, block):
+        """
+        ブロックを処理する
+
+        Args:
+            block (array): 入力（1次元）
+
+        Returns:
+            ndarray: 入力と同じ長さの出力
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """状態を初期化する（次のブロックの先頭から始め直す）"""
+        raise NotImplementedError
+
+    def process_one(self, value):
+        """1件だけ処理する（1件ずつ届くアプリ用）"""
+        return float(self.process(np.array([value], dtype=np.float64))[0])
+
+
+class BoxcarFilter(FilterStage):
+    """
+    移動平均（直近 width 件の単純平均）
+
+    最初の width-1 件は、先頭の値がそれ以前にも続いていたものとして計算する。
+    """
+    def __init__(self, width):
+        if width < 1:
+            raise ValueError(f"width は1以上です: {width}")
+        self.width = width
+        self.group_delay = (width - 1) / 2
+        self.reset()
+
+    def reset(self):
+        self._history = None
+
+    def process(self, block):
+        x = np.asarray(block, dtype=np.float64)
+        if not len(x):
+            return x.copy()
+        if self._history is None:
+            self._history = np.full(self.width - 1, x[0])
+        data = np.concatenate((self._history, x))
+        # 大きな生の値をそのまま累積すると桁落ちするので、基準を引いてから累積和を取る
+        base = data[0]
+        csum = np.concatenate(([0.0], np.cumsum(data - base)))
+        y = (csum[self.width:] - csum[:-self.width]) / self.width + base
+        self._history = data[len(data) - (self.width - 1):] if self.width > 1 else data[:0]
+        return y
+
+
+class ExponentialFilter(FilterStage):
+    """
+    指数移動平均（y = alpha * x + (1 - alpha) * 前回の y）
+    """
+    def __init__(self, alpha):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f"alpha は 0 < alpha <= 1 です: {alpha}")
+        self.alpha = alpha
+        self.group_delay = (1.0 - alpha) / alpha
+        self.reset()
+
+    def reset(self):
+        self._last = None
+
+    def process(self, block):
+        x = np.asarray(block, dtype=np.float64)
+        if not len(x):
+            return x.copy()
+        if self._last is None:
+            self._last = x[0]
+        y = _ema(x, self.alpha, self._last)
+        self._last = y[-1]
+        return y
+
+
+class MedianFilter(FilterStage):
+    """
+    移動中央値（直近 width 件の中央値）。スパイク状のノイズに強い
+    """
+    def __init__(self, width):
+        if width < 1:
+            raise ValueError(f"width は1以上です: {width}")
+        self.width = width
+        self.group_delay = (width - 1) / 2
+        self.reset()
+
+    def reset(self):
+        self._history = None
+
+    def process(self, block):
+        x = np.asarray(block, dtype=np.float64)
+        if not len(x):
+            return x.copy()
+        if self._history is None:
+            self._history = np.full(self.width - 1, x[0])
+        data = np.concatenate((self._history, x))
+        y = np.median(sliding_window_view(data, self.width), axis=1)
+        self._history = data[len(data) - (self.width - 1):] if self.width > 1 else data[:0]
+        return y
+
+
+class KalmanFilter(FilterStage):
+    """
+    1次元のカルマンフィルター（重量がランダムウォークで変化するモデル）
+
+    ゲインは測定値によらず決まるので、定常値に収まるまでの数十件だけ1件ずつ計算し、
+    それ以降は定常ゲインの指数移動平均としてまとめて計算する。
+
+    Args:
+        process_var (float): 1サンプルあたりの重量の変化の分散（g^2）
+        measurement_var (float): 測定ノイズの分散（g^2）
+    """
+    def __init__(self, process_var=0.01, measurement_var=4.0):
+        if process_var <= 0 or measurement_var <= 0:
+            raise ValueError("分散は正の値です")
+        self.process_var = process_var
+        self.measurement_var = measurement_var
+        # 定常状態の予測誤差の分散 P は P^2 = q (P + r) の正の解
+        q, r = process_var, measurement_var
+        predicted = (q + math.sqrt(q * q + 4 * q * r)) / 2
+        self.steady_gain = predicted / (predicted + r)
+        self.group_delay = (1.0 - self.steady_gain) / self.steady_gain
+        self.reset()
+
+    def reset(self):
+        self._estimate = None
+        self._variance = None
+
+    def process(self, block):
+        z = np.asarray(block, dtype=np.float64)
+        y = np.empty(len(z), dtype=np.float64)
+        if not len(z):
+            return y
+        start = 0
+        if self._estimate is None:
+            # 最初の測定値をそのまま初期値にする
+            self._estimate = z[0]
+            self._variance = self.measurement_var
+            y[0] = z[0]
+            start = 1
+        # ゲインが定常値に収まるまでは1件ずつ更新する
+        estimate, variance = self._estimate, self._variance
+        while start < len(z):
+            predicted = variance + self.process_var
+            gain = predicted / (predicted + self.measurement_var)
+            if abs(gain - self.steady_gain) < 1e-9 * self.steady_gain:
+                break
+            estimate += gain * (z[start] - estimate)
+            variance = (1.0 - gain) * predicted
+            y[start] = estimate
+            start += 1
+        if start < len(z):
+            y[start:] = _ema(z[start:], self.steady_gain, estimate)
+            estimate = y[-1]
+            # 定常状態の推定誤差の分散（P_post = (1 - K) * P_pred = K * r）
+            variance = self.steady_gain * self.measurement_var
+        self._estimate, self._variance = estimate, variance
+        return y
+
+
+class IndexableSkiplist:
+    """
+    値を並べたまま保つスキップリスト（挿入・削除・i番目の取得が O(log n)）
+
+    各リンクに飛び越す要素の数（幅）を持たせ、i番目の要素を先頭からたどらずに求める。
+    """
+    def __init__(self, capacity=1024, seed=None):
+        """
+        初期化
+
+        Args:
+            capacity (int): 想定する最大の要素数（これからレベルの数を決める）
+            seed: 乱数の種（ノードの高さを決める）
+        """
+        self.size = 0
+        self.max_level = max(1, math.ceil(math.log2(capacity + 1)))
+        self._random = random.Random(seed)
+        # ノードは [値, 次のノードのリスト, 幅のリスト]
+        self._tail = [math.inf, [], []]
+        self._head = [None, [self._tail] * self.max_level, [1] * self.max_level]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        node = self._head
+        index += 1
+        for level in reversed(range(self.max_level)):
+            while node[2][level] <= index:
+                index -= node[2][level]
+                node = node[1][level]
+        return node[0]
+
+    def insert(self, value):
+        """値を順序を保って挿入する"""
+        # 各レベルで挿入位置の直前のノードと、そこまでの位置を記録する
+        chain = [None] * self.max_level
+        steps = [0] * self.max_level
+        node = self._head
+        for level in reversed(range(self.max_level)):
+            while node[1][level][0] <= value:
+                steps[level] += node[2][level]
+                node = node[1][level]
+            chain[level] = node
+        height = min(self.max_level, 1 - int(math.log2(self._random.random() or 1e-300)))
+        new_node = [value, [None] * height, [None] * height]
+        passed = 0
+        for level in range(height):
+            prev = chain[level]
+            new_node[1][level] = prev[1][level]
+            prev[1][level] = new_node
+            new_node[2][level] = prev[2][level] - passed
+            prev[2][level] = passed + 1
+            passed += steps[level]
+        for level in range(height, self.max_level):
+            chain[level][2][level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        """値を1つ取り除く（無ければ KeyError）"""
+        chain = [None] * self.max_level
+        node = self._head
+        for level in reversed(range(self.max_level)):
+            while node[1][level][0] < value:
+                node = node[1][level]
+            chain[level] = node
+        target = chain[0][1][0]
+        if target is self._tail or target[0] != value:
+            raise KeyError(value)
+        for level in range(len(target[1])):
+            prev = chain[level]
+            prev[2][level] += target[2][level] - 1
+            prev[1][level] = target[1][level]
+        for level in range(len(target[1]), self.max_level):
+            chain[level][2][level] -= 1
+        self.size -= 1
+
+
+class SpikeRejector(FilterStage):
+    """
+    移動中央値と MAD（中央値からの絶対偏差の中央値）で外れ値を除くフィルター
+
+    直近 width 件の中央値から threshold × 1.4826 × MAD 以上離れたサンプルを外れ値として中央値に置き換える。
+    外れ値でないサンプルはそのまま通すので遅れは無い。
+    重りを載せたときのような本当の変化は、同じ向きにそろった外れ値が persist 件続いた時点で新しい水準とみなし、
+    窓をその値だけにしてから通す（置き換わるのは変化の最初の persist - 1 件だけ）。
+
+    窓はスキップリストで並べたまま持つので、中央値は O(log w)、MAD は O(log² w) で求まる
+    （並べ直しや窓全体の走査はしない）。
+
+    Args:
+        width (int): 窓の大きさ（サンプル数。小さいと MAD のばらつきが大きく、ノイズを外れ値と誤る）
+        threshold (float): 外れ値とみなす距離（正規分布の標準偏差に換算した MAD の何倍か）
+        min_deviation (float): MAD がこれより小さいときはこの値を使う（ノイズが無い区間での誤判定を防ぐ）
+        persist (int): 同じ水準の外れ値がこれだけ続いたら本当の変化とみなす
+    """
+    def __init__(self, width=25, threshold=7.0, min_deviation=0.5, persist=3):
+        if width < 3:
+            raise ValueError(f"width は3以上です: {width}")
+        if not 1 <= persist <= width // 2:
+            raise ValueError(f"persist は1以上 width // 2 以下です: {persist}")
+        self.width = width
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+        self.persist = persist
+        self.rejected = 0        # これまでに置き換えたサンプル数
+        self.level_changes = 0   # 本当の変化とみなして通した回数
+        self.last_mask = np.zeros(0, dtype=bool)  # 直前の process() で置き換えたサンプル
+        self.reset()
+
+    def reset(self):
+        """窓を空にする（rejected の数は残す）"""
+        self._window = deque()
+        self._sorted = IndexableSkiplist(self.width + 1)
+        self._run = []           # 続けて外れ値になった値（中央値から同じ向き）
+
+    def _median(self):
+        n = len(self._sorted)
+        if n % 2:
+            return self._sorted[n // 2]
+        return (self._sorted[n // 2 - 1] + self._sorted[n // 2]) / 2
+
+    def _deviation(self, median):
+        """
+        MAD を求める
+
+        中央値より下の値の距離（中央値から離れる向きに並ぶ）と、上の値の距離はそれぞれ昇順なので、
+        2つの昇順の列を合わせたときの k 番目を二分探索で求める。
+        """
+        ordered = self._sorted
+        n = len(ordered)
+        split = n // 2
+
+        def lower(j):
+            return median - ordered[split - 1 - j]
+
+        def upper(j):
+            return ordered[split + j] - median
+
+        def kth(k):
+            # lower から i 件、upper から k+1-i 件を取ったとき、取った中の最大値が k 番目になる i を探す
+            lo, hi = max(0, k + 1 - (n - split)), min(k + 1, split)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if lower(i) < upper(k - i):
+                    lo = i + 1
+                else:
+                    hi = i
+            candidates = []
+            if lo > 0:
+                candidates.append(lower(lo - 1))
+            if k + 1 - lo > 0:
+                candidates.append(upper(k - lo))
+            return max(candidates)
+
+        if n % 2:
+            return kth(n // 2)
+        return (kth(n // 2 - 1) + kth(n // 2)) / 2
+
+    def add(self, value):
+        """
+        1件を処理する
+
+        Returns:
+            tuple: (出力する値, 外れ値として置き換えたか)
+        """
+        value = float(value)
+        rejected = False
+        if len(self._sorted) >= 3:
+            median = self._median()
+            deviation = max(self._deviation(median) * 1.4826, self.min_deviation)
+            if abs(value - median) > self.threshold * deviation:
+                rejected = True
+        if not rejected:
+            self._run = []
+        else:
+            if self._run and (self._run[0] > median) != (value > median):
+                self._run = []
+            self._run.append(value)
+            if len(self._run) >= self.persist and max(self._run) - min(self._run) <= self.threshold * deviation:
+                # 同じ水準の値が続いたので本当の変化とみなす。中央値が追いつくのを待たずに窓を入れ替えて通す
+                run = self._run
+                self.reset()
+                for previous in run[:-1]:
+                    self._window.append(previous)
+                    self._sorted.insert(previous)
+                self.level_changes += 1
+                rejected = False
+        output = median if rejected else value
+        self._window.append(value)
+        self._sorted.insert(value)
+        if len(self._window) > self.width:
+            self._sorted.remove(self._window.popleft())
+        if rejected:
+            self.rejected += 1
+        return output, rejected
+
+    def process(self, block):
+        x = np.asarray(block, dtype=np.float64)
+        y = np.empty(len(x), dtype=np.float64)
+        mask = np.zeros(len(x), dtype=bool)
+        for index, value in enumerate(x.tolist()):
+            y[index], mask[index] = self.add(value)
+        self.last_mask = mask
+        return y
+
+
+class StabilityDetector:
+    """
+    重量が落ち着いたかを判定するクラス
+
+    直近 window 件の平均と分散を、1件ごとに加える値と窓から外れる値だけで更新する（O(1)、Welford 法）。
+    標準偏差が tolerance 以下になったら安定とみなす。
+
+    Args:
+        window (int): 判定に使うサンプル数
+        tolerance (float): 安定とみなす標準偏差の上限（入力と同じ単位）
+    """
+    def __init__(self, window=16, tolerance=0.5):
+        if window < 2:
+            raise ValueError(f"window は2以上です: {window}")
+        self.window = window
+        self.tolerance = tolerance
+        self.reset()
+
+    def reset(self):
+        """窓を空にする（重量が飛ぶ風袋引きの後などに呼ぶ）"""
+        self._values = deque()
+        self._mean = 0.0
+        self._m2 = 0.0              # 平均からの偏差の二乗和
+        self._updates = 0           # 最後に窓全体から計算し直してからの更新回数
+        self.is_stable = False
+        self.stable_since_ns = None  # 安定になった時刻（不安定なら None）
+        self.settled_value = None    # 安定している間の平均（不安定になっても最後の値を残す）
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def std(self):
+        """窓の標準偏差（件数が足りないときは None）"""
+        if len(self._values) < 2:
+            return None
+        return math.sqrt(max(self._m2, 0.0) / (len(self._values) - 1))
+
+    def add(self, value, timestamp_ns=None):
+        """
+        1件を加えて判定を更新する
+
+        Args:
+            value (float): 重量
+            timestamp_ns (int): 変換時刻（省略時は time.monotonic_ns()）
+
+        Returns:
+            bool: 安定しているか
+        """
+        value = float(value)
+        self._values.append(value)
+        count = len(self._values)
+        delta = value - self._mean
+        self._mean += delta / count
+        self._m2 += delta * (value - self._mean)
+        if count > self.window:
+            # 窓から外れる値を取り除く（加えたときの逆の更新）
+            old = self._values.popleft()
+            count -= 1
+            delta = old - self._mean
+            self._mean -= delta / count
+            self._m2 -= delta * (old - self._mean)
+            self._updates += 1
+            if self._updates >= 64 * self.window:
+                # 取り除く更新で丸め誤差が積もるので、ときどき窓全体から計算し直す（平均すると O(1)）
+                values = np.fromiter(self._values, dtype=np.float64, count=count)
+                self._mean = float(values.mean())
+                self._m2 = float(np.sum((values - self._mean) ** 2))
+                self._updates = 0
+        stable = count >= self.window and self.std <= self.tolerance
+        if stable:
+            if not self.is_stable:
+                self.stable_since_ns = timestamp_ns if timestamp_ns is not None else time.monotonic_ns()
+            self.settled_value = self._mean
+        else:
+            self.stable_since_ns = None
+        self.is_stable = stable
+        return stable
+
+    def add_block(self, values, timestamps_ns=None):
+        """ブロックの各サンプルを順に加える（戻り値は最後の判定）"""
+        if timestamps_ns is None:
+            for value in np.asarray(values, dtype=np.float64).tolist():
+                self.add(value)
+        else:
+            for value, timestamp_ns in zip(np.asarray(values, dtype=np.float64).tolist(),
+                                           np.asarray(timestamps_ns).tolist()):
+                self.add(value, timestamp_ns)
+        return self.is_stable
+
+    def time_since_stable(self, now_ns=None):
+        """安定になってからの秒数（不安定なら None）"""
+        # 別のスレッドが add() で書き換えても一度だけ読めば矛盾しない
+        since_ns = self.stable_since_ns
+        if since_ns is None:
+            return None
+        now_ns = now_ns if now_ns is not None else time.monotonic_ns()
+        return max(0, now_ns - since_ns) / 1e9
+
+
+class ZeroTracker:
+    """
+    ゼロ点の自動追従（温度やクリープによるゆっくりしたずれの補正）
+
+    何も載っておらず（|重量| <= band）、安定しているときだけ、重量が0になる向きにゼロ点を動かす。
+    動かす速さは max_rate（g/秒）までに抑えるので、そっと載せた物が消えてしまうことはない。
+    補正はブロックの終わりに1回だけ行い、サンプルごとには補正量を引くだけにする。
+
+    band などは入力の重量と同じ単位で指定し、その単位を unit で明示する。既定値は g 用なので、
+    hx711lib.HX711 では factor を渡して重量を g にしておく（factor なしのカウントで使う場合は unit="counts" で作る）。
+
+    Args:
+        band (float): 何も載っていないとみなす重量の範囲（unit）
+        max_rate (float): ゼロ点を動かす最大の速さ（unit/秒）
+        log_step (float): 前回の表示からこれだけ動いたら補正を表示する（unit）
+        unit (str): 重量の単位（"g" または "counts"）
+    """
+    def __init__(self, band=2.0, max_rate=0.05, log_step=0.5, unit="g"):
+        if unit not in ("g", "counts"):
+            raise ValueError(f"unit は g か counts です: {unit}")
+        self.band = band
+        self.max_rate = max_rate
+        self.log_step = log_step
+        self.unit = unit
+        self.adjustments = 0      # ゼロ点を動かした回数
+        self.reset()
+
+    def reset(self):
+        """補正量を0に戻す（風袋引きで基準値を取り直したときに呼ぶ）"""
+        self.offset = 0.0
+        self._logged_offset = 0.0
+        self._last_ns = None
+
+    def apply(self, weights):
+        """重量から補正量を引く"""
+        return weights - self.offset
+
+    def update(self, stability, timestamp_ns):
+        """
+        安定の判定を見てゼロ点を動かす
+
+        Args:
+            stability (StabilityDetector): apply() 後の重量を入れた判定
+            timestamp_ns (int): ブロックの最後のサンプルの変換時刻
+
+        Returns:
+            float: 今回動かした量（unit）
+        """
+        last_ns, self._last_ns = self._last_ns, timestamp_ns
+        if last_ns is None or not stability.is_stable or abs(stability.mean) > self.band:
+            return 0.0
+        # 前回から経った時間に応じて動かせる量を決める（間が空いても1秒分まで）
+        elapsed = min(max(0, timestamp_ns - last_ns) / 1e9, 1.0)
+        # 窓の平均がノイズの範囲で0とみなせるうちは動かさない（ノイズを追いかけて揺れないように）
+        if abs(stability.mean) <= 2.0 * (stability.std or 0.0) / math.sqrt(stability.window):
+            return 0.0
+        limit = self.max_rate * elapsed
+        step = min(max(stability.mean, -limit), limit)
+        if step == 0.0:
+            return 0.0
+        self.offset += step
+        self.adjustments += 1
+        if abs(self.offset - self._logged_offset) >= self.log_step:
+            print(f"ゼロ点を補正しました: 累計 {self.offset:+.2f} {self.unit}"
+                  f"（{self.offset - self._logged_offset:+.2f} {self.unit}）")
+            self._logged_offset = self.offset
+        return step
+
+
+def cic_taps(factor, order=3):
+    """
+    CIC フィルター（移動和を order 段重ねたもの）と同じ係数（合計が1になるように正規化）
+    """
+    taps = np.ones(1)
+    for _ in range(order):
+        taps = np.convolve(taps, np.ones(factor))
+    return taps / taps.sum()
+
+
+def lowpass_taps(factor, taps_per_factor=8):
+    """
+    間引き用のFIRローパスフィルターの係数（窓関数法、遮断周波数は間引き後のナイキスト周波数）
+    """
+    count = taps_per_factor * factor + 1
+    n = np.arange(count) - (count - 1) / 2
+    taps = np.sinc(n / factor) * np.hamming(count)
+    return taps / taps.sum()
+
+
+class Decimator:
+    """
+    オーバーサンプリングした読み取り値を低域通過させてから間引くクラス
+
+    変換を最大のレートで行い、factor 件ごとに1件を出力する。ノイズが打ち消し合うので、
+    出力の分解能は間引く前より上がる。間引く位置（位相）はブロックをまたいで引き継ぐ。
+
+    Args:
+        factor (int): 間引く比率（factor 件に1件を出力。1ならフィルターをかけずにそのまま通す）
+        kind (str): "cic"（移動平均を order 段重ねたもの）か "fir"（窓関数法のローパス）
+        order (int): CIC の段数
+    """
+    def __init__(self, factor, kind="cic", order=3):
+        if int(factor) != factor or factor < 1:
+            raise ValueError(f"factor は1以上の整数です: {factor}")
+        if kind not in ("cic", "fir"):
+            raise ValueError(f"kind は cic か fir です: {kind}")
+        self.factor = int(factor)
+        self.kind = kind
+        if self.factor == 1:
+            # 間引かないなら帯域を削る必要もない（FIR の係数は中央だけが1になり、遅れが増えるだけ）
+            self.taps = np.ones(1)
+        else:
+            self.taps = cic_taps(self.factor, order) if kind == "cic" else lowpass_taps(self.factor)
+        # 出力が入力からどれだけ遅れるか（入力のサンプル数）
+        self.group_delay = (len(self.taps) - 1) / 2
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        self._phase = 0     # ブロックの先頭から次に出力する位置
+
+    def process(self, block):
+        """
+        ブロックを処理する
+
+        Args:
+            block (array): 入力（1次元）
+
+        Returns:
+            tuple: (出力, 出力がブロックのどの位置の入力までを使ったか（インデックスの配列）)
+        """
+        x = np.asarray(block, dtype=np.float64)
+        if not len(x):
+            return x.copy(), np.zeros(0, dtype=np.intp)
+        size = len(self.taps)
+        if self._history is None:
+            self._history = np.full(size - 1, x[0])
+        data = np.concatenate((self._history, x))
+        index = np.arange(self._phase, len(x), self.factor)
+        # 出力する位置の窓だけを計算する（間引く分は計算しない）
+        base = data[0]
+        windows = sliding_window_view(data - base, size)[index]
+        y = windows @ self.taps[::-1] + base
+        self._history = data[len(data) - (size - 1):] if size > 1 else data[:0]
+        self._phase = (self._phase - len(x)) % self.factor
+        return y, index
+
+
+class FilterPipeline(FilterStage):
+    """
+    フィルターの段を順につないだもの
+    """
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    @property
+    def group_delay(self):
+        return sum(stage.group_delay for stage in self.stages)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block):
+        y = np.asarray(block, dtype=np.float64)
+        for stage in self.stages:
+            y = stage.process(y)
+        return y
@@ -0,0 +1,146 @@
+"""
+複数のロードセルの読み取り値から合計重量と荷重中心を求める
+
+weight_calibration の initial_offset / factor（重量 = (initial_offset - 読み取り値) * factor）を
+ロードセルごとに拡張し、キャリブレーション行列として扱います。
+計算はサンプルのブロック（行: サンプル、列: ロードセル）に対して NumPy でまとめて行います。
+
+設定ファイル（weight_config.json）には次の形で保存します。
+
+    "cells": [
+        {"initial_offset": 8156931, "factor": -0.00265, "x": -200.0, "y": -150.0},
+        ...
+    ],
+    "cell_matrix": [[...], ...]   # 省略時は factor を対角に並べた行列
+"""
+import numpy as np
+
+
+class PlatformFusion:
+    """
+    ロードセルごとのキャリブレーションを適用して合計重量と荷重中心を計算するクラス
+    """
+    def __init__(self, offsets, matrix, positions=None, min_weight=1.0):
+        """
+        初期化
+
+        Args:
+            offsets (array): ロードセルごとのゼロ点（N）
+            matrix (array): キャリブレーション行列（N×N）。対角成分が各セルの factor、
+                            非対角成分はセル間の干渉の補正
+            positions (array): ロードセルの位置 (x, y)（N×2）。省略時は荷重中心を計算しない
+            min_weight (float): これより軽いときは荷重中心を NaN にする（グラム）
+        """
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.size = len(self.offsets)
+        if self.matrix.shape != (self.size, self.size):
+            raise ValueError(f"キャリブレーション行列は {self.size}×{self.size} です: {self.matrix.shape}")
+        self.positions = None
+        if positions is not None:
+            self.positions = np.asarray(positions, dtype=np.float64)
+            if self.positions.shape != (self.size, 2):
+                raise ValueError(f"位置は {self.size}×2 です: {self.positions.shape}")
+        self.min_weight = min_weight
+        # (offset - raw) @ matrix.T = offset @ matrix.T - raw @ matrix.T なので、定数項を先に計算しておく
+        self._matrix_t = np.ascontiguousarray(self.matrix.T)
+        self._bias = self.offsets @ self._matrix_t
+
+    @classmethod
+    def from_config(cls, config, min_weight=1.0):
+        """
+        weight_calibration の設定から作る
+
+        "cells" が無い場合は initial_offset / factor の1セルとして扱う。
+        """
+        cells = config.get("cells") or [{"initial_offset": config["initial_offset"], "factor": config["factor"]}]
+        offsets = [cell["initial_offset"] for cell in cells]
+        matrix = config.get("cell_matrix") or np.diag([cell["factor"] for cell in cells])
+        positions = None
+        if all("x" in cell and "y" in cell for cell in cells):
+            positions = [(cell["x"], cell["y"]) for cell in cells]
+        return cls(offsets, matrix, positions, min_weight)
+
+    def cell_weights(self, raw):
+        """
+        ロードセルごとの重量を計算する
+
+        Args:
+            raw (array): 読み取り値（M×N、または1サンプル分の N）
+
+        Returns:
+            ndarray: ロードセルごとの重量（グラム、raw と同じ形）
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        return self._bias - raw @ self._matrix_t
+
+    def fuse(self, raw):
+        """
+        合計重量と荷重中心を計算する
+
+        Args:
+            raw (array): 読み取り値（M×N）
+
+        Returns:
+            tuple: (合計重量 (M), 荷重中心のx (M), 荷重中心のy (M))
+                   位置が無い場合や軽すぎる場合の荷重中心は NaN
+        """
+        weights = self.cell_weights(np.atleast_2d(raw))
+        total = weights.sum(axis=1)
+        if self.positions is None:
+            nan = np.full_like(total, np.nan)
+            return total, nan, nan.copy()
+        moment = weights @ self.positions
+        valid = np.abs(total) >= self.min_weight
+        # 軽すぎるサンプルは0除算を避けて NaN にする
+        denominator = np.where(valid, total, 1.0)
+        cop_x = np.where(valid, moment[:, 0] / denominator, np.nan)
+        cop_y = np.where(valid, moment[:, 1] / denominator, np.nan)
+        return total, cop_x, cop_y
+
+    def to_config(self, config):
+        """設定（dict）に "cells" と "cell_matrix" を書き込む"""
+        factors = np.diag(self.matrix)
+        cells = []
+        for index in range(self.size):
+            cell = {"initial_offset": float(self.offsets[index]), "factor": float(factors[index])}
+            if self.positions is not None:
+                cell["x"], cell["y"] = (float(value) for value in self.positions[index])
+            cells.append(cell)
+        config["cells"] = cells
+        if np.count_nonzero(self.matrix - np.diag(factors)):
+            config["cell_matrix"] = self.matrix.tolist()
+        else:
+            config.pop("cell_matrix", None)
+        return config
+
+
+def solve_cell_matrix(offsets, raw_means, weights, diagonal=True):
+    """
+    既知の重りを何か所かに載せた測定からキャリブレーション行列を求める（最小二乗法）
+
+    Args:
+        offsets (array): ゼロ点の測定で得たロードセルごとの平均（N）
+        raw_means (array): 重りを載せた測定ごとのロードセルごとの平均（K×N）
+        weights (array): 各測定で載せた重り（グラム）。diagonal=True なら合計（K）、
+                         False ならロードセルごとの配分（K×N）
+        diagonal (bool): True なら各セルの factor だけを求める、
+                         False ならセル間の干渉の補正を含む行列を求める（どちらも K >= N が必要）
+
+    Returns:
+        ndarray: キャリブレーション行列（N×N）
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    diffs = offsets - np.asarray(raw_means, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if diagonal:
+        # 合計重量 = Σ (offset_i - raw_i) * factor_i
+        if weights.ndim != 1:
+            raise ValueError("diagonal=True のときは重りの合計（K）を渡してください")
+        factors, *_ = np.linalg.lstsq(diffs, weights, rcond=None)
+        return np.diag(factors)
+    # セルごとの重量（K×N）が分かっている場合は diffs @ matrix.T = weights を解く
+    if weights.shape != diffs.shape:
+        raise ValueError(f"重りの配分は {diffs.shape} です: {weights.shape}")
+    matrix_t, *_ = np.linalg.lstsq(diffs, weights, rcond=None)
+    return matrix_t.T
@@ -9,6 +9,10 @@ import os
 import sys
 from datetime import datetime
 
+from weight_stream import get_shared_stream, local_sample, LatencyStats
+from weight_recorder import CsvRecorder, ConsoleEcho
+from weight_pyramid import WeightPyramid
+
 # 設定
 MAX_POINTS = 100
 UPDATE_INTERVAL = 200
@@ -29,7 +33,10 @@ class WeightPlotter:
         self.fig, self.ax = plt.subplots(figsize=(10, 6))
         self.times = np.array([])
         self.weights = np.array([])
-        self.start_time = time.time()
+        self.seqs = np.array([], dtype=np.int64)
+        self.start_ns = time.monotonic_ns()  # 変換時刻（timestamp_ns）の基準
+        self.latency = LatencyStats()
+        self.pyramid = WeightPyramid()  # 点が多いときに描く最小・最大・平均の集計
         
         # グラフの設定
         self.line, = self.ax.plot([], [], 'b-', lw=2)
@@ -124,24 +131,31 @@ int main() {
 }
             """)
 
-    def get_weight(self):
+    def get_sample(self):
+        """センサーから (seq, timestamp_ns, raw) のサンプルを取得"""
         try:
             if is_windows:
                 # Windowsではモックスクリプトを実行
                 result = subprocess.run(["python", "mock_weight_reader.py"], 
                                       capture_output=True, text=True, check=True)
+                sample = local_sample(float(result.stdout.strip()))
             else:
-                # Linux/Raspberry Piではコンパイル済み実行ファイルを実行
-                result = subprocess.run([EXECUTABLE_PATH], 
-                                      capture_output=True, text=True, check=True)
-                
-            reading = float(result.stdout.strip())
-            weight = (reading - OFFSET) * FACTOR
-            return weight
+                # Linux/Raspberry Piでは常駐している読み取りプロセスから取得
+                sample = get_shared_stream().read_sample()
+                if sample is None:
+                    raise ValueError("no data from weight_stream")
+
+            return sample
         except (subprocess.CalledProcessError, ValueError) as e:
             print(f"Sensor reading error: {e}")
             return None
 
+    def get_weight(self):
+        sample = self.get_sample()
+        if sample is None:
+            return None
+        return (sample.raw - OFFSET) * FACTOR
+
     def collect_data(self, duration=60, interval=0.2):
         """指定された期間、データを収集してファイルに保存"""
         print(f"Collecting weight data for {duration} seconds...")
@@ -151,26 +165,34 @@ int main() {
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = os.path.join(self.output_dir, f"weight_data_{timestamp}.csv")
         
-        with open(filename, "w") as f:
-            f.write("time,raw_reading,weight\n")
+        # 書き込みはバックグラウンドでまとめて行い、1秒ごとにOSへ渡す
+        with CsvRecorder(filename, "time,seq,timestamp_ns,raw_reading,weight,latency_ms",
+                         "{:.3f},{},{},{:.2f},{:.2f},{:.3f}") as recorder:
+            echo = ConsoleEcho()
             
             while time.time() < end_time:
-                weight = self.get_weight()
-                if weight is not None:
-                    current_time = time.time() - self.start_time
+                sample = self.get_sample()
+                if sample is not None:
+                    # 時刻は取り出した時ではなく変換（DRDY）時点のものを使う
+                    weight = (sample.raw - OFFSET) * FACTOR
+                    current_time = (sample.timestamp_ns - self.start_ns) / 1e9
+                    latency_ms = self.latency.add(sample.timestamp_ns) / 1e6
                     self.times = np.append(self.times, current_time)
                     self.weights = np.append(self.weights, weight)
+                    self.seqs = np.append(self.seqs, sample.seq)
+                    self.pyramid.add([sample.timestamp_ns - self.start_ns], [weight])
                     
                     # データをファイルに書き込む
-                    f.write(f"{current_time:.2f},{OFFSET + weight/FACTOR:.2f},{weight:.2f}\n")
-                    f.flush()  # すぐに書き込みを反映
+                    recorder.write(current_time, sample.seq, sample.timestamp_ns, sample.raw, weight, latency_ms)
                     
-                    # コンソールに現在の重量を表示
-                    print(f"Time: {current_time:.2f}s, Weight: {weight:.2f}g")
+                    # コンソールに現在の重量を表示（0.5秒に1回まで）
+                    echo.echo("Time: {:.2f}s, Weight: {:.2f}g", current_time, weight)
                     
                     # 間隔を空ける
                     time.sleep(interval)
         
+        print(self.latency.summary())
+
         # グラフを生成して保存
         self.generate_graph(filename)
         
@@ -182,8 +204,15 @@ int main() {
             print("No data to plot")
             return
             
-        # グラフを更新
-        self.line.set_data(self.times, self.weights)
+        # グラフを更新（横のピクセル数より点が多いときは、ピクセル数以内にまとめた最小・最大の帯と平均を描く）
+        width_px = int(self.fig.get_figwidth() * self.fig.dpi)
+        if len(self.times) > width_px:
+            view = self.pyramid.query(0, int((max(self.times) + 1) * 1e9), max_points=width_px)
+            view_times = view["time_ns"] / 1e9
+            self.ax.fill_between(view_times, view["min"], view["max"], color='b', alpha=0.2, lw=0)
+            self.line.set_data(view_times, view["mean"])
+        else:
+            self.line.set_data(self.times, self.weights)
         
         # X軸の範囲を調整
         self.ax.set_xlim(0, max(self.times) + 5)
@@ -8,6 +8,9 @@ import os
 import sys
 from datetime import datetime
 
+from weight_stream import get_shared_stream, local_sample, LatencyStats
+from weight_recorder import CsvRecorder, ConsoleEcho
+
 # 設定
 MAX_POINTS = 100
 UPDATE_INTERVAL = 200
@@ -29,7 +32,9 @@ class WeightPlotter:
         self.times = np.array([])
         self.raw_readings = np.array([])
         self.weights = np.array([])
-        self.start_time = None  # キャリブレーション後に設定
+        self.seqs = np.array([], dtype=np.int64)
+        self.start_ns = None  # キャリブレーション後に設定（変換時刻 timestamp_ns の基準）
+        self.latency = LatencyStats()
         self.initial_reading = None
         
         # グラフの設定
@@ -107,24 +112,30 @@ print(reading)
         """重量センサー読み取り用のC++ソースファイル作成"""
         # ...existing code...
 
-    def get_reading(self):
-        """センサーからの生の読み取り値を取得"""
+    def get_sample(self):
+        """センサーから (seq, timestamp_ns, raw) のサンプルを取得"""
         try:
             if is_windows:
                 # Windowsではモックスクリプトを実行
                 result = subprocess.run([sys.executable, MOCK_SCRIPT], 
                                        capture_output=True, text=True, check=True)
+                sample = local_sample(float(result.stdout.strip()))
             else:
-                # Linux/Raspberry Piではコンパイル済み実行ファイルを実行
-                result = subprocess.run([EXECUTABLE_PATH], 
-                                       capture_output=True, text=True, check=True)
-                
-            reading = float(result.stdout.strip())
-            return reading
+                # Linux/Raspberry Piでは常駐している読み取りプロセスから取得
+                sample = get_shared_stream().read_sample()
+                if sample is None:
+                    raise ValueError("no data from weight_stream")
+
+            return sample
         except (subprocess.CalledProcessError, ValueError) as e:
             print(f"Sensor reading error: {e}")
             return None
 
+    def get_reading(self):
+        """センサーからの生の読み取り値を取得"""
+        sample = self.get_sample()
+        return sample.raw if sample else None
+
     def auto_calibrate(self):
         """自動キャリブレーション - 最初の数サンプルの平均値を基準とする"""
         print(f"自動キャリブレーションを開始します... {CALIBRATION_SAMPLES}個のサンプルを収集中...")
@@ -155,8 +166,8 @@ print(reading)
         if not self.auto_calibrate():
             print("キャリブレーションに失敗しました。デフォルト値を使用します。")
         
-        # 開始時間をキャリブレーション後に設定
-        self.start_time = time.time()
+        # 開始時間はキャリブレーション後の最初のサンプルの変換時刻に設定
+        self.start_ns = None
         
         print(f"{duration}秒間のデータを収集します...")
         end_time = time.time() + duration
@@ -165,14 +176,22 @@ print(reading)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = os.path.join(self.output_dir, f"weight_data_{timestamp}.csv")
         
-        with open(filename, "w") as f:
-            f.write("time,raw_reading,raw_diff,weight\n")
-            f.write(f"0.00,{self.initial_reading:.2f},0.00,0.00\n")  # 初期値（ゼロポイント）
+        # 書き込みはバックグラウンドでまとめて行い、1秒ごとにOSへ渡す
+        with CsvRecorder(filename, "time,seq,timestamp_ns,raw_reading,raw_diff,weight,latency_ms",
+                         "{:.3f},{},{},{:.2f},{:.2f},{:.2f},{:.3f}") as recorder:
+            # 最初の行は初期値（ゼロポイント）。センサーのサンプルではないので seq・時刻は空、遅延は nan
+            recorder.write(0.0, "", "", self.initial_reading, 0.0, 0.0, float("nan"))
+            echo = ConsoleEcho()
             
             while time.time() < end_time:
-                reading = self.get_reading()
-                if reading is not None:
-                    current_time = time.time() - self.start_time
+                sample = self.get_sample()
+                if sample is not None:
+                    # 時刻は取り出した時ではなく変換（DRDY）時点のものを使う
+                    reading = sample.raw
+                    if self.start_ns is None:
+                        self.start_ns = sample.timestamp_ns
+                    current_time = (sample.timestamp_ns - self.start_ns) / 1e9
+                    latency_ms = self.latency.add(sample.timestamp_ns) / 1e6
                     raw_diff = self.initial_reading - reading
                     weight = raw_diff * abs(FACTOR)  # 符号はFACTORで考慮済み
                     
@@ -180,17 +199,20 @@ print(reading)
                     self.times = np.append(self.times, current_time)
                     self.raw_readings = np.append(self.raw_readings, reading)
                     self.weights = np.append(self.weights, weight)
+                    self.seqs = np.append(self.seqs, sample.seq)
                     
                     # データをファイルに書き込む
-                    f.write(f"{current_time:.2f},{reading:.2f},{raw_diff:.2f},{weight:.2f}\n")
-                    f.flush()  # すぐに書き込みを反映
+                    recorder.write(current_time, sample.seq, sample.timestamp_ns, reading, raw_diff, weight, latency_ms)
                     
-                    # コンソールに現在の重量を表示
-                    print(f"Time: {current_time:.2f}s, Raw: {reading:.2f}, Diff: {raw_diff:.2f}, Weight: {weight:.2f}g")
+                    # コンソールに現在の重量を表示（0.5秒に1回まで）
+                    echo.echo("Time: {:.2f}s, Raw: {:.2f}, Diff: {:.2f}, Weight: {:.2f}g",
+                              current_time, reading, raw_diff, weight)
                     
                     # 間隔を空ける
                     time.sleep(interval)
         
+        print(self.latency.summary())
+
         # グラフを生成して保存
         self.generate_graph(filename)
         
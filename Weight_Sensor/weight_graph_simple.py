@@ -9,6 +9,9 @@ import subprocess
 import random
 from datetime import datetime
 
+from weight_stream import get_shared_stream, local_sample, LatencyStats
+from weight_recorder import CsvRecorder, ConsoleEcho
+
 # 設定
 OFFSET = 8156931
 FACTOR = -300.0 / 113318.0  # 極性を反転（マイナス記号追加）
@@ -28,11 +31,20 @@ if is_windows:
     print("Windows環境を検出しました。モックデータを使用します。")
 
 class SimpleWeightMonitor:
-    def __init__(self):
+    def __init__(self, filters=None):
+        """
+        初期化
+
+        Args:
+            filters: 重量にかけるフィルター（weight_filters.FilterPipeline など。省略時はかけない）
+        """
+        self.filters = filters
         self.times = []
         self.weights = []
         self.raw_readings = []
-        self.start_time = time.time()
+        self.seqs = []
+        self.start_ns = time.monotonic_ns()  # 変換時刻（timestamp_ns）の基準
+        self.latency = LatencyStats()
         self.initial_reading = None  # 初期読み取り値（キャリブレーション後に設定）
         
         # 環境に応じた実行準備
@@ -133,33 +145,40 @@ int main() {
 }
 """)
 
-    def get_raw_reading(self):
-        """センサーからの生の読み取り値を取得"""
+    def get_raw_sample(self):
+        """センサーから (seq, timestamp_ns, raw) のサンプルを取得"""
         try:
             if is_windows:
                 # Windows環境ではPythonスクリプトで模擬データを生成
                 result = subprocess.run([sys.executable, MOCK_SCRIPT], 
                                        capture_output=True, text=True, check=True)
+                sample = local_sample(float(result.stdout.strip()))
             else:
-                # Linux/RaspberryPi環境では実行ファイルを使用
-                result = subprocess.run([EXECUTABLE_PATH], 
-                                       capture_output=True, text=True, check=True)
-                
-            reading = float(result.stdout.strip())
-            return reading
+                # Linux/Raspberry Piでは常駐している読み取りプロセスから取得
+                sample = get_shared_stream().read_sample()
+                if sample is None:
+                    raise ValueError("no data from weight_stream")
+
+            return sample
         except Exception as e:
             print(f"重量センサー読み取りエラー: {e}")
             return None
 
+    def get_raw_reading(self):
+        """センサーからの生の読み取り値を取得"""
+        sample = self.get_raw_sample()
+        return sample.raw if sample else None
+
     def collect_data(self, duration=MAX_DURATION):
         """指定期間のデータ収集（自動キャリブレーション機能付き）"""
         print(f"データ収集を開始します（合計{duration}秒）...")
         print(f"最初の{CALIBRATION_SAMPLES}サンプルは自動キャリブレーションに使用します")
         print("Ctrl+Cで中断できます")
         
-        # CSVファイルのヘッダー
-        with open(self.data_file, "w") as f:
-            f.write("Time,RawReading,RawDiff,Weight\n")
+        # CSVファイル（書き込みはバックグラウンドでまとめて行う）
+        recorder = CsvRecorder(self.data_file, "Time,Seq,TimestampNs,RawReading,RawDiff,Weight,LatencyMs",
+                               "{:.3f},{},{},{:.2f},{:.2f},{:.2f},{:.3f}")
+        echo = ConsoleEcho()
         
         try:
             # 自動キャリブレーションのためのデータ収集
@@ -180,38 +199,49 @@ int main() {
             
             # メインのデータ収集を開始
             end_time = time.time() + duration
-            self.start_time = time.time()  # キャリブレーション後に開始時間をリセット
+            self.start_ns = None  # キャリブレーション後の最初のサンプルの変換時刻を基準にする
             
             print("重量測定を開始します...")
             while time.time() < end_time:
                 # 生の読み取り値を取得
-                reading = self.get_raw_reading()
-                if reading is not None:
-                    current_time = time.time() - self.start_time
+                sample = self.get_raw_sample()
+                if sample is not None:
+                    # 時刻は取り出した時ではなく変換（DRDY）時点のものを使う
+                    reading = sample.raw
+                    if self.start_ns is None:
+                        self.start_ns = sample.timestamp_ns
+                    current_time = (sample.timestamp_ns - self.start_ns) / 1e9
+                    latency_ms = self.latency.add(sample.timestamp_ns) / 1e6
                     
                     # 初期値からの差分に基づいて重量を計算
                     raw_diff = self.initial_reading - reading
                     weight = raw_diff * abs(FACTOR)  # 符号は既にFACTORで考慮
+                    if self.filters is not None:
+                        weight = self.filters.process_one(weight)
                     
                     # データ保存
                     self.times.append(current_time)
                     self.raw_readings.append(reading)
+                    self.seqs.append(sample.seq)
                     self.weights.append(weight)
                     
                     # CSVに書き込み
-                    with open(self.data_file, "a") as f:
-                        f.write(f"{current_time:.2f},{reading:.2f},{raw_diff:.2f},{weight:.2f}\n")
+                    recorder.write(current_time, sample.seq, sample.timestamp_ns, reading, raw_diff, weight, latency_ms)
                     
-                    # コンソール表示
-                    print(f"経過時間: {current_time:.2f}秒, 生値: {reading:.2f}, 差分: {raw_diff:.2f}, 重量: {weight:.2f}g")
+                    # コンソール表示（0.5秒に1回まで）
+                    echo.echo("経過時間: {:.2f}秒, 生値: {:.2f}, 差分: {:.2f}, 重量: {:.2f}g",
+                              current_time, reading, raw_diff, weight)
                 
                 # 次のサンプルまで待機
                 time.sleep(SAMPLE_INTERVAL)
                 
         except KeyboardInterrupt:
             print("\nユーザーによりデータ収集が中断されました")
+        finally:
+            recorder.close()
         
         print(f"収集完了: {len(self.times)}データポイント")
+        print(self.latency.summary())
         return self.data_file
 
     def generate_text_graph(self):
@@ -11,6 +11,9 @@ import os
 import sys
 import threading
 
+from weight_stream import get_shared_stream, local_sample, LatencyStats
+from weight_recorder import write_recording
+
 # 設定
 MAX_POINTS = 100
 UPDATE_INTERVAL = 200
@@ -79,7 +82,11 @@ class WeightPlotterApp:
             # データ保持用の配列
             self.times = np.array([])
             self.weights = np.array([])
-            self.start_time = time.time()
+            self.raw_readings = np.array([])
+            self.seqs = np.array([], dtype=np.int64)
+            self.timestamps_ns = np.array([], dtype=np.int64)
+            self.start_ns = time.monotonic_ns()  # 変換時刻（timestamp_ns）の基準
+            self.latency = LatencyStats()
         except Exception as e:
             messagebox.showerror("Graph Error", f"Failed to create graph: {e}")
             self._log_error(e)
@@ -221,44 +228,60 @@ int main() {
 }
             """)
 
-    def get_weight(self):
+    def get_sample(self):
+        """センサーから (seq, timestamp_ns, raw) のサンプルを取得"""
         try:
             if is_windows:
                 # Windowsではモックスクリプトを実行
                 result = subprocess.run(["python", "mock_weight_reader.py"], 
                                       capture_output=True, text=True, check=True)
+                sample = local_sample(float(result.stdout.strip()))
             else:
-                # Linux/Raspberry Piではコンパイル済み実行ファイルを実行
-                result = subprocess.run([EXECUTABLE_PATH], 
-                                      capture_output=True, text=True, check=True)
-                
-            reading = float(result.stdout.strip())
-            weight = (reading - self.offset_var.get()) * self.factor_var.get()
-            return weight
+                # Linux/Raspberry Piでは常駐している読み取りプロセスから取得
+                sample = get_shared_stream().read_sample()
+                if sample is None:
+                    raise ValueError("no data from weight_stream")
+
+            return sample
         except (subprocess.CalledProcessError, ValueError) as e:
             self.status_var.set(f"Sensor reading error: {e}")
             self._log_error(f"Sensor reading error: {e}")
             return None
 
+    def get_weight(self):
+        sample = self.get_sample()
+        if sample is None:
+            return None
+        return (sample.raw - self.offset_var.get()) * self.factor_var.get()
+
     def update_graph(self):
         """グラフデータを更新"""
         if not self.running:
             return
         
         try:
-            weight = self.get_weight()
+            sample = self.get_sample()
             
-            if weight is not None:
-                current_time = time.time() - self.start_time
+            if sample is not None:
+                # 時刻は取り出した時ではなく変換（DRDY）時点のものを使う
+                weight = (sample.raw - self.offset_var.get()) * self.factor_var.get()
+                current_time = (sample.timestamp_ns - self.start_ns) / 1e9
+                self.latency.add(sample.timestamp_ns)
                 
                 # データを追加
                 self.times = np.append(self.times, current_time)
                 self.weights = np.append(self.weights, weight)
+                self.raw_readings = np.append(self.raw_readings, sample.raw)
+                self.seqs = np.append(self.seqs, sample.seq)
+                self.timestamps_ns = np.append(self.timestamps_ns, sample.timestamp_ns)
                 
                 # データ点が多すぎる場合は古いものを削除
                 if len(self.times) > MAX_POINTS:
                     self.times = self.times[-MAX_POINTS:]
                     self.weights = self.weights[-MAX_POINTS:]
+                    self.raw_readings = self.raw_readings[-MAX_POINTS:]
+                    self.seqs = self.seqs[-MAX_POINTS:]
+                    self.timestamps_ns = self.timestamps_ns[-MAX_POINTS:]
                 
                 # X軸の自動スクロール
                 if current_time > 60:
@@ -270,6 +293,7 @@ int main() {
                 
                 # 重量表示を更新
                 self.weight_var.set(f"Weight: {weight:.1f}g")
+                self.status_var.set(f"Monitoring active - latency mean {self.latency.mean_ms:.1f} ms, max {self.latency.max_ms:.1f} ms")
             
             # 次の更新をスケジュール
             if self.running:
@@ -297,7 +321,10 @@ int main() {
         """グラフデータをクリア"""
         self.times = np.array([])
         self.weights = np.array([])
-        self.start_time = time.time()
+        self.raw_readings = np.array([])
+        self.seqs = np.array([], dtype=np.int64)
+        self.timestamps_ns = np.array([], dtype=np.int64)
+        self.start_ns = time.monotonic_ns()
         self.line.set_data([], [])
         self.ax.set_xlim(0, 60)
         self.canvas.draw_idle()
@@ -317,19 +344,26 @@ int main() {
             # 出力ディレクトリの作成
             os.makedirs("weight_data", exist_ok=True)
             
-            # CSVファイルにデータを保存
+            # シーケンス番号や生の値まで含めた記録はバイナリ形式（.wrec）で配列のまま保存する
+            data_filename = f"weight_data/weight_data_{timestamp}.wrec"
+            records = {"seq": self.seqs, "timestamp_ns": self.timestamps_ns,
+                       "raw": self.raw_readings, "weight": self.weights}
+            write_recording(data_filename, records, self.offset_var.get(), self.factor_var.get(),
+                            start_monotonic_ns=self.start_ns)
+            # CSVは読み込んでいるスクリプトなどが困らないように従来の2列（Time,Weight）のまま
+            # （全部の列が必要なら python weight_recorder.py で .wrec から書き出せる）
             csv_filename = f"weight_data/weight_data_{timestamp}.csv"
             with open(csv_filename, "w") as f:
                 f.write("Time,Weight\n")
-                for t, w in zip(self.times, self.weights):
-                    f.write(f"{t:.2f},{w:.2f}\n")
+                f.write("".join(f"{t:.2f},{w:.2f}\n" for t, w in zip(self.times, self.weights)))
             
             # グラフ画像を保存
             img_filename = f"weight_data/weight_graph_{timestamp}.png"
             plt.savefig(img_filename)
             
-            self.status_var.set(f"Data saved to {csv_filename}")
-            messagebox.showinfo("Data Saved", f"Data saved to {csv_filename}\nGraph image saved to {img_filename}")
+            self.status_var.set(f"Data saved to {data_filename}")
+            messagebox.showinfo("Data Saved", f"Data saved to {data_filename}\nCSV: {csv_filename}\n"
+                                              f"Graph image saved to {img_filename}")
         except Exception as e:
             self.status_var.set(f"Error saving data: {e}")
             self._log_error(f"Save error: {e}")
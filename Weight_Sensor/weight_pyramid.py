@@ -0,0 +1,280 @@
+"""
+長い記録を素早く表示するための多段の集計（1秒・10秒・1分・10分ごとの最小・最大・平均・件数）
+
+記録しながら少しずつ更新します。1秒の段はサンプルから、上の段は下の段で区切りが付いたバケットから作るので、
+追加の手間は記録の長さに関係なく一定です。
+表示するときは画面の横のピクセル数に合う段を選び、その範囲のバケットだけを二分探索で切り出すので、
+何週間分の記録でも拡大・移動にかかる時間はサンプルの総数によりません。
+
+    pyramid = WeightPyramid("weight_data/session")
+    pyramid.add(timestamps_ns, weights)
+    view = pyramid.query(start_ns, end_ns, max_points=800)   # view["time_ns"], view["min"], view["max"], view["mean"]
+
+path を指定すると区切りが付いたバケットを段ごとのファイル（pyramid_1s.bin など）に追記し、次に開いたときに続きから更新します。
+close() せずに止まったときは最後の1秒ほどの集計が失われます（記録そのものには影響しません）。
+"""
+import os
+
+import numpy as np
+
+# 段の幅（秒）
+LEVELS = (1, 10, 60, 600)
+
+# 保存するバケット（bucket は時刻 // 幅）
+BUCKET_DTYPE = np.dtype([("bucket", "<i8"), ("min", "<f4"), ("max", "<f4"), ("sum", "<f8"), ("count", "<u4")])
+# query() が返す配列
+VIEW_DTYPE = np.dtype([("time_ns", "<i8"), ("min", "<f4"), ("max", "<f4"), ("mean", "<f4"), ("count", "<u4")])
+
+
+def _aggregate(buckets):
+    """バケット番号の順に並んだ配列の同じ番号をまとめる"""
+    if len(buckets) < 2:
+        return buckets
+    starts = np.flatnonzero(np.diff(buckets["bucket"], prepend=buckets["bucket"][0] - 1))
+    if len(starts) == len(buckets):
+        return buckets
+    out = np.empty(len(starts), dtype=BUCKET_DTYPE)
+    out["bucket"] = buckets["bucket"][starts]
+    out["min"] = np.minimum.reduceat(buckets["min"], starts)
+    out["max"] = np.maximum.reduceat(buckets["max"], starts)
+    out["sum"] = np.add.reduceat(buckets["sum"], starts)
+    out["count"] = np.add.reduceat(buckets["count"], starts)
+    return out
+
+
+class _Level:
+    """
+    1つの段（区切りが付いたバケットの配列と、まだ途中のバケット）
+    """
+    def __init__(self, width_s, path=None):
+        self.width_s = width_s
+        self.width_ns = width_s * 1_000_000_000
+        self._data = np.zeros(1024, dtype=BUCKET_DTYPE)
+        self._keys = np.zeros(1024, dtype=np.int64)  # バケット番号（二分探索用に連続した配列で持つ）
+        self._size = 0
+        self.partial = None   # 途中のバケット（BUCKET_DTYPE の1件）
+        self._file = None
+        if path is not None:
+            if os.path.exists(path):
+                # 途中で途切れたレコードは捨てる
+                count = os.path.getsize(path) // BUCKET_DTYPE.itemsize
+                with open(path, "r+b") as f:
+                    f.truncate(count * BUCKET_DTYPE.itemsize)
+                self._extend(np.fromfile(path, dtype=BUCKET_DTYPE, count=count))
+            self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+
+    @property
+    def buckets(self):
+        """区切りが付いたバケット（バケット番号の順）"""
+        return self._data[:self._size]
+
+    def _extend(self, buckets):
+        if self._size + len(buckets) > len(self._data):
+            grown = np.zeros(max(2 * len(self._data), self._size + len(buckets)), dtype=BUCKET_DTYPE)
+            grown[:self._size] = self.buckets
+            self._data = grown
+            self._keys = np.resize(self._keys, len(grown))
+        self._data[self._size:self._size + len(buckets)] = buckets
+        self._keys[self._size:self._size + len(buckets)] = buckets["bucket"]
+        self._size += len(buckets)
+
+    def _write(self, buckets):
+        """区切りが付いたバケットの続きの位置に書く（pop_last() で戻したバケットはここで上書きされる）"""
+        if self._file is not None:
+            self._file.seek(self._size * BUCKET_DTYPE.itemsize)
+            self._file.write(buckets.tobytes())
+            self._file.flush()
+
+    def pop_last(self):
+        """
+        最後に保存したバケットを途中のバケットに戻す（開き直したときに同じバケットへ続けて足せるように）
+
+        ファイルからは消さないので、このまま止まっても前回までの集計は残る。
+        """
+        if not self._size:
+            return
+        self._size -= 1
+        self.partial = self._data[self._size].copy()
+
+    def save_partial(self):
+        """途中のバケットを区切りが付いたバケットの続きに書く（次に開いたときに pop_last() で戻す）"""
+        if self.partial is not None:
+            self._write(self.partial.reshape(1))
+
+    def merge(self, buckets):
+        """
+        バケットを足す（同じ番号は途中のバケットにまとめる）
+
+        Args:
+            buckets (ndarray): BUCKET_DTYPE の配列（バケット番号の順）
+
+        Returns:
+            ndarray: 新しく区切りが付いたバケット（上の段に渡す）
+        """
+        if not len(buckets):
+            return buckets
+        if self.partial is not None:
+            # 時計が戻ったときなど、途中のバケットより前の番号は途中のバケットに入れる
+            buckets = buckets.copy()
+            np.maximum(buckets["bucket"], self.partial["bucket"], out=buckets["bucket"])
+            buckets = _aggregate(np.concatenate(([self.partial], buckets)))
+        else:
+            buckets = _aggregate(buckets)
+        finished = buckets[:-1]
+        self.partial = buckets[-1].copy()
+        if len(finished):
+            self._write(finished)
+            self._extend(finished)
+        return finished
+
+    def view(self, start_ns, end_ns, pending=None):
+        """
+        [start_ns, end_ns) にかかるバケット
+
+        Args:
+            pending (ndarray): 区切りが付いたバケットの後に続く途中のバケット（この段の番号）
+        """
+        first, last = start_ns // self.width_ns, (end_ns - 1) // self.width_ns
+        keys = self._keys[:self._size]
+        selected = self.buckets[np.searchsorted(keys, first, "left"):np.searchsorted(keys, last, "right")]
+        if pending is not None and len(pending):
+            pending = pending[(pending["bucket"] >= first) & (pending["bucket"] <= last)]
+            selected = np.concatenate((selected, pending))
+        return selected
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class WeightPyramid:
+    """
+    1秒・10秒・1分・10分ごとの最小・最大・平均・件数を少しずつ更新するクラス
+    """
+    def __init__(self, path=None, levels=LEVELS):
+        """
+        初期化（path を指定したときは保存したバケットを読み込む）
+
+        Args:
+            path (str): 段ごとのファイルを置くディレクトリ（None ならメモリ上だけ）
+            levels (tuple): 段の幅（秒、小さい順。上の段の幅は下の段の幅の倍数）
+        """
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self.levels = [_Level(width, None if path is None else os.path.join(path, f"pyramid_{width}s.bin"))
+                       for width in levels]
+        self._resume()
+
+    def _resume(self):
+        """前回の続きから更新できるように途中のバケットを作り直す"""
+        self.levels[0].pop_last()
+        for lower, upper in zip(self.levels, self.levels[1:]):
+            # 上の段の途中のバケット（保存されない）を、下の段の保存済みのバケットから作り直す
+            last = upper.buckets["bucket"][-1] if len(upper.buckets) else np.iinfo(np.int64).min
+            tail = lower.buckets[np.searchsorted(lower.buckets["bucket"] * lower.width_s // upper.width_s,
+                                                 last, "right"):]
+            upper.merge(self._lift(tail, lower, upper))
+
+    @staticmethod
+    def _lift(buckets, lower, upper):
+        """下の段のバケットを上の段のバケット番号にする"""
+        lifted = buckets.copy()
+        lifted["bucket"] = buckets["bucket"] * lower.width_s // upper.width_s
+        return lifted
+
+    def __len__(self):
+        """足したサンプルの数"""
+        level = self.levels[0]
+        partial = int(level.partial["count"]) if level.partial is not None else 0
+        return int(level.buckets["count"].sum(dtype=np.int64)) + partial
+
+    def add(self, timestamps_ns, values):
+        """
+        サンプルを足す
+
+        Args:
+            timestamps_ns (array): 時刻（ナノ秒、増える順。time.time_ns() など原点はそろっていれば何でもよい）
+            values (array): 重量などの値
+        """
+        timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        samples = np.empty(len(values), dtype=BUCKET_DTYPE)
+        samples["bucket"] = np.maximum.accumulate(timestamps_ns // self.levels[0].width_ns)
+        samples["min"] = values
+        samples["max"] = values
+        samples["sum"] = values
+        samples["count"] = 1
+        finished = self.levels[0].merge(samples)
+        for lower, upper in zip(self.levels, self.levels[1:]):
+            if not len(finished):
+                break
+            finished = upper.merge(self._lift(finished, lower, upper))
+
+    def _pending(self, index):
+        """
+        index 番目の段でまだ区切りが付いていない分（その段と下の段の途中のバケットをその段の番号でまとめたもの）
+
+        上の段には下の段で区切りが付いたバケットしか入っていないので、最新の部分は下の段の途中のバケットも足す。
+        """
+        level = self.levels[index]
+        partials = [lower.partial.reshape(1) for lower in self.levels[:index + 1] if lower.partial is not None]
+        if not partials:
+            return None
+        pending = np.concatenate(partials)
+        pending["bucket"] = pending["bucket"] * np.array([lower.width_s for lower in self.levels[:index + 1]
+                                                          if lower.partial is not None]) // level.width_s
+        return _aggregate(pending[np.argsort(pending["bucket"], kind="stable")])
+
+    def query(self, start_ns, end_ns, max_points=1000):
+        """
+        [start_ns, end_ns) を max_points 点以内で表示できる一番細かい段のバケットを返す
+
+        一番粗い段でも収まらないときは、一番粗い段のバケットを何個かずつまとめて max_points 点以内にする
+        （まとめる区切りは範囲によらず同じ時刻の格子にそろえるので、移動しても点が揺れない）。
+
+        Args:
+            start_ns, end_ns (int): 範囲（add() と同じ原点のナノ秒）
+            max_points (int): 点の数の上限（画面の横のピクセル数など。2以上）
+
+        Returns:
+            ndarray: VIEW_DTYPE（time_ns はバケットの始まり）の配列
+        """
+        if max_points < 2:
+            raise ValueError(f"max_points は2以上です: {max_points}")
+        end_ns = max(end_ns, start_ns + 1)
+
+        def covered(width_ns, group=1):
+            # 範囲にかかるバケットの数（両端の途中までのバケットも数える）
+            return (end_ns - 1) // width_ns // group - start_ns // width_ns // group + 1
+
+        index = next((i for i, level in enumerate(self.levels) if covered(level.width_ns) <= max_points),
+                     len(self.levels) - 1)
+        level = self.levels[index]
+        buckets = level.view(start_ns, end_ns, self._pending(index))
+        width_ns = level.width_ns
+        count = covered(width_ns)
+        if count > max_points:
+            # group 個ずつまとめる。両端が格子の途中にあっても max_points に収まる大きさにする
+            group = -(-count // max_points)
+            if covered(width_ns, group) > max_points:
+                group = -(-(count - 1) // (max_points - 1))
+            buckets = buckets.copy()
+            buckets["bucket"] //= group
+            buckets = _aggregate(buckets)
+            width_ns *= group
+        view = np.empty(len(buckets), dtype=VIEW_DTYPE)
+        view["time_ns"] = buckets["bucket"] * width_ns
+        view["min"] = buckets["min"]
+        view["max"] = buckets["max"]
+        view["mean"] = buckets["sum"] / np.maximum(buckets["count"], 1)
+        view["count"] = buckets["count"]
+        return view
+
+    def close(self):
+        """ファイルを閉じる（1秒の段の途中のバケットも書いておき、次に開いたときに途中のバケットに戻す）"""
+        self.levels[0].save_partial()
+        for level in self.levels:
+            level.close()
@@ -1,5 +1,7 @@
+// ビルド: g++ -O2 weight_reader.cpp -o weight_reader -lwiringPi -pthread -lrt
 #include <iostream>
 #include <wiringPi.h> //HX711のGPIO制御用,インストールが必要
+#include "hx711_reader.h"
 #include <fcntl.h>
 #include <sys/mman.h>
 #include <unistd.h>
@@ -8,14 +10,46 @@
 #include <string>
 #include <chrono>
 #include <thread>
+#include <atomic>
+#include <cstdint>
+#include <ctime>
+#include <semaphore.h>
+#include <csignal>
 
 //共有メモリの名前
 const char* SHM_NAME = "/weight_shm";
+//新しいデータを通知するセマフォの名前
+const char* SEM_NAME = "/weight_sem";
 
-//センサーデータの構造体
-struct SensorData {
+//リングバッファの識別子とサイズ（hx711_memory.py と一致させる）
+const uint32_t RING_MAGIC = 0x474E5257; // "WRNG"
+const uint32_t RING_VERSION = 1;
+const uint32_t RING_CAPACITY = 1024;
+
+//共有メモリ先頭のヘッダ
+struct RingHeader {
+    uint32_t magic;
+    uint32_t version;
+    uint32_t capacity;
+    uint32_t record_size;
+    std::atomic<uint64_t> write_seq; //次に書き込むシーケンス番号（書き込み側のみ更新）
+    std::atomic<uint64_t> read_seq;  //読み取り側が処理済みのシーケンス番号（読み取り側のみ更新）
+};
+
+//1サンプル分のレコード
+struct SensorRecord {
+    std::atomic<uint64_t> seq; //書き込み中は RECORD_WRITING
+    uint64_t timestamp_ns;     //DRDY時点のCLOCK_MONOTONIC
     double weight;
-    bool ready;
+};
+const uint64_t RECORD_WRITING = UINT64_MAX;
+static_assert(sizeof(RingHeader) == 32, "RingHeader layout must match hx711_memory.py");
+static_assert(sizeof(SensorRecord) == 24, "SensorRecord layout must match hx711_memory.py");
+
+//共有メモリ全体（単一書き込みのリングバッファ）
+struct SensorRing {
+    RingHeader header;
+    SensorRecord records[RING_CAPACITY];
 };
 //共有メモリ作成
 static int create_shared_memory(const char* name, size_t size) {
@@ -41,60 +75,78 @@ static void* map_shared_memory(int fd, size_t size) {
     }
     return ptr;
 }
-//センサーデータの書き込み
-static void write_sensor_memory(SensorData* data,double value) {
-    data->weight = value;
-    data->ready = true;
-    
+//リングバッファの初期化（write_seq等を設定してから最後にmagicを書く）
+static void init_sensor_ring(SensorRing* ring) {
+    ring->header.magic = 0;
+    ring->header.version = RING_VERSION;
+    ring->header.capacity = RING_CAPACITY;
+    ring->header.record_size = sizeof(SensorRecord);
+    ring->header.write_seq.store(0, std::memory_order_relaxed);
+    ring->header.read_seq.store(0, std::memory_order_relaxed);
+    for (uint32_t i = 0; i < RING_CAPACITY; i++) {
+        ring->records[i].seq.store(RECORD_WRITING, std::memory_order_relaxed);
+    }
+    std::atomic_thread_fence(std::memory_order_release);
+    ring->header.magic = RING_MAGIC;
+}
 
+//センサーデータの書き込み（読み取り側を待たずに次のスロットへ書く）
+static void write_sensor_memory(SensorRing* ring, double value, uint64_t timestamp_ns) {
+    uint64_t seq = ring->header.write_seq.load(std::memory_order_relaxed);
+    SensorRecord& record = ring->records[seq % RING_CAPACITY];
+    //書き込み中であることを示してから中身を更新する
+    record.seq.store(RECORD_WRITING, std::memory_order_relaxed);
+    std::atomic_thread_fence(std::memory_order_release);
+    record.timestamp_ns = timestamp_ns;
+    record.weight = value;
+    record.seq.store(seq, std::memory_order_release);
+    ring->header.write_seq.store(seq + 1, std::memory_order_release);
 }
-//センサデータの取得
-double readHx711Count(int GpioPinDT = 2, int GpioPinSCK = 3) {
-    wiringPiSetupGpio();
-    int i;
-    unsigned int Count = 0;
-    pinMode(GpioPinDT, OUTPUT);
-    digitalWrite(GpioPinDT, HIGH);
-    pinMode(GpioPinSCK, OUTPUT);
-    digitalWrite(GpioPinSCK, LOW);
-    pinMode(GpioPinDT, INPUT);
-    while (digitalRead(GpioPinDT) == 1) {
-        i = 0;
-    }
-    for (i = 0; i < 24; i++) {
-        digitalWrite(GpioPinSCK, HIGH);
-        Count = Count << 1;
-        
-        digitalWrite(GpioPinSCK, LOW);
-        if (digitalRead(GpioPinDT) == 0) {
-            Count = Count + 1;
-        }
-    }
-    digitalWrite(GpioPinSCK, HIGH);
-    Count = Count ^ 0x800000;
-    digitalWrite(GpioPinSCK, LOW);
-    return double(Count);
+
+//SIGTERM/SIGINTで読み取りループを抜けて後始末する
+static volatile sig_atomic_t stopRequested = 0;
+
+static void onStopSignal(int) {
+    stopRequested = 1;
 }
 
 int main() {
-    size_t SHM_SIZE = sizeof(SensorData);
+    std::signal(SIGTERM, onStopSignal);
+    std::signal(SIGINT, onStopSignal);
+
+    size_t SHM_SIZE = sizeof(SensorRing);
     int shm_fd = create_shared_memory(SHM_NAME, SHM_SIZE);
     if (shm_fd == -1) return 1;
 
     void* ptr = map_shared_memory(shm_fd, SHM_SIZE);
     if (!ptr) return 1;
 
-    SensorData* data = static_cast<SensorData*>(ptr);
-    while (true) {
-        double current_value = readHx711Count();
-        write_sensor_memory(data, current_value);
-        while (data->ready) {
-            std::this_thread::sleep_for(std::chrono::milliseconds(100));
+    //読み取り側はこのセマフォで待機するので、書き込むたびにpostする
+    sem_t* data_sem = sem_open(SEM_NAME, O_CREAT, 0666, 0);
+    if (data_sem == SEM_FAILED) {
+        perror("sem_open");
+        return 1;
+    }
+
+    SensorRing* ring = static_cast<SensorRing*>(ptr);
+    init_sensor_ring(ring);
+    setupHx711();
+    while (!stopRequested) {
+        //DOUTの立ち下がりまで眠って待つ（止められた場合は次の変換かタイムアウトで抜ける）
+        uint64_t drdy_ns = 0;
+        if (!waitHx711Ready(2, 1000, &drdy_ns)) {
+            if (stopRequested) break;
+            std::cerr << "HX711: DRDY timeout (" << hx711Timeouts << ")" << std::endl;
+            continue;
         }
-        std::this_thread::sleep_for(std::chrono::milliseconds(500));
+        double current_value = double(readHx711Count(2, 3));
+        write_sensor_memory(ring, current_value, drdy_ns);
+        sem_post(data_sem);
     }
 
-    // 通常は実行されないが、クリーンアップを書くなら以下
+    //後始末（読み取り側も念のため削除する）
+    sem_close(data_sem);
+    sem_unlink(SEM_NAME);
     munmap(ptr, SHM_SIZE);
     close(shm_fd);
     shm_unlink(SHM_NAME);
@@ -0,0 +1,396 @@
+"""
+測定データをファイルに記録する
+
+CsvRecorder は行をキューに入れるだけで戻り、バックグラウンドのスレッドがまとめて書き込みます。
+サンプリングのループがSDカードへの書き込みで待たされることはありません。
+
+    recorder = CsvRecorder(path, "time,weight", "{:.3f},{:.2f}")
+    recorder.write(current_time, weight)
+    ...
+    recorder.close()
+
+書き込みの確実さ（durability）は次から選べます。
+- "none":  ファイルを閉じるときまで Python のバッファに任せる（最も速い。異常終了すると最後の分を失う）
+- "flush": まとめて書くたびに OS に渡す（プロセスが落ちても残る。電源断では失うことがある）
+- "fsync": まとめて書くたびに fsync する（電源断でも残る。SDカードでは遅い）
+
+BinaryRecorder は固定長のレコード（seq, timestamp_ns, raw, weight の20バイト）を追記するバイナリ形式（.wrec）で、
+Recording はそれを mmap したままの NumPy 配列として読みます（CSV への書き出しもできます）。
+
+ConsoleEcho はコンソールへの表示の回数を抑えます（表示する分だけ文字列を作ります）。
+"""
+import os
+import sys
+import time
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+# バイナリ形式（.wrec）: 64バイトのヘッダーの後に固定長のレコードが続く
+# ヘッダー: マジック, 版, ヘッダーの長さ, レコードの長さ, 予備, 開始時刻（time.time_ns()）,
+#           同じ時点の time.monotonic_ns(), ゼロ点, 係数
+HEADER_FORMAT = "<4sHHHHqqdd"
+HEADER_SIZE = 64
+FILE_MAGIC = b"WREC"
+FILE_VERSION = 1
+RECORD_FILE_DTYPE = np.dtype([("seq", "<u4"), ("timestamp_ns", "<u8"), ("raw", "<i4"), ("weight", "<f4")])
+RECORD_SIZE = RECORD_FILE_DTYPE.itemsize
+CSV_HEADER = "time,seq,timestamp_ns,raw_reading,weight"
+
+
+class BackgroundWriter:
+    """
+    バックグラウンドのスレッドで行をまとめて書き込む記録の基底クラス（_encode() で行をバイト列にする）
+    """
+    def __init__(self, path, batch_size=256, flush_interval=1.0, durability="flush", max_pending=100000,
+                 mode="wb"):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability は {', '.join(DURABILITY_LEVELS)} のいずれかです: {durability}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_pending = max_pending
+        self.written = 0        # 書き込んだ行数
+        self.dropped = 0        # 溜めきれずに捨てた行数
+        self.batches = 0        # 書き込んだ回数
+        self._pending = deque()
+        self._count = 0         # 溜まっている行数（ブロックは件数で数える）
+        self._first_ns = None   # 溜まっている一番古い行を受け取った時刻
+        self._closed = False
+        self._cond = threading.Condition()
+        self._file = open(path, mode)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _start(self):
+        self._thread.start()
+
+    def _put(self, item, count):
+        """行（またはブロック）をキューに入れる（待たない）"""
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"記録は閉じられています: {self.path}")
+            while self._pending and self._count + count > self.max_pending:
+                dropped = self._pending.popleft()
+                dropped_count = len(dropped) if hasattr(dropped, "dtype") else 1
+                self._count -= dropped_count
+                self.dropped += dropped_count
+            self._pending.append(item)
+            self._count += count
+            if self._first_ns is None:
+                # 空のあいだ書き込みスレッドは期限なしで待っているので、flush_interval の期限を数え始めさせる
+                self._first_ns = time.monotonic_ns()
+                self._cond.notify()
+            elif self._count >= self.batch_size:
+                self._cond.notify()
+
+    def _encode(self, items):
+        """溜まった行をまとめてバイト列にする"""
+        raise NotImplementedError
+
+    def _run(self):
+        interval_ns = int(self.flush_interval * 1e9)
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._count >= self.batch_size:
+                        break
+                    if self._first_ns is None:
+                        self._cond.wait()
+                        continue
+                    remaining = (self._first_ns + interval_ns - time.monotonic_ns()) / 1e9
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                items, self._pending = self._pending, deque()
+                count, self._count = self._count, 0
+                self._first_ns = None
+                closed = self._closed
+            if items:
+                self._write_batch(items, count)
+            if closed:
+                break
+
+    def _write_batch(self, items, count):
+        try:
+            self._file.write(self._encode(items))
+            if self.durability != "none":
+                self._file.flush()
+            if self.durability == "fsync":
+                os.fsync(self._file.fileno())
+        except (OSError, ValueError, TypeError) as e:
+            # 書式が合わない行やディスクの異常で記録を止めない
+            print(f"記録の書き込みに失敗しました: {self.path}: {e}")
+            return
+        self.written += count
+        self.batches += 1
+
+    def close(self):
+        """溜まっている分を書き込んでからファイルを閉じる"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._file.flush()
+        if self.durability == "fsync":
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvRecorder(BackgroundWriter):
+    """
+    バックグラウンドのスレッドで行をまとめて書き込む CSV の記録
+    """
+    def __init__(self, path, header=None, row_format=None, batch_size=256, flush_interval=1.0,
+                 durability="flush", max_pending=100000):
+        """
+        初期化（ファイルを作り、書き込みスレッドを始める）
+
+        Args:
+            path (str): 書き込むファイル
+            header (str): 1行目（改行なし。省略時は書かない）
+            row_format (str): write() に渡した値を行にする書式（例: "{:.3f},{},{:.2f}"）。
+                              省略時は値を "," でつなぐ
+            batch_size (int): これだけ溜まったら書き込む（行数）
+            flush_interval (float): 溜まっていなくても、最初の行からこれだけたったら書き込む（秒）
+            durability (str): "none" / "flush" / "fsync"
+            max_pending (int): 書き込みが追いつかないときに溜めておく最大の行数（超えた分は捨てて数える）
+        """
+        super().__init__(path, batch_size, flush_interval, durability, max_pending)
+        self.row_format = row_format
+        if header is not None:
+            self._file.write((header + "\n").encode("utf-8"))
+        self._start()
+
+    def write(self, *values):
+        """1行を追加する（キューに入れるだけで待たない。書式の適用も書き込みスレッドで行う）"""
+        self._put(values, 1)
+
+    def _format(self, values):
+        if self.row_format is not None:
+            return self.row_format.format(*values)
+        return ",".join("" if value is None else str(value) for value in values)
+
+    def _encode(self, items):
+        return "".join(self._format(values) + "\n" for values in items).encode("utf-8")
+
+
+class BinaryRecorder(BackgroundWriter):
+    """
+    固定長レコードのバイナリ形式（.wrec）で追記する記録
+
+    既存のファイルを指定した場合はヘッダーを確かめてから末尾に追記する。
+    """
+    def __init__(self, path, initial_offset=0.0, factor=0.0, start_wall_ns=None, start_monotonic_ns=None,
+                 batch_size=1024, flush_interval=1.0, durability="flush", max_pending=1000000):
+        """
+        初期化（ファイルを開き、書き込みスレッドを始める）
+
+        Args:
+            path (str): 書き込むファイル
+            initial_offset (float): 記録したときのゼロ点（生の値）
+            factor (float): 記録したときの係数（重量 = (生の値 - ゼロ点) * factor など。アプリの式に合わせる）
+            start_wall_ns (int): 記録の開始時刻（time.time_ns()。省略時は今）
+            start_monotonic_ns (int): 同じ時点の time.monotonic_ns()（timestamp_ns を時刻に直すのに使う）
+            その他は CsvRecorder と同じ
+        """
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        if exists:
+            header = read_header(path)
+            # 途中で途切れたレコードがあれば切り詰めてから追記する
+            size = os.path.getsize(path)
+            records = (size - header["header_size"]) // RECORD_SIZE
+            with open(path, "r+b") as f:
+                f.truncate(header["header_size"] + records * RECORD_SIZE)
+        super().__init__(path, batch_size, flush_interval, durability, max_pending, mode="ab")
+        if exists:
+            self.header = header
+        else:
+            self.header = {
+                "start_wall_ns": start_wall_ns if start_wall_ns is not None else time.time_ns(),
+                "start_monotonic_ns": start_monotonic_ns if start_monotonic_ns is not None else time.monotonic_ns(),
+                "initial_offset": float(initial_offset),
+                "factor": float(factor),
+            }
+            self._file.write(pack_header(**self.header))
+            self._file.flush()
+        self._start()
+
+    def write(self, seq, timestamp_ns, raw, weight):
+        """1件を追加する（キューに入れるだけで待たない）"""
+        self._put((seq, timestamp_ns, int(round(raw)), weight), 1)
+
+    def write_block(self, block):
+        """
+        ブロックをまとめて追加する（seq, timestamp_ns, raw, weight の列を持つ構造化配列。
+        hx711lib.HX711.subscribe() のコールバックにそのまま使える）
+        """
+        records = to_records(block)
+        self._put(records, len(records))
+
+    def _encode(self, items):
+        chunks = []
+        rows = []
+        for item in items:
+            if isinstance(item, np.ndarray):
+                if rows:
+                    chunks.append(np.array(rows, dtype=RECORD_FILE_DTYPE).tobytes())
+                    rows = []
+                chunks.append(item.tobytes())
+            else:
+                rows.append(item)
+        if rows:
+            chunks.append(np.array(rows, dtype=RECORD_FILE_DTYPE).tobytes())
+        return b"".join(chunks)
+
+
+class ConsoleEcho:
+    """
+    コンソールへの表示を interval 秒に1回までに抑える
+
+    表示しない回は文字列を作らないので、サンプルごとに呼んでも負担にならない。
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.suppressed = 0     # 表示しなかった回数
+        self._next = 0.0
+
+    def echo(self, message_format, *values):
+        """
+        表示する（前回から interval 秒たっていなければ何もしない）
+
+        Returns:
+            bool: 表示したか
+        """
+        now = time.monotonic()
+        if now < self._next:
+            self.suppressed += 1
+            return False
+        self._next = now + self.interval
+        print(message_format.format(*values) if values else message_format)
+        return True
+
+
+def to_records(block):
+    """seq, timestamp_ns, raw, weight の列を持つ構造化配列（または列の dict）をファイルのレコードの形にする（生の値は丸める）"""
+    records = np.empty(len(block["seq"]), dtype=RECORD_FILE_DTYPE)
+    records["seq"] = block["seq"]
+    records["timestamp_ns"] = block["timestamp_ns"]
+    records["raw"] = np.rint(block["raw"])
+    records["weight"] = block["weight"]
+    return records
+
+
+def pack_header(start_wall_ns, start_monotonic_ns, initial_offset, factor):
+    """ヘッダー（HEADER_SIZE バイト）を作る"""
+    header = struct.pack(HEADER_FORMAT, FILE_MAGIC, FILE_VERSION, HEADER_SIZE, RECORD_SIZE, 0,
+                         start_wall_ns, start_monotonic_ns, initial_offset, factor)
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path):
+    """
+    ヘッダーを読む
+
+    Returns:
+        dict: start_wall_ns, start_monotonic_ns, initial_offset, factor, header_size, version
+    """
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < struct.calcsize(HEADER_FORMAT):
+        raise ValueError(f"ヘッダーが短すぎます: {path}")
+    magic, version, header_size, record_size, _, start_wall_ns, start_monotonic_ns, offset, factor = \
+        struct.unpack_from(HEADER_FORMAT, data)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"記録ファイルではありません: {path}")
+    if version != FILE_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"対応していない版です（版 {version}, レコード {record_size} バイト）: {path}")
+    return {
+        "version": version,
+        "header_size": header_size,
+        "start_wall_ns": start_wall_ns,
+        "start_monotonic_ns": start_monotonic_ns,
+        "initial_offset": offset,
+        "factor": factor,
+    }
+
+
+def write_recording(path, records, initial_offset=0.0, factor=0.0, start_wall_ns=None, start_monotonic_ns=None):
+    """
+    配列をまとめてバイナリ形式で保存する（1行ずつのループは使わない）
+
+    Args:
+        records (array): seq, timestamp_ns, raw, weight の列を持つ構造化配列（または列の dict）
+    """
+    data = to_records(records)
+    with open(path, "wb") as f:
+        f.write(pack_header(start_wall_ns if start_wall_ns is not None else time.time_ns(),
+                            start_monotonic_ns if start_monotonic_ns is not None else time.monotonic_ns(),
+                            float(initial_offset), float(factor)))
+        data.tofile(f)
+
+
+class Recording:
+    """
+    バイナリ形式の記録を読む（レコードは mmap したファイルをそのまま見る NumPy 配列で、コピーしない）
+
+        recording = Recording("weight_data/session.wrec")
+        recording.records["weight"].mean()
+    """
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        count = (os.path.getsize(path) - self.header["header_size"]) // RECORD_SIZE
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_FILE_DTYPE, mode="r",
+                                     offset=self.header["header_size"], shape=(count,))
+        else:
+            # 空のファイルは mmap できない
+            self.records = np.zeros(0, dtype=RECORD_FILE_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def times(self):
+        """記録の開始からの秒数"""
+        return (self.records["timestamp_ns"].astype(np.int64) - self.header["start_monotonic_ns"]) / 1e9
+
+    def export_csv(self, path, chunk_size=65536):
+        """
+        CSV に書き出す（従来の weight_data_*.csv と同じ列）
+
+        大きな記録でもメモリに載せきらないように chunk_size 件ずつ書く。
+        """
+        with open(path, "w") as f:
+            f.write(CSV_HEADER + "\n")
+            for start in range(0, len(self.records), chunk_size):
+                chunk = self.records[start:start + chunk_size]
+                times = (chunk["timestamp_ns"].astype(np.int64) - self.header["start_monotonic_ns"]) / 1e9
+                rows = zip(times.tolist(), chunk["seq"].tolist(), chunk["timestamp_ns"].tolist(),
+                           chunk["raw"].tolist(), chunk["weight"].tolist())
+                f.write("".join("%.3f,%d,%d,%d,%.2f\n" % row for row in rows))
+
+
+if __name__ == "__main__":
+    # 使い方: python weight_recorder.py 記録.wrec [出力.csv]
+    if len(sys.argv) < 2:
+        print("使い方: python weight_recorder.py 記録.wrec [出力.csv]")
+        sys.exit(1)
+    recording = Recording(sys.argv[1])
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(sys.argv[1])[0] + ".csv"
+    recording.export_csv(output)
+    print(f"{len(recording)}件を書き出しました: {output}")
@@ -0,0 +1,81 @@
+// 常駐型のHX711読み取りプロセス
+// 起動したまま読み取りを続け、標準出力に固定長のバイナリフレームを書き出す。
+// ビルド: g++ -O2 weight_stream.cpp -o weight_stream -lwiringPi -pthread
+// 使い方: weight_stream [DTピン] [SCKピン] [A128|A64|B32] [RATEピン] [10|80]
+#include <cstdio>
+#include <cstdint>
+#include <cstdlib>
+#include "hx711_reader.h"
+
+//フレームの先頭に置く識別子（Python側で同期確認に使う）
+const uint16_t FRAME_MAGIC = 0x5748;
+//statusのビット
+const uint16_t STATUS_TIMEOUT = 0x0001; //DRDYが来なかった（センサー未接続など）。rawは無効
+const uint16_t STATUS_RATE_80SPS = 0x0002; //80SPSで変換している
+const int STATUS_GAIN_SHIFT = 2;        //ビット2-3: 読み出しのクロック数-25（0:A/128, 1:B/32, 2:A/64）
+
+//DRDYを待つ最大時間
+const int READY_TIMEOUT_MS = 1000;
+
+//1サンプル分のフレーム（リトルエンディアン、20バイト）
+#pragma pack(push, 1)
+struct Frame {
+    uint16_t magic;
+    uint16_t status;
+    uint32_t raw;
+    uint32_t seq;          //変換ごとに1ずつ増える番号（読み損ねた変換の分は飛ぶ）
+    uint64_t timestamp_ns; //DRDY時点のCLOCK_MONOTONIC
+};
+#pragma pack(pop)
+
+static bool write_frame(const Frame& frame) {
+    //読み取り側が終了したら書き込みに失敗する
+    if (fwrite(&frame, sizeof(frame), 1, stdout) != 1) return false;
+    fflush(stdout);
+    return true;
+}
+
+int main(int argc, char* argv[]) {
+    int pinDT = argc > 1 ? atoi(argv[1]) : 2;
+    int pinSCK = argc > 2 ? atoi(argv[2]) : 3;
+    const char* gain = argc > 3 ? argv[3] : "A128";
+    int pinRATE = argc > 4 ? atoi(argv[4]) : -1;
+    bool highRate = argc > 5 && atoi(argv[5]) == 80;
+
+    if (!setHx711Gain(gain)) {
+        fprintf(stderr, "ゲインは A128, A64, B32 のいずれかです: %s\n", gain);
+        return 1;
+    }
+    setupHx711(pinDT, pinSCK);
+    if (pinRATE >= 0) setHx711Rate(pinRATE, highRate);
+
+    //ステータスにレートとゲインを載せて利用側に知らせる
+    uint16_t mode = uint16_t((hx711GainPulses - 25) << STATUS_GAIN_SHIFT);
+    if (pinRATE >= 0 && highRate) mode |= STATUS_RATE_80SPS;
+
+    //電源投入直後の変換はA128なので、他のゲインなら1回読み捨てる
+    if (hx711GainPulses != 25 && waitHx711Ready(pinDT, READY_TIMEOUT_MS)) {
+        readHx711Count(pinDT, pinSCK);
+    }
+
+    Frame frame = {FRAME_MAGIC, mode, 0, 0, 0};
+    unsigned long missed = 0;
+    while (true) {
+        //DOUTの立ち下がりまで眠って待つ
+        uint64_t drdy_ns = 0;
+        if (!waitHx711Ready(pinDT, READY_TIMEOUT_MS, &drdy_ns)) {
+            Frame timeout = {FRAME_MAGIC, uint16_t(mode | STATUS_TIMEOUT), 0, frame.seq, monotonic_ns()};
+            if (!write_frame(timeout)) break;
+            continue;
+        }
+        //読み損ねた変換の分だけseqを進める
+        frame.seq += uint32_t(hx711Missed - missed);
+        missed = hx711Missed;
+        frame.status = mode;
+        frame.raw = readHx711Count(pinDT, pinSCK);
+        frame.timestamp_ns = drdy_ns;
+        if (!write_frame(frame)) break;
+        frame.seq++;
+    }
+    return 0;
+}
@@ -0,0 +1,320 @@
+"""
+常駐型の重量センサー読み取りクライアント
+
+weight_stream（weight_stream.cpp）を一度だけ起動し、標準出力に流れてくる
+固定長フレームをバックグラウンドで読み続けます。
+各アプリはサンプルごとに weight_reader を起動する代わりにこのクライアントを共有します。
+"""
+import os
+import sys
+import time
+import struct
+import random
+import atexit
+import subprocess
+import threading
+from collections import namedtuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STREAM_PATH = os.path.join(BASE_DIR, "weight_stream")
+STREAM_SOURCE = os.path.join(BASE_DIR, "weight_stream.cpp")
+
+# フレーム形式（weight_stream.cpp の Frame 構造体と一致させる）
+FRAME_MAGIC = 0x5748
+FRAME_FORMAT = "<HHIIQ"  # magic, status, raw, seq, timestamp_ns
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+STATUS_TIMEOUT = 0x0001  # DRDYが来なかった（センサー未接続など）。raw は無効
+STATUS_RATE_80SPS = 0x0002  # 80SPSで変換している（無ければ10SPS）
+STATUS_GAIN_SHIFT = 2       # ビット2-3: チャンネル・ゲイン
+STATUS_GAIN_MASK = 0x000C
+GAIN_NAMES = ("A128", "B32", "A64")
+
+# 1サンプル分のデータ（timestamp_ns は変換完了（DRDY）時点の time.monotonic_ns() と同じ時計）
+Sample = namedtuple("Sample", ["seq", "timestamp_ns", "raw"])
+
+
+class LatencyStats:
+    """
+    変換完了（DRDY）からPython側で取り出すまでの遅延を集計するクラス
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.last_ns = 0
+
+    def add(self, timestamp_ns, now_ns=None):
+        """変換時刻を渡して遅延を記録する（now_ns 省略時は現在時刻）"""
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        latency = now_ns - timestamp_ns
+        self.count += 1
+        self.total_ns += latency
+        self.last_ns = latency
+        if latency > self.max_ns:
+            self.max_ns = latency
+        return latency
+
+    def add_block(self, timestamps_ns, now_ns=None):
+        """変換時刻の配列（NumPy など）をまとめて記録する"""
+        if not len(timestamps_ns):
+            return
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        # 符号なし整数の配列のまま引き算すると桁あふれするので、合計と最小値を Python の整数にしてから計算する
+        self.count += len(timestamps_ns)
+        self.total_ns += now_ns * len(timestamps_ns) - int(timestamps_ns.sum())
+        self.last_ns = now_ns - int(timestamps_ns[-1])
+        latency = now_ns - int(timestamps_ns.min())
+        if latency > self.max_ns:
+            self.max_ns = latency
+
+    @property
+    def mean_ms(self):
+        return self.total_ns / self.count / 1e6 if self.count else 0.0
+
+    @property
+    def max_ms(self):
+        return self.max_ns / 1e6
+
+    def summary(self):
+        return f"遅延: 平均 {self.mean_ms:.2f} ms, 最大 {self.max_ms:.2f} ms ({self.count}サンプル)"
+
+
+_local_seq = 0
+
+
+def local_sample(raw):
+    """
+    タイムスタンプを持たない読み取り値（模擬データなど）を取り出した時刻で Sample にする
+    """
+    global _local_seq
+    sample = Sample(_local_seq, time.monotonic_ns(), raw)
+    _local_seq += 1
+    return sample
+
+
+def stream_command(dat_pin=2, clk_pin=3, gain="A128", rate_pin=None, sample_rate=10):
+    """
+    チャンネル・ゲインやレートを指定して weight_stream を起動するコマンドを作る
+
+    Args:
+        dat_pin, clk_pin (int): DOUT, PD_SCK のGPIO
+        gain (str): "A128", "A64", "B32" のいずれか
+        rate_pin (int): RATEを接続したGPIO（None ならボードの配線どおり）
+        sample_rate (int): rate_pin を使う場合のレート（10 か 80）
+
+    Returns:
+        list: get_shared_stream() や WeightStream() に渡すコマンド
+    """
+    if gain not in GAIN_NAMES:
+        raise ValueError(f"gain は {', '.join(GAIN_NAMES)} のいずれかです: {gain}")
+    command = [STREAM_PATH, str(dat_pin), str(clk_pin), gain]
+    if rate_pin is not None:
+        command += [str(rate_pin), str(int(sample_rate))]
+    return command
+
+
+def compile_stream_reader():
+    """weight_stream が無ければコンパイルする"""
+    if os.path.exists(STREAM_PATH):
+        return True
+    print("weight_streamをコンパイルします...")
+    try:
+        subprocess.run(["g++", "-O2", STREAM_SOURCE, "-o", STREAM_PATH, "-lwiringPi", "-pthread"], check=True)
+        print("コンパイル成功")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"コンパイル失敗: {e}")
+        return False
+
+
+class WeightStream:
+    """
+    常駐している読み取りプロセスからフレームを受け取るクライアント
+    """
+    def __init__(self, command=None):
+        """
+        初期化
+
+        Args:
+            command (list): 起動するコマンド（省略時は weight_stream）
+        """
+        self.command = command or [STREAM_PATH]
+        self.process = None
+        self.latest = None      # 最新の Sample
+        self.count = 0          # 受信したフレーム数
+        self.errors = 0         # 不正なフレーム数
+        self.dropped = 0        # seq の欠番（読み損ねた変換の数）
+        self.timeouts = 0       # DRDYが来なかった回数
+        self.sample_rate = 10.0 # 読み取りプロセスが知らせてくる変換レート（SPS）
+        self.gain = "A128"      # 同じくチャンネル・ゲイン
+        self.latency = LatencyStats()
+        self.on_frame = None    # 受信した正しいフレーム（bytes）ごとに呼ぶ関数（sensor_broker が配信に使う）
+        self._read_count = 0    # read() が最後に返したフレーム番号
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        """読み取りプロセスを起動する（起動済みなら何もしない）"""
+        if self.is_running():
+            return
+        if self.command[0] == STREAM_PATH:
+            compile_stream_reader()
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, bufsize=0)
+        self._thread = threading.Thread(target=self._reader_loop, args=(self.process.stdout,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _reader_loop(self, pipe):
+        """フレームを読み続けて最新値を更新するスレッド関数"""
+        buf = bytearray()
+        while True:
+            chunk = pipe.read(4096)
+            if not chunk:
+                break
+            buf += chunk
+            pos = 0
+            while len(buf) - pos >= FRAME_SIZE:
+                magic, status, raw, seq, timestamp_ns = struct.unpack_from(FRAME_FORMAT, buf, pos)
+                if magic != FRAME_MAGIC:
+                    # 同期が外れた場合は1バイトずつずらして先頭を探す
+                    self.errors += 1
+                    pos += 1
+                    continue
+                if self.on_frame is not None:
+                    self.on_frame(bytes(buf[pos:pos + FRAME_SIZE]))
+                pos += FRAME_SIZE
+                self.sample_rate = 80.0 if status & STATUS_RATE_80SPS else 10.0
+                self.gain = GAIN_NAMES[((status & STATUS_GAIN_MASK) >> STATUS_GAIN_SHIFT) % len(GAIN_NAMES)]
+                if status & STATUS_TIMEOUT:
+                    self.timeouts += 1
+                    continue
+                with self._cond:
+                    if self.latest is not None and seq != (self.latest.seq + 1) & 0xFFFFFFFF:
+                        self.dropped += (seq - self.latest.seq - 1) & 0xFFFFFFFF
+                    self.latest = Sample(seq, timestamp_ns, float(raw))
+                    self.count += 1
+                    self._cond.notify_all()
+            del buf[:pos]
+        with self._cond:
+            self._cond.notify_all()
+
+    def read_sample(self, timeout=2.0):
+        """
+        前回の読み取り以降に届いた新しいサンプルを返す
+
+        Returns:
+            Sample: (seq, timestamp_ns, raw)（タイムアウト時は None）
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.count == self._read_count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.is_running():
+                    return None
+                self._cond.wait(remaining)
+            self._read_count = self.count
+            sample = self.latest
+        self.latency.add(sample.timestamp_ns)
+        return sample
+
+    def read(self, timeout=2.0):
+        """
+        前回の読み取り以降に届いた新しい読み取り値を返す
+
+        Returns:
+            float: 生の読み取り値（タイムアウト時は None）
+        """
+        sample = self.read_sample(timeout)
+        return sample.raw if sample else None
+
+    def close(self):
+        """読み取りプロセスを終了する"""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        self.process = None
+
+
+# コマンドごとに共有するクライアント
+_shared_streams = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_stream(command=None):
+    """
+    プロセス内で共有する WeightStream を取得する
+    同じコマンドに対しては常に同じインスタンス（同じ読み取りプロセス）を返す
+    コマンドを省略した場合、センサーブローカーが動いていればそこに接続する
+    （ブローカーが止まって接続し直せなくなったら、読み取りプロセスを起動する WeightStream に切り替える）
+    """
+    key = tuple(command or [STREAM_PATH])
+    with _shared_lock:
+        stream = _shared_streams.get(key)
+        if stream is not None and not stream.is_running():
+            try:
+                stream.start()
+            except OSError as e:
+                # ブローカーが止まり、接続し直せなかった
+                print(f"センサーブローカーに接続できないので読み取りプロセスを起動します: {e}")
+                stream.close()
+                del _shared_streams[key]
+                stream = None
+        if stream is None:
+            # センサーブローカーが動いていれば、読み取りプロセスを起動せずにそこから受け取る
+            if command is None:
+                from sensor_broker import connect_broker
+                stream = connect_broker()
+            if stream is None:
+                stream = WeightStream(list(key))
+            _shared_streams[key] = stream
+        stream.start()
+        return stream
+
+
+@atexit.register
+def _close_shared_streams():
+    for stream in _shared_streams.values():
+        stream.close()
+
+
+def run_mock_stream(rate=10.0):
+    """ハードウェアなしで試すための模擬ストリーム（weight_stream と同じフレームを出力）"""
+    out = sys.stdout.buffer
+    base_weight = 8300000
+    variation = 50000
+    status = STATUS_RATE_80SPS if rate == 80.0 else 0
+    seq = 0
+    try:
+        while True:
+            raw = int(base_weight + random.uniform(-variation * 0.2, variation * 0.2))
+            out.write(struct.pack(FRAME_FORMAT, FRAME_MAGIC, status, raw, seq, time.monotonic_ns()))
+            out.flush()
+            seq = (seq + 1) & 0xFFFFFFFF
+            time.sleep(1.0 / rate)
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+
+
+if __name__ == "__main__":
+    if "--mock" in sys.argv:
+        run_mock_stream(80.0 if "--80sps" in sys.argv else 10.0)
+    else:
+        stream = get_shared_stream()
+        while True:
+            sample = stream.read_sample()
+            print(sample, stream.latency.summary())
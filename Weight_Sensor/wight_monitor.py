@@ -1,23 +1,52 @@
 #!/usr/bin/env python3
 from hx711lib import HX711
+from weight_filters import FilterPipeline, MedianFilter, ExponentialFilter, ZeroTracker
+import json
+import os
 import time
 
+# weight_calibration.py が保存する設定ファイル
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_config.json")
+# 生の値の差を g にする係数の既定値（weight_calibration.py の既定値と同じ。載せると生の値が下がるので負）
+FACTOR = -300.0 / 113318.0
+
+def load_factor():
+    """
+    校正済みの係数を設定ファイルから読み込む
+
+    HX711 は (生の値 - 基準値) * factor で重量にするので、負の係数で
+    他のスクリプトの (基準値 - 生の値) * 300/113318 と同じ向きになる。
+
+    Returns:
+        float: 係数（設定ファイルが無いか読めない場合は FACTOR）
+    """
+    try:
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, 'r') as f:
+                return float(json.load(f)["factor"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"設定ファイルの読み込みに失敗しました: {e}")
+    return FACTOR
+
 def main():
-    # HX711インスタンスの作成
-    scale = HX711()
+    # HX711インスタンスの作成（スパイクを中央値で除いてから指数移動平均でならす）
+    # 長時間動かし続けるので、何も載っていないときのゼロ点のずれも自動で補正する
+    # 係数を渡して重量を g にする（安定の判定やゼロ点の追従も g で動く）
+    scale = HX711(filters=FilterPipeline([MedianFilter(5), ExponentialFilter(0.3)]),
+                  zero_tracker=ZeroTracker(), factor=load_factor())
     
     try:
         # センサーの読み取りを開始
         print("重量センサーの初期化中...")
         scale.start()
         
-        # 初期化のための少し待機
-        time.sleep(2)
-        
-        # ゼロ点調整
+        # ゼロ点調整（重量が落ち着いてからの平均を基準にする。終わるまで待つ）
         print("ゼロ点調整を行います...")
-        scale.tare()
-        time.sleep(1)
+        try:
+            scale.tare(samples=16, wait_stable=True, timeout=10.0).result()
+        except TimeoutError as e:
+            print(f"{e}。平均だけでゼロ点を決めます")
+            scale.tare(samples=16).result()
         
         print("重量測定を開始します。Ctrl+Cで終了。")
         print("-" * 50)